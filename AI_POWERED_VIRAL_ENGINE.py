@@ -27,6 +27,8 @@ try:
 except ImportError:
     CLAUDE_AVAILABLE = False
 
+from near_duplicate_index import generate_unique
+
 class AIPoweredViralEngine:
     """🧠 AI駆動型バイラル投稿エンジン"""
     
@@ -564,8 +566,10 @@ After（現在）:
             hour, minute = map(int, time_str.split(':'))
             post_time = target_date.replace(hour=hour, minute=minute)
             
-            # AI駆動型生成
-            post_data = await self.generate_ai_powered_post(theme, emotion, i)
+            # AI駆動型生成（過去の投稿と準重複なら作り直す）
+            post_data = await generate_unique(
+                lambda attempt: self.generate_ai_powered_post(theme, emotion, i)
+            )
             
             posts.append({
                 "content": post_data["content"],
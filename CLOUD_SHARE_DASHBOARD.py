@@ -5,18 +5,18 @@
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
-import os
 import socket
 import qrcode
 import io
 import base64
 from typing import Dict, List, Tuple
 
+from dashboard_data import POST_TABLES, database_info, load_table
+
 # ページ設定
 st.set_page_config(
     page_title="🌟 Threads投稿管理ダッシュボード - クラウド共有版",
@@ -118,101 +118,12 @@ def show_sharing_panel():
     return network_url
 
 def get_database_info():
-    """データベース情報を詳細に取得"""
-    databases = {
-        'scheduled_posts.db': 'scheduled_posts',
-        'threads_optimized.db': 'threads_posts', 
-        'buzz_history.db': 'buzz_history',
-        'viral_history.db': 'post_history'
-    }
-    
-    db_info = {}
-    
-    for db_path, table_name in databases.items():
-        if os.path.exists(db_path):
-            try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                all_tables = [t[0] for t in cursor.fetchall()]
-                
-                if table_name in all_tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                    record_count = cursor.fetchone()[0]
-                    
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
-                    db_info[db_path] = {
-                        'table': table_name,
-                        'records': record_count,
-                        'columns': columns,
-                        'status': 'OK',
-                        'last_updated': datetime.now()
-                    }
-                else:
-                    db_info[db_path] = {
-                        'table': table_name,
-                        'records': 0,
-                        'columns': [],
-                        'status': f'TABLE_NOT_FOUND',
-                        'last_updated': None
-                    }
-                
-                conn.close()
-                
-            except Exception as e:
-                db_info[db_path] = {
-                    'table': table_name,
-                    'records': 0,
-                    'columns': [],
-                    'status': f'ERROR: {str(e)}',
-                    'last_updated': None
-                }
-        else:
-            db_info[db_path] = {
-                'table': table_name,
-                'records': 0,
-                'columns': [],
-                'status': 'FILE_NOT_EXISTS',
-                'last_updated': None
-            }
-    
-    return db_info
+    """データベース情報を詳細に取得（変更のないデータベースはキャッシュから返す）"""
+    return database_info(POST_TABLES)
 
 def load_data_with_status(db_path, table_name):
-    """ステータス情報付きでデータ読み込み"""
-    try:
-        conn = sqlite3.connect(db_path)
-        
-        query = f"SELECT * FROM {table_name} ORDER BY "
-        
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'scheduled_time' in columns:
-            query += "scheduled_time DESC"
-        elif 'generated_at' in columns:
-            query += "generated_at DESC"
-        elif 'created_at' in columns:
-            query += "created_at DESC"
-        else:
-            query += "id DESC"
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # 時間カラムの変換
-        for time_col in ['scheduled_time', 'generated_at', 'created_at', 'posted_at']:
-            if time_col in df.columns:
-                df[time_col] = pd.to_datetime(df[time_col], errors='coerce')
-        
-        return df, "SUCCESS"
-        
-    except Exception as e:
-        return pd.DataFrame(), f"ERROR: {str(e)}"
+    """ステータス情報付きでデータ読み込み（変更のないデータベースはキャッシュから返す）"""
+    return load_table(db_path, table_name)
 
 def get_time_status(scheduled_time):
     """時間に基づくステータス判定"""
@@ -14,9 +14,16 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 import calendar
 
+from template_engine import render_template
+
+from near_duplicate_index import generate_unique
+
 class DynamicViralEngine:
     """🌟 動的バイラルエンジン"""
     
+    # テンプレート・トレンド・ランダム要素の定義（全インスタンスで共有し、生成のたびに組み立て直さない）
+    _shared_definitions = None
+    
     def __init__(self):
         self.db_path = "viral_history.db"
         self.fixed_link = "https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u"
@@ -55,14 +62,13 @@ class DynamicViralEngine:
             }
         }
         
-        # 🔥 超多様性テンプレート群
-        self.dynamic_templates = self._load_dynamic_templates()
-        
-        # 📊 トレンドトピック（定期更新）
-        self.trending_topics = self._load_trending_topics()
-        
-        # 🎲 ランダム要素データベース
-        self.random_elements = self._load_random_elements()
+        if DynamicViralEngine._shared_definitions is None:
+            DynamicViralEngine._shared_definitions = (
+                self._load_dynamic_templates(),  # 🔥 超多様性テンプレート群
+                self._load_trending_topics(),    # 📊 トレンドトピック（定期更新）
+                self._load_random_elements()     # 🎲 ランダム要素データベース
+            )
+        self.dynamic_templates, self.trending_topics, self.random_elements = DynamicViralEngine._shared_definitions
     
     def _init_database(self):
         """データベース初期化"""
@@ -385,12 +391,12 @@ class DynamicViralEngine:
             ]
         }
     
-    async def generate_unique_post(self, target_datetime: datetime, post_type: str) -> Dict[str, Any]:
-        """完全にユニークな投稿生成"""
+    async def generate_unique_post(self, target_datetime: datetime, post_type: str, attempt: int = 0) -> Dict[str, Any]:
+        """完全にユニークな投稿生成（attempt を変えると同じ日時でも別の投稿になる）"""
         
         # 日付ベースのシード値で一貫性を保つ
         date_seed = int(target_datetime.timestamp())
-        random.seed(date_seed + hash(post_type))
+        random.seed(date_seed + hash(post_type) + attempt)
         
         # 曜日と季節を取得
         weekday = target_datetime.weekday()
@@ -427,9 +433,7 @@ class DynamicViralEngine:
         )
         
         # コンテンツ生成
-        content = template_data["template"]
-        for var_name, var_value in variables.items():
-            content = content.replace(f"{{{var_name}}}", str(var_value))
+        content = render_template(template_data["template"], variables)
         
         # 履歴チェックと保存
         content_hash = hashlib.md5(content.encode()).hexdigest()
@@ -963,8 +967,10 @@ class DynamicViralEngine:
             
             print(f"   生成中 {i+1}/{posts_per_day} - {time_str} ({post_type})...")
             
-            # ユニーク投稿生成
-            post_data = await self.generate_unique_post(post_time, post_type)
+            # ユニーク投稿生成（過去の投稿と準重複ならシードを変えて作り直す）
+            post_data = await generate_unique(
+                lambda attempt: self.generate_unique_post(post_time, post_type, attempt)
+            )
             
             posts.append({
                 "content": post_data["content"],
@@ -5,15 +5,16 @@
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
 import json
-import os
 from typing import List, Dict, Any
 
+from dashboard_data import RollupSource, load_sources, rollup_stats
+from post_history_view import paginate_frame, pagination_controls, show_post_detail, show_post_table
+
 # ページ設定
 st.set_page_config(
     page_title="Threads投稿管理ダッシュボード",
@@ -34,70 +35,63 @@ class FixedThreadsDashboard:
         }
     
     def get_all_posts(self) -> pd.DataFrame:
-        """全投稿データ取得（エラー対応版）"""
-        all_posts = []
+        """全投稿データ取得（エラー対応版・変更のあったデータベースだけを読み直す）"""
+        combined_df, errors = load_sources(self.db_paths, self._read_posts, self._clean_posts)
+        for db_name, e in errors:
+            st.error(f"データベース読み込みエラー ({db_name}): {e}")
+        return combined_df
+    
+    def _read_posts(self, conn, db_name: str) -> pd.DataFrame:
+        """1つのデータベースの投稿を読み込む"""
+        # まずテーブル構造を確認
+        tables_info = pd.read_sql_query(
+            "SELECT name FROM sqlite_master WHERE type='table'",
+            conn
+        )
         
-        for db_name, db_path in self.db_paths.items():
-            if os.path.exists(db_path):
-                try:
-                    conn = sqlite3.connect(db_path)
-                    
-                    # まずテーブル構造を確認
-                    tables_info = pd.read_sql_query(
-                        "SELECT name FROM sqlite_master WHERE type='table'",
-                        conn
-                    )
-                    
-                    if tables_info.empty:
-                        conn.close()
-                        continue
-                    
-                    # 各データベースに応じたクエリ
-                    if db_name == "scheduled_posts":
-                        # scheduled_postsテーブル
-                        df = self._get_scheduled_posts(conn)
-                        
-                    elif db_name == "threads_optimized": 
-                        # threads_postsテーブル
-                        df = self._get_threads_posts(conn)
-                        
-                    elif db_name == "buzz_history":
-                        # buzz_historyテーブル
-                        df = self._get_buzz_posts(conn)
-                        
-                    elif db_name == "viral_history":
-                        # post_historyテーブル
-                        df = self._get_viral_posts(conn)
-                    
-                    if not df.empty:
-                        df['source'] = db_name
-                        all_posts.append(df)
-                    
-                    conn.close()
-                    
-                except Exception as e:
-                    st.error(f"データベース読み込みエラー ({db_name}): {e}")
-                    continue
+        if tables_info.empty:
+            return pd.DataFrame()
+        
+        # 各データベースに応じたクエリ
+        if db_name == "scheduled_posts":
+            # scheduled_postsテーブル
+            df = self._get_scheduled_posts(conn)
+            
+        elif db_name == "threads_optimized": 
+            # threads_postsテーブル
+            df = self._get_threads_posts(conn)
+            
+        elif db_name == "buzz_history":
+            # buzz_historyテーブル
+            df = self._get_buzz_posts(conn)
+            
+        elif db_name == "viral_history":
+            # post_historyテーブル
+            df = self._get_viral_posts(conn)
         
-        if all_posts:
-            combined_df = pd.concat(all_posts, ignore_index=True, sort=False)
-            combined_df['scheduled_time'] = pd.to_datetime(combined_df['scheduled_time'])
-            
-            # データクリーニング
-            combined_df = combined_df.fillna({
-                'actual_engagement': 0,
-                'clicks': 0,
-                'shares': 0,
-                'comments': 0,
-                'likes': 0,
-                'engagement_prediction': 0,
-                'pattern_type': 'unknown',
-                'status': 'unknown'
-            })
-            
-            return combined_df
         else:
             return pd.DataFrame()
+        
+        if not df.empty:
+            df['source'] = db_name
+        return df
+    
+    @staticmethod
+    def _clean_posts(combined_df: pd.DataFrame) -> pd.DataFrame:
+        """結合後の型変換・欠損値の補完"""
+        combined_df['scheduled_time'] = pd.to_datetime(combined_df['scheduled_time'])
+        
+        # データクリーニング
+        return combined_df.fillna({
+            'actual_engagement': 0,
+            'clicks': 0,
+            'shares': 0,
+            'comments': 0,
+            'likes': 0,
+            'engagement_prediction': 0,
+            'pattern_type': 'unknown',
+            'status': 'unknown'
+        })
     
     def _get_scheduled_posts(self, conn) -> pd.DataFrame:
         """scheduled_posts取得"""
@@ -281,8 +275,31 @@ class FixedThreadsDashboard:
             st.warning(f"post_history読み込み警告: {e}")
             return pd.DataFrame()
     
+    def rollup_sources(self) -> Dict[str, RollupSource]:
+        """パフォーマンス統計のロールアップを持つテーブル（欠損値の補完は _clean_posts と同じ）"""
+        tables = {
+            "scheduled_posts": "scheduled_posts",
+            "threads_optimized": "threads_posts",
+            "buzz_history": "buzz_history",
+            "viral_history": "post_history"
+        }
+        return {
+            db_name: RollupSource(
+                self.db_paths[db_name], table,
+                'viral' if db_name == "viral_history" else 'unknown', 'unknown'
+            )
+            for db_name, table in tables.items()
+        }
+    
     def get_performance_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """パフォーマンス統計（安全版）"""
+        """パフォーマンス統計（安全版・表示件数に関係なく全履歴をロールアップから集計）"""
+        stats = rollup_stats(self.rollup_sources())
+        if stats is not None:
+            return stats
+        return self._performance_stats_from_frame(df)
+    
+    def _performance_stats_from_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """読み込み済みの投稿からパフォーマンス統計を計算（ロールアップを使えない場合）"""
         if df.empty:
             return {
                 'total_posts': 0,
@@ -507,48 +524,33 @@ def show_post_history(df: pd.DataFrame):
     
     st.write(f"📋 表示件数: {len(filtered_df)} / {len(df)}")
     
-    # 投稿一覧表示
-    for idx, post in filtered_df.head(20).iterrows():
-        scheduled_time = post.get('scheduled_time', 'N/A')
-        time_str = scheduled_time.strftime('%Y/%m/%d %H:%M') if pd.notna(scheduled_time) else 'N/A'
-        
-        pattern_type = post.get('pattern_type', 'N/A')
-        source = post.get('source', 'N/A')
+    # 投稿一覧表示（1ページ分を表で表示し、選択した投稿だけ詳細を展開）
+    page, page_size = pagination_controls(len(filtered_df), key="history")
+    post = show_post_table(paginate_frame(filtered_df, page, page_size), key="history_table")
+    
+    if post is not None:
+        show_post_detail(post, key=f"history_{post.get('source')}_{post.get('id')}")
         
-        with st.expander(f"{time_str} - {pattern_type} ({source})"):
-            content = post.get('content', '')
-            st.text_area("投稿内容", content, height=100, key=f"content_{idx}", disabled=True)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.write("**統計情報**")
-                st.write(f"いいね: {post.get('likes', 0)}")
-                st.write(f"シェア: {post.get('shares', 0)}")
-                st.write(f"コメント: {post.get('comments', 0)}")
-                st.write(f"クリック: {post.get('clicks', 0)}")
-            
-            with col2:
-                st.write("**メタデータ**")
-                st.write(f"エンゲージメント予測: {post.get('engagement_prediction', 0):.1f}")
-                st.write(f"実際のエンゲージメント: {post.get('actual_engagement', 0):.1f}")
-                st.write(f"ハッシュタグ: {post.get('hashtags', 'N/A')}")
-                st.write(f"ステータス: {post.get('status', 'N/A')}")
+        st.write("**メタデータ**")
+        st.write(f"エンゲージメント予測: {post.get('engagement_prediction', 0):.1f}")
+        st.write(f"実際のエンゲージメント: {post.get('actual_engagement', 0):.1f}")
 
 def show_performance_analysis(df: pd.DataFrame, stats: Dict):
     """パフォーマンス分析表示"""
     st.header("📊 パフォーマンス分析")
     
-    # パターン別パフォーマンス
-    if 'pattern_type' in df.columns and not df['pattern_type'].isna().all():
-        st.subheader("🎯 パターン別エンゲージメント")
-        
+    # パターン別パフォーマンス（ロールアップの集計があればそれを使う）
+    pattern_stats = stats.get('pattern_stats')
+    if pattern_stats is None and 'pattern_type' in df.columns and not df['pattern_type'].isna().all():
         pattern_stats = df.groupby('pattern_type').agg({
             'actual_engagement': lambda x: x.fillna(0).mean(),
             'clicks': lambda x: x.fillna(0).sum(),
             'likes': lambda x: x.fillna(0).sum(),
             'shares': lambda x: x.fillna(0).sum()
         }).reset_index()
+    
+    if pattern_stats is not None:
+        st.subheader("🎯 パターン別エンゲージメント")
         
         if not pattern_stats.empty:
             fig = px.bar(
@@ -560,15 +562,16 @@ def show_performance_analysis(df: pd.DataFrame, stats: Dict):
             st.plotly_chart(fig, use_container_width=True)
     
     # データソース別統計
-    if 'source' in df.columns:
-        st.subheader("📊 データソース別統計")
-        
+    source_stats = stats.get('source_stats')
+    if source_stats is None and 'source' in df.columns:
         source_stats = df.groupby('source').agg({
             'actual_engagement': lambda x: x.fillna(0).mean(),
             'engagement_prediction': lambda x: x.fillna(0).mean(),
             'clicks': lambda x: x.fillna(0).sum()
         }).reset_index()
-        
+    
+    if source_stats is not None:
+        st.subheader("📊 データソース別統計")
         st.dataframe(source_stats)
     
     # 基本統計
@@ -12,6 +12,8 @@ import random
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
+from template_engine import render_template
+
 # 既存エンジンを継承
 try:
     from MULTIPLE_POSTS_PER_DAY import MultiPostScheduler
@@ -19,15 +21,16 @@ try:
 except ImportError:
     SCHEDULER_AVAILABLE = False
 
+from near_duplicate_index import generate_unique
+
 class HighEngagementEngine:
     """🔥 高エンゲージメント投稿エンジン"""
     
-    def __init__(self):
-        # 🎯 実際にバズった投稿パターンを分析したテンプレート
-        self.viral_templates = {
-            "educational": [
-                {
-                    "template": """【90%の人が知らない】{skill}で年収を2倍にする裏技
+    # 🎯 実際にバズった投稿パターンを分析したテンプレート
+    VIRAL_TEMPLATES = {
+        "educational": [
+            {
+                "template": """【90%の人が知らない】{skill}で年収を2倍にする裏技
 
 私が実際に試した結果...
 ❌ 従来の方法：{old_method}
@@ -41,10 +44,10 @@ class HighEngagementEngine:
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 8.5
-                },
-                {
-                    "template": """🚨【緊急】{skill}をやらないと2025年ヤバい理由
+                "engagement_rate": 8.5
+            },
+            {
+                "template": """🚨【緊急】{skill}をやらないと2025年ヤバい理由
 
 知らないと本当に損します...
 
@@ -61,10 +64,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 9.2
-                },
-                {
-                    "template": """【保存必須】{skill}の完全攻略法
+                "engagement_rate": 9.2
+            },
+            {
+                "template": """【保存必須】{skill}の完全攻略法
 
 これ知ってたら人生変わってた...
 
@@ -81,12 +84,12 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 8.8
-                }
-            ],
-            "viral": [
-                {
-                    "template": """😱これマジ？{shocking_fact}
+                "engagement_rate": 8.8
+            }
+        ],
+        "viral": [
+            {
+                "template": """😱これマジ？{shocking_fact}
 
 調べてみたら本当だった...
 
@@ -103,10 +106,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 9.7
-                },
-                {
-                    "template": """【速報】{topic}で億万長者が続出中
+                "engagement_rate": 9.7
+            },
+            {
+                "template": """【速報】{topic}で億万長者が続出中
 
 なぜ今{topic}なのか？
 
@@ -123,10 +126,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 9.5
-                },
-                {
-                    "template": """⚠️【警告】まだ{old_way}してるの？
+                "engagement_rate": 9.5
+            },
+            {
+                "template": """⚠️【警告】まだ{old_way}してるの？
 
 2025年の勝ち組は{new_way}してる
 
@@ -142,12 +145,12 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 8.9
-                }
-            ],
-            "cta": [
-                {
-                    "template": """🎁【限定100名】{offer}を無料プレゼント
+                "engagement_rate": 8.9
+            }
+        ],
+        "cta": [
+            {
+                "template": """🎁【限定100名】{offer}を無料プレゼント
 
 通常{price}→今だけ無料
 
@@ -165,10 +168,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 7.8
-                },
-                {
-                    "template": """💥【衝撃】{testimonial_person}が{achievement}達成
+                "engagement_rate": 7.8
+            },
+            {
+                "template": """💥【衝撃】{testimonial_person}が{achievement}達成
 
 使ったのは「{secret}」
 
@@ -183,10 +186,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 8.3
-                },
-                {
-                    "template": """🚨【最後のチャンス】{deadline}まで
+                "engagement_rate": 8.3
+            },
+            {
+                "template": """🚨【最後のチャンス】{deadline}まで
 
 {benefit}できる最後の機会です
 
@@ -202,107 +205,112 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
 
 🔗 詳しくはこちら
 https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
-                    "engagement_rate": 8.1
-                }
-            ]
-        }
-        
-        # 🎯 高エンゲージメント変数データベース
-        self.viral_data = {
-            "educational": {
-                "skills": [
-                    "AI活用", "副業", "投資", "時間管理", "効率化", 
-                    "自動化", "マーケティング", "プログラミング"
-                ],
-                "old_methods": [
-                    "手作業でコツコツ", "従来の勉強法", "時間をかける方法",
-                    "みんなと同じやり方", "教科書通りの手順"
-                ],
-                "new_methods": [
-                    "AIツールをフル活用", "データ分析で最適化", "自動化システム構築",
-                    "裏技的な効率化", "最新テクノロジー活用"
-                ],
-                "timeframes": ["3日", "1週間", "2週間", "1ヶ月"],
-                "results": [
-                    "収入が3倍になった", "作業時間が1/10に短縮", "フォロワーが10倍増加",
-                    "売上が5倍アップ", "自由時間が3倍に"
-                ],
-                "checks": [
-                    "毎日3時間以上労働している", "収入が思うように増えない", "時間が足りないと感じる",
-                    "同僚と差がついてきた", "将来に不安を感じる", "スキルアップが進まない"
-                ],
-                "steps": [
-                    "基礎スキルを最短でマスター", "実践で経験値を積む", "収益化システムを構築",
-                    "自動化で効率を最大化", "継続的な改善サイクル"
-                ],
-                "testimonials": [
-                    "3ヶ月で月収100万円達成できました！", "人生が本当に変わりました",
-                    "もっと早く知りたかった...", "こんなに簡単だったなんて"
-                ]
-            },
-            "viral": {
-                "shocking_facts": [
-                    "AIを使える人と使えない人の年収差が500万円", 
-                    "副業で月100万稼ぐ人が急増中",
-                    "投資を始めない人は一生貧乏のまま",
-                    "効率化できる人とできない人で人生格差が10倍"
-                ],
-                "details": [
-                    "・大手企業でもAIスキルが昇進の必須条件に",
-                    "・副業市場が年間50%成長している現実",
-                    "・インフレで現金の価値が年々下落中",
-                    "・時間を有効活用できる人だけが勝ち残る"
-                ],
-                "topics": ["AI活用", "副業", "投資", "効率化", "自動化"],
-                "reasons": [
-                    "市場が急拡大している", "参入障壁が低い今がチャンス", 
-                    "先行者利益が巨大", "政府も推進している"
-                ],
-                "old_ways": [
-                    "手作業", "旧式の方法", "非効率な作業", "時代遅れの手法"
-                ],
-                "new_ways": [
-                    "AI自動化", "最新システム", "効率化ツール", "革新的手法"
-                ],
-                "comparisons": [
-                    "月収30万 vs 月収300万", "10時間労働 vs 3時間労働",
-                    "ストレス満載 vs 自由自在", "不安だらけ vs 安心安全"
-                ]
-            },
-            "cta": {
-                "offers": [
-                    "AI活用完全マニュアル", "副業成功テンプレート", 
-                    "投資必勝法ガイド", "効率化ツール集"
-                ],
-                "prices": ["19,800円", "29,800円", "39,800円", "49,800円"],
-                "benefits": [
-                    "即実践可能なノウハウ", "成功者の実例集", "個別サポート付き",
-                    "永久アップデート保証", "返金保証付き"
-                ],
-                "testimonial_people": [
-                    "会社員のAさん", "主婦のBさん", "学生のCさん", "フリーランスのDさん"
-                ],
-                "achievements": [
-                    "月収100万円", "不労所得月50万円", "フォロワー10万人", "自由な働き方"
-                ],
-                "secrets": [
-                    "3つの黄金ルール", "禁断のテクニック", "業界の裏技", "秘密の手法"
-                ],
-                "deadlines": [
-                    "今月末", "来週日曜日", "あと3日", "48時間以内"
-                ],
-                "miss_consequences": [
-                    "このチャンスを逃すと次はいつになるか...", "先行者利益を得られない",
-                    "ライバルに先を越される", "後悔する未来が待っている"
-                ]
+                "engagement_rate": 8.1
             }
+        ]
+    }
+    
+    # 🎯 高エンゲージメント変数データベース
+    VIRAL_DATA = {
+        "educational": {
+            "skills": [
+                "AI活用", "副業", "投資", "時間管理", "効率化", 
+                "自動化", "マーケティング", "プログラミング"
+            ],
+            "old_methods": [
+                "手作業でコツコツ", "従来の勉強法", "時間をかける方法",
+                "みんなと同じやり方", "教科書通りの手順"
+            ],
+            "new_methods": [
+                "AIツールをフル活用", "データ分析で最適化", "自動化システム構築",
+                "裏技的な効率化", "最新テクノロジー活用"
+            ],
+            "timeframes": ["3日", "1週間", "2週間", "1ヶ月"],
+            "results": [
+                "収入が3倍になった", "作業時間が1/10に短縮", "フォロワーが10倍増加",
+                "売上が5倍アップ", "自由時間が3倍に"
+            ],
+            "checks": [
+                "毎日3時間以上労働している", "収入が思うように増えない", "時間が足りないと感じる",
+                "同僚と差がついてきた", "将来に不安を感じる", "スキルアップが進まない"
+            ],
+            "steps": [
+                "基礎スキルを最短でマスター", "実践で経験値を積む", "収益化システムを構築",
+                "自動化で効率を最大化", "継続的な改善サイクル"
+            ],
+            "testimonials": [
+                "3ヶ月で月収100万円達成できました！", "人生が本当に変わりました",
+                "もっと早く知りたかった...", "こんなに簡単だったなんて"
+            ]
+        },
+        "viral": {
+            "shocking_facts": [
+                "AIを使える人と使えない人の年収差が500万円", 
+                "副業で月100万稼ぐ人が急増中",
+                "投資を始めない人は一生貧乏のまま",
+                "効率化できる人とできない人で人生格差が10倍"
+            ],
+            "details": [
+                "・大手企業でもAIスキルが昇進の必須条件に",
+                "・副業市場が年間50%成長している現実",
+                "・インフレで現金の価値が年々下落中",
+                "・時間を有効活用できる人だけが勝ち残る"
+            ],
+            "topics": ["AI活用", "副業", "投資", "効率化", "自動化"],
+            "reasons": [
+                "市場が急拡大している", "参入障壁が低い今がチャンス", 
+                "先行者利益が巨大", "政府も推進している"
+            ],
+            "old_ways": [
+                "手作業", "旧式の方法", "非効率な作業", "時代遅れの手法"
+            ],
+            "new_ways": [
+                "AI自動化", "最新システム", "効率化ツール", "革新的手法"
+            ],
+            "comparisons": [
+                "月収30万 vs 月収300万", "10時間労働 vs 3時間労働",
+                "ストレス満載 vs 自由自在", "不安だらけ vs 安心安全"
+            ]
+        },
+        "cta": {
+            "offers": [
+                "AI活用完全マニュアル", "副業成功テンプレート", 
+                "投資必勝法ガイド", "効率化ツール集"
+            ],
+            "prices": ["19,800円", "29,800円", "39,800円", "49,800円"],
+            "benefits": [
+                "即実践可能なノウハウ", "成功者の実例集", "個別サポート付き",
+                "永久アップデート保証", "返金保証付き"
+            ],
+            "testimonial_people": [
+                "会社員のAさん", "主婦のBさん", "学生のCさん", "フリーランスのDさん"
+            ],
+            "achievements": [
+                "月収100万円", "不労所得月50万円", "フォロワー10万人", "自由な働き方"
+            ],
+            "secrets": [
+                "3つの黄金ルール", "禁断のテクニック", "業界の裏技", "秘密の手法"
+            ],
+            "deadlines": [
+                "今月末", "来週日曜日", "あと3日", "48時間以内"
+            ],
+            "miss_consequences": [
+                "このチャンスを逃すと次はいつになるか...", "先行者利益を得られない",
+                "ライバルに先を越される", "後悔する未来が待っている"
+            ]
         }
+    }
+    
+    def __init__(self):
+        # テンプレート・変数データはクラスで一度だけ組み立てたものを全インスタンスで共有する
+        self.viral_templates = self.VIRAL_TEMPLATES
+        self.viral_data = self.VIRAL_DATA
     
-    async def generate_high_engagement_post(self, content_type: str, post_number: int) -> str:
-        """🔥 高エンゲージメント投稿生成"""
+    async def generate_high_engagement_post(self, content_type: str, post_number: int, attempt: int = 0) -> str:
+        """🔥 高エンゲージメント投稿生成（attempt を変えると別の投稿になる）"""
         
         # ランダムシード（より多様性を確保）
-        random.seed(int(time.time() * 1000) + post_number * 17)
+        random.seed(int(time.time() * 1000) + post_number * 17 + attempt)
         
         # テンプレート選択
         templates = self.viral_templates[content_type]
@@ -312,9 +320,7 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
         variables = self._get_viral_variables(content_type, post_number)
         
         # テンプレート置換
-        content = template["template"]
-        for key, value in variables.items():
-            content = content.replace(f"{{{key}}}", value)
+        content = render_template(template["template"], variables)
         
         return content
     
@@ -406,8 +412,10 @@ https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u""",
             hour, minute = map(int, time_str.split(':'))
             post_time = target_date.replace(hour=hour, minute=minute)
             
-            # 高エンゲージメント投稿生成
-            content = await self.generate_high_engagement_post(content_type, i)
+            # 高エンゲージメント投稿生成（過去の投稿と準重複なら作り直す）
+            content = await generate_unique(
+                lambda attempt: self.generate_high_engagement_post(content_type, i, attempt)
+            )
             
             posts.append({
                 "content": content,
@@ -5,14 +5,15 @@
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta, date
-import os
 from typing import Dict, List, Tuple
 
+from dashboard_data import POST_TABLES, database_info, load_table
+from post_history_view import paginate_frame, pagination_controls, show_post_detail, show_post_table
+
 # ページ設定
 st.set_page_config(
     page_title="🌟 Threads投稿管理ダッシュボード",
@@ -62,103 +63,12 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def get_database_info():
-    """データベース情報を詳細に取得"""
-    databases = {
-        'scheduled_posts.db': 'scheduled_posts',
-        'threads_optimized.db': 'threads_posts', 
-        'buzz_history.db': 'buzz_history',
-        'viral_history.db': 'post_history'
-    }
-    
-    db_info = {}
-    
-    for db_path, table_name in databases.items():
-        if os.path.exists(db_path):
-            try:
-                conn = sqlite3.connect(db_path)
-                cursor = conn.cursor()
-                
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-                all_tables = [t[0] for t in cursor.fetchall()]
-                
-                if table_name in all_tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                    record_count = cursor.fetchone()[0]
-                    
-                    cursor.execute(f"PRAGMA table_info({table_name})")
-                    columns = [col[1] for col in cursor.fetchall()]
-                    
-                    db_info[db_path] = {
-                        'table': table_name,
-                        'records': record_count,
-                        'columns': columns,
-                        'status': 'OK',
-                        'last_updated': datetime.now()
-                    }
-                else:
-                    db_info[db_path] = {
-                        'table': table_name,
-                        'records': 0,
-                        'columns': [],
-                        'status': f'TABLE_NOT_FOUND',
-                        'last_updated': None
-                    }
-                
-                conn.close()
-                
-            except Exception as e:
-                db_info[db_path] = {
-                    'table': table_name,
-                    'records': 0,
-                    'columns': [],
-                    'status': f'ERROR: {str(e)}',
-                    'last_updated': None
-                }
-        else:
-            db_info[db_path] = {
-                'table': table_name,
-                'records': 0,
-                'columns': [],
-                'status': 'FILE_NOT_EXISTS',
-                'last_updated': None
-            }
-    
-    return db_info
+    """データベース情報を詳細に取得（変更のないデータベースはキャッシュから返す）"""
+    return database_info(POST_TABLES)
 
 def load_data_with_status(db_path, table_name):
-    """ステータス情報付きでデータ読み込み"""
-    try:
-        conn = sqlite3.connect(db_path)
-        
-        # 基本クエリ
-        query = f"SELECT * FROM {table_name} ORDER BY "
-        
-        # 時間カラムでソート（利用可能なものを使用）
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        if 'scheduled_time' in columns:
-            query += "scheduled_time DESC"
-        elif 'generated_at' in columns:
-            query += "generated_at DESC"
-        elif 'created_at' in columns:
-            query += "created_at DESC"
-        else:
-            query += "id DESC"
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # 時間カラムの変換
-        for time_col in ['scheduled_time', 'generated_at', 'created_at', 'posted_at']:
-            if time_col in df.columns:
-                df[time_col] = pd.to_datetime(df[time_col], errors='coerce')
-        
-        return df, "SUCCESS"
-        
-    except Exception as e:
-        return pd.DataFrame(), f"ERROR: {str(e)}"
+    """ステータス情報付きでデータ読み込み（変更のないデータベースはキャッシュから返す）"""
+    return load_table(db_path, table_name)
 
 def get_time_status(scheduled_time):
     """時間に基づくステータス判定"""
@@ -479,48 +389,27 @@ def show_list_view(df):
     elif sort_by == 'ステータス順' and 'status' in df.columns:
         df = df.sort_values('status')
     
-    # 投稿表示
-    for idx, post in df.head(20).iterrows():
-        col1, col2, col3 = st.columns([1, 1, 3])
+    # 投稿表示（1ページ分を表で表示し、選択した投稿だけ詳細を展開）
+    page, page_size = pagination_controls(len(df), key="list_view", default_size=25)
+    post = show_post_table(paginate_frame(df, page, page_size), key="list_view_table")
+    
+    if post is not None:
+        col1, col2 = st.columns([1, 3])
         
         with col1:
             scheduled_time = post.get('scheduled_time')
             if pd.notna(scheduled_time):
-                time_str = scheduled_time.strftime('%m/%d %H:%M')
                 time_status, time_class = get_time_status(scheduled_time)
                 st.markdown(f"""
                 <div class="{time_class}">
-                    📅 {time_str}<br>
+                    📅 {scheduled_time.strftime('%m/%d %H:%M')}<br>
                     <small>{time_status}</small>
                 </div>
                 """, unsafe_allow_html=True)
+            st.markdown(render_status_badge(post.get('status', 'unknown')), unsafe_allow_html=True)
         
         with col2:
-            status = post.get('status', 'unknown')
-            st.markdown(render_status_badge(status), unsafe_allow_html=True)
-            
-            # パフォーマンス
-            if 'likes' in post and post['likes'] > 0:
-                st.metric("❤️", int(post['likes']))
-        
-        with col3:
-            content = post.get('content', '')
-            preview = content[:150] + "..." if len(content) > 150 else content
-            
-            with st.expander(f"📝 {preview[:50]}..."):
-                st.write(content)
-                
-                # 詳細情報
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    st.caption(f"📊 Source: {post.get('source', 'N/A')}")
-                    st.caption(f"🎯 Pattern: {post.get('pattern_type', 'N/A')}")
-                
-                with col_b:
-                    if 'clicks' in post:
-                        st.caption(f"🔗 Clicks: {post.get('clicks', 0)}")
-                    if 'shares' in post:
-                        st.caption(f"🔄 Shares: {post.get('shares', 0)}")
+            show_post_detail(post, key=f"list_view_{post.get('source')}_{post.get('id')}")
 
 def show_getting_started():
     """スタートガイド"""
@@ -17,6 +17,8 @@ from io import BytesIO
 import base64
 import socket
 
+from dashboard_data import IncrementalQuery, load_sources
+
 # 📱 モバイル完全対応設定
 st.set_page_config(
     page_title="📱 Threads Team Dashboard",
@@ -203,54 +205,51 @@ class MobileTeamDashboard:
             return None
     
     def get_all_posts(self):
-        """全投稿データ取得"""
-        all_posts = []
+        """全投稿データ取得（前回から追加・更新・削除された行だけを読み直す）"""
+        combined_df, errors = load_sources(self.db_paths, self._read_posts)
+        for db_name, e in errors:
+            st.error(f"データベース読み込みエラー ({db_name}): {e}")
+        return combined_df
+    
+    @staticmethod
+    def _read_posts(conn, db_name):
+        """1つのデータベースの投稿の読み込み方"""
+        if db_name == "scheduled_posts":
+            return IncrementalQuery(
+                "scheduled_posts",
+                """
+                id, content, scheduled_time, status, posted_at,
+                pattern_type, engagement_prediction, actual_engagement,
+                clicks, shares, comments, likes,
+                'scheduled' as source
+                """,
+                parse=MobileTeamDashboard._parse_posts,
+                order_by=['scheduled_time']
+            )
+        return IncrementalQuery(
+            "post_history",
+            """
+            id, content, generated_at as scheduled_time,
+            COALESCE(status, 'posted') as status,
+            pattern_type, engagement_score as engagement_prediction,
+            actual_engagement, clicks, shares, comments, likes,
+            ? as source
+            """,
+            params=(db_name,),
+            parse=MobileTeamDashboard._parse_posts,
+            order_by=['scheduled_time']
+        )
+    
+    @staticmethod
+    def _parse_posts(df):
+        """読み込んだ行の型変換・数値カラムの補完（追加・更新された行だけに適用される）"""
+        df['scheduled_time'] = pd.to_datetime(df['scheduled_time'])
         
-        for db_name, db_path in self.db_paths.items():
-            if os.path.exists(db_path):
-                try:
-                    conn = sqlite3.connect(db_path)
-                    
-                    if db_name == "scheduled_posts":
-                        df = pd.read_sql_query("""
-                        SELECT 
-                            id, content, scheduled_time, status, posted_at,
-                            pattern_type, engagement_prediction, actual_engagement,
-                            clicks, shares, comments, likes,
-                            'scheduled' as source
-                        FROM scheduled_posts
-                        ORDER BY scheduled_time DESC
-                        """, conn)
-                    else:
-                        df = pd.read_sql_query("""
-                        SELECT 
-                            id, content, generated_at as scheduled_time,
-                            COALESCE(status, 'posted') as status,
-                            pattern_type, engagement_score as engagement_prediction,
-                            actual_engagement, clicks, shares, comments, likes,
-                            ? as source
-                        FROM post_history
-                        ORDER BY generated_at DESC
-                        """, conn, params=[db_name])
-                    
-                    if not df.empty:
-                        all_posts.append(df)
-                    
-                    conn.close()
-                except Exception as e:
-                    st.error(f"データベース読み込みエラー ({db_name}): {e}")
+        # データクリーニング
+        for col in ['actual_engagement', 'clicks', 'shares', 'comments', 'likes', 'engagement_prediction']:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
         
-        if all_posts:
-            combined_df = pd.concat(all_posts, ignore_index=True, sort=False)
-            combined_df['scheduled_time'] = pd.to_datetime(combined_df['scheduled_time'])
-            
-            # データクリーニング
-            for col in ['actual_engagement', 'clicks', 'shares', 'comments', 'likes', 'engagement_prediction']:
-                combined_df[col] = pd.to_numeric(combined_df[col], errors='coerce').fillna(0)
-            
-            return combined_df
-        else:
-            return pd.DataFrame()
+        return df
 
 def show_mobile_navigation():
     """📱 モバイルナビゲーション"""
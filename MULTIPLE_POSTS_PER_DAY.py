@@ -14,6 +14,9 @@ from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 import pandas as pd
 
+from template_engine import render_template
+from llm_cache import get_llm_cache
+
 try:
     from anthropic import Anthropic
     ANTHROPIC_AVAILABLE = True
@@ -26,6 +29,9 @@ try:
 except ImportError:
     OPENAI_AVAILABLE = False
 
+# 同じプロンプトに対して溜めておくAI応答の数（投稿が毎回同じにならないよう順番に使う）
+AI_CACHE_VARIANTS = 3
+
 @dataclass
 class MultiplePostStrategy:
     """1日複数投稿戦略"""
@@ -363,28 +369,41 @@ class MultiPostAIEngine:
         最適化された投稿を生成してください。
         """
         
+        # 同じテンプレート・変数の組み合わせは応答キャッシュから返す（AI_CACHE_VARIANTS 件を順番に使う）
         if self.anthropic_client:
             try:
-                response = self.anthropic_client.messages.create(
-                    model="claude-3-5-sonnet-20241022",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=1200,
-                    temperature=0.8  # クリエイティビティを高める
+                def create():
+                    response = self.anthropic_client.messages.create(
+                        model="claude-3-5-sonnet-20241022",
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=1200,
+                        temperature=0.8  # クリエイティビティを高める
+                    )
+                    return response.content[0].text.strip()
+                
+                content, _ = get_llm_cache().get_or_create(
+                    "claude-3-5-sonnet-20241022", prompt, create, temperature=0.8, variants=AI_CACHE_VARIANTS
                 )
-                return response.content[0].text.strip()
+                return content
             except Exception as e:
                 print(f"⚠️ AI生成エラー: {e}")
                 return base_content
         
         elif self.openai_client:
             try:
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4-turbo",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=1200,
-                    temperature=0.8
+                def create():
+                    response = self.openai_client.chat.completions.create(
+                        model="gpt-4-turbo",
+                        messages=[{"role": "user", "content": prompt}],
+                        max_tokens=1200,
+                        temperature=0.8
+                    )
+                    return response.choices[0].message.content.strip()
+                
+                content, _ = get_llm_cache().get_or_create(
+                    "gpt-4-turbo", prompt, create, temperature=0.8, variants=AI_CACHE_VARIANTS
                 )
-                return response.choices[0].message.content.strip()
+                return content
             except Exception as e:
                 print(f"⚠️ AI生成エラー: {e}")
                 return base_content
@@ -393,9 +412,7 @@ class MultiPostAIEngine:
     
     def _replace_template_variables(self, template: str, variables: Dict[str, str]) -> str:
         """テンプレート変数を置換 + 固定リンク追加"""
-        content = template
-        for key, value in variables.items():
-            content = content.replace(f"{{{key}}}", value)
+        content = render_template(template, variables)
         
         # 固定リンクを必ず追加
         fixed_link = "https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u"
@@ -15,6 +15,12 @@ import os
 from typing import List, Dict, Any
 import asyncio
 
+from dashboard_data import (
+    IncrementalQuery, PageSource, RollupSource, load_sources, query_post_page, rollup_stats, table_columns
+)
+from post_history_view import pagination_controls, show_post_detail, show_post_table
+from post_federation import get_post_federation
+
 # ページ設定
 st.set_page_config(
     page_title="Threads投稿管理ダッシュボード",
@@ -87,109 +93,122 @@ class ThreadsDashboard:
         conn.close()
     
     def get_all_posts(self) -> pd.DataFrame:
-        """全投稿データ取得"""
-        all_posts = []
+        """全投稿データ取得（変更のあったデータベースだけを読み直す）"""
+        combined_df, errors = load_sources(self.db_paths, self._read_posts, self._clean_posts)
+        for db_name, e in errors:
+            st.error(f"データベース読み込みエラー ({db_name}): {e}")
+        return combined_df
+    
+    @staticmethod
+    def _read_posts(conn, db_name: str) -> IncrementalQuery:
+        """1つのデータベースの投稿の読み込み方（前回から追加・更新された行だけを読む）"""
+        if db_name == "scheduled_posts":
+            return IncrementalQuery(
+                "scheduled_posts",
+                """
+                id,
+                content,
+                scheduled_time,
+                status,
+                posted_at,
+                engagement_prediction,
+                actual_engagement,
+                clicks,
+                shares,
+                comments,
+                likes,
+                'scheduled' as source
+                """,
+                parse=ThreadsDashboard._parse_posts,
+                order_by=['scheduled_time']
+            )
         
+        # buzz_historyとviral_historyにはstatusカラムがない可能性があるため確認
+        columns = table_columns(conn, 'post_history')
+        status_column = 'status' if 'status' in columns else "'posted' as status"
+        
+        return IncrementalQuery(
+            "post_history",
+            f"""
+            id,
+            content,
+            generated_at as scheduled_time,
+            COALESCE(pattern_type, 'general') as pattern_type,
+            engagement_score as engagement_prediction,
+            actual_engagement,
+            clicks,
+            shares,
+            comments,
+            likes,
+            hashtags,
+            {status_column},
+            ? as source
+            """,
+            params=(db_name,),
+            parse=ThreadsDashboard._parse_posts,
+            order_by=['scheduled_time']
+        )
+    
+    @staticmethod
+    def _parse_posts(df: pd.DataFrame) -> pd.DataFrame:
+        """読み込んだ行の日時を変換（追加・更新された行だけに適用される）"""
+        df['scheduled_time'] = pd.to_datetime(df['scheduled_time'], format='ISO8601')
+        return df
+    
+    @staticmethod
+    def _clean_posts(combined_df: pd.DataFrame) -> pd.DataFrame:
+        """結合後の欠損値の補完"""
+        return combined_df.fillna({
+            'actual_engagement': 0,
+            'clicks': 0,
+            'shares': 0,
+            'comments': 0,
+            'likes': 0,
+            'engagement_prediction': 0
+        })
+    
+    def history_sources(self) -> Dict[str, PageSource]:
+        """投稿履歴をページ単位で読むテーブル（名前は get_all_posts の source と同じ）"""
+        sources = {}
         for db_name, db_path in self.db_paths.items():
-            if os.path.exists(db_path):
-                try:
-                    conn = sqlite3.connect(db_path)
-                    
-                    if db_name == "scheduled_posts":
-                        df = pd.read_sql_query("""
-                        SELECT 
-                            id,
-                            content,
-                            scheduled_time,
-                            status,
-                            posted_at,
-                            engagement_prediction,
-                            actual_engagement,
-                            clicks,
-                            shares,
-                            comments,
-                            likes,
-                            'scheduled' as source
-                        FROM scheduled_posts
-                        ORDER BY scheduled_time DESC
-                        """, conn)
-                    else:
-                        # buzz_historyとviral_historyにはstatusカラムがない可能性があるため確認
-                        cursor = conn.cursor()
-                        cursor.execute("PRAGMA table_info(post_history)")
-                        columns = [col[1] for col in cursor.fetchall()]
-                        
-                        if 'status' in columns:
-                            query = """
-                            SELECT 
-                                id,
-                                content,
-                                generated_at as scheduled_time,
-                                COALESCE(pattern_type, 'general') as pattern_type,
-                                engagement_score as engagement_prediction,
-                                actual_engagement,
-                                clicks,
-                                shares,
-                                comments,
-                                likes,
-                                hashtags,
-                                status,
-                                ? as source
-                            FROM post_history
-                            ORDER BY generated_at DESC
-                            """
-                        else:
-                            query = """
-                            SELECT 
-                                id,
-                                content,
-                                generated_at as scheduled_time,
-                                COALESCE(pattern_type, 'general') as pattern_type,
-                                engagement_score as engagement_prediction,
-                                actual_engagement,
-                                clicks,
-                                shares,
-                                comments,
-                                likes,
-                                hashtags,
-                                'posted' as status,
-                                ? as source
-                            FROM post_history
-                            ORDER BY generated_at DESC
-                            """
-                        
-                        df = pd.read_sql_query(query, conn, params=[db_name])
-                    
-                    if not df.empty:
-                        # statusカラムを追加（post_historyテーブル用）
-                        if 'status' not in df.columns and db_name == 'threads_optimized':
-                            df['status'] = 'posted'  # デフォルトでpostedとする
-                        all_posts.append(df)
-                    
-                    conn.close()
-                except Exception as e:
-                    st.error(f"データベース読み込みエラー ({db_name}): {e}")
-        
-        if all_posts:
-            combined_df = pd.concat(all_posts, ignore_index=True, sort=False)
-            combined_df['scheduled_time'] = pd.to_datetime(combined_df['scheduled_time'], format='ISO8601')
-            
-            # データクリーニング
-            combined_df = combined_df.fillna({
-                'actual_engagement': 0,
-                'clicks': 0,
-                'shares': 0,
-                'comments': 0,
-                'likes': 0,
-                'engagement_prediction': 0
-            })
-            
-            return combined_df
-        else:
-            return pd.DataFrame()
+            if db_name == "scheduled_posts":
+                sources['scheduled'] = PageSource(
+                    db_path, "scheduled_posts",
+                    "id, content, engagement_prediction, actual_engagement, clicks, shares, comments, likes",
+                    "scheduled_time"
+                )
+            else:
+                sources[db_name] = PageSource(
+                    db_path, "post_history",
+                    """id, content, COALESCE(pattern_type, 'general') as pattern_type,
+                    engagement_score as engagement_prediction, actual_engagement,
+                    clicks, shares, comments, likes, hashtags""",
+                    "generated_at"
+                )
+        return sources
+    
+    def rollup_sources(self) -> Dict[str, RollupSource]:
+        """パフォーマンス統計のロールアップを持つテーブル（名前は get_all_posts の source と同じ）"""
+        sources = {}
+        for db_name, db_path in self.db_paths.items():
+            if db_name == "scheduled_posts":
+                # 予約投稿にはパターンがないため、パターン別の集計には含めない
+                sources['scheduled'] = RollupSource(db_path, "scheduled_posts", pattern_default=None)
+            else:
+                sources[db_name] = RollupSource(db_path, "post_history", 'general', 'posted')
+        return sources
     
     def get_performance_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """パフォーマンス統計"""
+        """パフォーマンス統計（日別・時間帯別・パターン別の集計はデータベースのロールアップから求める）"""
+        stats = rollup_stats(self.rollup_sources())
+        if stats is None:
+            return self._performance_stats_from_frame(df)
+        stats['avg_engagement'] = round(stats['avg_engagement'], 1)
+        stats['avg_prediction'] = round(stats['avg_prediction'], 1)
+        return stats
+    
+    def _performance_stats_from_frame(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """読み込み済みの全投稿からパフォーマンス統計を計算（ロールアップを使えない場合）"""
         if df.empty:
             return {
                 'total_posts': 0,
@@ -310,7 +329,7 @@ def main():
     st.sidebar.title("📊 メニュー")
     page = st.sidebar.selectbox(
         "表示内容を選択",
-        ["📈 概要ダッシュボード", "📝 投稿履歴", "📊 パフォーマンス分析", "✏️ 投稿編集", "👥 チーム共有", "📋 自動レポート", "🤖 自動投稿設定"]
+        ["📈 概要ダッシュボード", "📝 投稿履歴", "📊 パフォーマンス分析", "✏️ 投稿編集", "👥 チーム共有", "📋 自動レポート", "🗂️ 全データベース横断", "🤖 自動投稿設定"]
     )
     
     # 概要ダッシュボード
@@ -337,6 +356,10 @@ def main():
     elif page == "📋 自動レポート":
         show_auto_reports(df, stats)
     
+    # 全データベース横断
+    elif page == "🗂️ 全データベース横断":
+        show_federated_view()
+    
     # Threads直接投稿
     elif page == "🤖 自動投稿設定":
         show_direct_posting()
@@ -453,10 +476,12 @@ def show_overview_dashboard(df: pd.DataFrame, stats: Dict):
             st.switch_page("pages/自動投稿設定.py")  # 自動投稿ページへ遷移
 
 def show_post_history(df: pd.DataFrame, dashboard: ThreadsDashboard):
-    """投稿履歴表示"""
+    """投稿履歴表示（絞り込み・ページ分けはSQLで行い、1ページ分だけを表示）"""
     st.header("📝 投稿履歴管理")
     
     if not df.empty:
+        sources = dashboard.history_sources()
+        
         # フィルター
         col1, col2, col3 = st.columns(3)
         
@@ -477,81 +502,122 @@ def show_post_history(df: pd.DataFrame, dashboard: ThreadsDashboard):
         with col3:
             source_filter = st.multiselect(
                 "投稿タイプ",
-                options=df['source'].unique(),
-                default=df['source'].unique()
+                options=list(sources),
+                default=list(sources)
             )
         
-        # フィルタリング
-        filtered_df = df.copy()
-        
-        if len(date_range) == 2:
-            filtered_df = filtered_df[
-                (filtered_df['scheduled_time'].dt.date >= date_range[0]) &
-                (filtered_df['scheduled_time'].dt.date <= date_range[1])
-            ]
-        
-        if status_filter:
-            filtered_df = filtered_df[filtered_df.get('status', '').isin(status_filter)]
-        
         if source_filter:
-            filtered_df = filtered_df[filtered_df['source'].isin(source_filter)]
-        
-        # 投稿一覧
-        st.subheader(f"📋 投稿一覧 ({len(filtered_df)}件)")
-        
-        for idx, post in filtered_df.iterrows():
-            with st.expander(f"{post['scheduled_time'].strftime('%Y/%m/%d %H:%M')} - {post.get('pattern_type', post.get('status', 'N/A'))}"):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.text_area("投稿内容", post['content'], height=100, key=f"content_{idx}")
+            sources = {name: source for name, source in sources.items() if name in source_filter}
+        start_date, end_date = (date_range[0], date_range[1]) if len(date_range) == 2 else (None, None)
+        
+        # 件数を求めてからページを選び、そのページの分だけを読み込む
+        _, total = query_post_page(sources, start_date, end_date, status_filter, page=0, page_size=1)
+        st.subheader(f"📋 投稿一覧 ({total}件)")
+        page, page_size = pagination_controls(total, key="history")
+        page_df, _ = query_post_page(sources, start_date, end_date, status_filter, page, page_size)
+        
+        # 表で選択した投稿だけ詳細とエンゲージメント更新フォームを表示
+        post = show_post_table(page_df, key="history_table")
+        if post is not None:
+            show_post_detail(post, key=f"history_{post['source']}_{post['id']}")
+            
+            with st.form(f"engagement_form_{post['source']}_{post['id']}"):
+                st.write("**📊 エンゲージメント更新**")
+                likes = st.number_input("いいね", min_value=0, value=int(post.get('likes') or 0))
+                shares = st.number_input("シェア", min_value=0, value=int(post.get('shares') or 0))
+                comments = st.number_input("コメント", min_value=0, value=int(post.get('comments') or 0))
+                clicks = st.number_input("クリック", min_value=0, value=int(post.get('clicks') or 0))
                 
-                with col2:
-                    st.write("**統計情報**")
-                    st.write(f"いいね: {post.get('likes', 0)}")
-                    st.write(f"シェア: {post.get('shares', 0)}")
-                    st.write(f"コメント: {post.get('comments', 0)}")
-                    st.write(f"クリック: {post.get('clicks', 0)}")
+                if st.form_submit_button("更新"):
+                    engagement_data = {
+                        'likes': likes,
+                        'shares': shares,
+                        'comments': comments,
+                        'clicks': clicks,
+                        'engagement': (likes + shares + comments) / 10
+                    }
                     
-                    # エンゲージメント更新
-                    if st.button(f"📊 更新", key=f"update_{idx}"):
-                        with st.form(f"engagement_form_{idx}"):
-                            likes = st.number_input("いいね", min_value=0, value=int(post.get('likes', 0)))
-                            shares = st.number_input("シェア", min_value=0, value=int(post.get('shares', 0)))
-                            comments = st.number_input("コメント", min_value=0, value=int(post.get('comments', 0)))
-                            clicks = st.number_input("クリック", min_value=0, value=int(post.get('clicks', 0)))
-                            
-                            if st.form_submit_button("更新"):
-                                engagement_data = {
-                                    'likes': likes,
-                                    'shares': shares,
-                                    'comments': comments,
-                                    'clicks': clicks,
-                                    'engagement': (likes + shares + comments) / 10
-                                }
-                                
-                                if dashboard.update_post_engagement(post['id'], post['source'], engagement_data):
-                                    st.success("更新完了！")
-                                    st.rerun()
+                    if dashboard.update_post_engagement(int(post['id']), post['source'], engagement_data):
+                        st.success("更新完了！")
+                        st.rerun()
     
     else:
         st.warning("投稿履歴がありません。")
 
+def show_federated_view():
+    """全データベース横断ビュー（all_posts ビューに対して絞り込み・集計・ページ分けをSQLで行う）"""
+    st.header("🗂️ 全データベース横断")
+    
+    federation = get_post_federation()
+    available = federation.available_sources()
+    if not available:
+        st.warning("参照できるデータベースがありません。")
+        return
+    
+    # フィルター
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        date_range = st.date_input(
+            "期間選択",
+            value=[date.today() - timedelta(days=30), date.today()],
+            key="federated_dates"
+        )
+    
+    with col2:
+        source_filter = st.multiselect("データベース", options=available, default=available)
+    
+    with col3:
+        statuses = federation.summary('status', sources=source_filter)['status'].tolist()
+        status_filter = st.multiselect("ステータス", options=statuses, default=statuses)
+    
+    with col4:
+        keyword = st.text_input("キーワード", key="federated_keyword")
+    
+    filters = {
+        'start_date': date_range[0] if len(date_range) == 2 else None,
+        'end_date': date_range[1] if len(date_range) == 2 else None,
+        'statuses': status_filter,
+        'sources': source_filter,
+        'keyword': keyword
+    }
+    
+    # データベース別・ステータス別の集計
+    summary = federation.summary('source,status', **filters)
+    if summary.empty:
+        st.info("条件に合う投稿がありません。")
+        return
+    
+    fig = px.bar(summary, x='source', y='posts', color='status', title="データベース別・ステータス別の投稿数")
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # 投稿一覧（1ページ分だけを読み込む）
+    total = int(summary['posts'].sum())
+    st.subheader(f"📋 投稿一覧 ({total}件)")
+    page, page_size = pagination_controls(total, key="federated")
+    page_df, _ = federation.posts(**filters, limit=page_size, offset=page * page_size)
+    
+    post = show_post_table(page_df, key="federated_table")
+    if post is not None:
+        show_post_detail(post, key=f"federated_{post['source']}_{post['post_id']}")
+
 def show_performance_analysis(df: pd.DataFrame, stats: Dict):
     """パフォーマンス分析表示"""
     st.header("📊 パフォーマンス分析")
     
     if not df.empty and stats:
-        # パターン別パフォーマンス
-        if 'pattern_type' in df.columns:
-            st.subheader("🎯 パターン別エンゲージメント")
-            
+        # パターン別パフォーマンス（ロールアップの集計があればそれを使う）
+        pattern_stats = stats.get('pattern_stats')
+        if pattern_stats is None and 'pattern_type' in df.columns:
             pattern_stats = df.groupby('pattern_type').agg({
                 'actual_engagement': 'mean',
                 'clicks': 'sum',
                 'likes': 'sum',
                 'shares': 'sum'
             }).reset_index()
+        
+        if pattern_stats is not None and not pattern_stats.empty:
+            st.subheader("🎯 パターン別エンゲージメント")
             
             fig = px.bar(
                 pattern_stats,
@@ -564,11 +630,13 @@ def show_performance_analysis(df: pd.DataFrame, stats: Dict):
         # 時間帯別分析
         st.subheader("⏰ 時間帯別パフォーマンス")
         
-        df['hour'] = df['scheduled_time'].dt.hour
-        hourly_stats = df.groupby('hour').agg({
-            'actual_engagement': 'mean',
-            'clicks': 'mean'
-        }).reset_index()
+        hourly_stats = stats.get('hourly_stats')
+        if hourly_stats is None:
+            df['hour'] = df['scheduled_time'].dt.hour
+            hourly_stats = df.groupby('hour').agg({
+                'actual_engagement': 'mean',
+                'clicks': 'mean'
+            }).reset_index()
         
         fig = go.Figure()
         
@@ -13,9 +13,149 @@ import sqlite3
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
+from template_engine import render_template
+
+from near_duplicate_index import generate_unique
+
 class ThreadsOptimizedEngine:
     """📱 Threads最適化エンジン"""
     
+    # 🎯 Threadsで高反応の投稿パターン
+    THREADS_PATTERNS = {
+        "shock_value": {
+            "description": "衝撃的な事実で注意を引く",
+            "templates": [
+                "Web制作業界で革命が起きてる。{old_price}のサイトが{new_price}で作れる時代に。{feature}まで込みでこの価格って、もう従来の制作会社の存在意義って何？",
+                "制作費{reduction}削減って聞いて「うそでしょ」って思ったけど、調べたら本当だった。{service}のせいで業界全体が価格見直しを迫られてる。",
+                "「{high_price}の見積もり出したら断られた」って制作会社の友人が嘆いてた理由がわかった。{low_price}で同等のサイトが作れるサービスがあるらしい。"
+            ],
+            "engagement_rate": 9.2
+        },
+        
+        "storytelling": {
+            "description": "具体的なストーリーで共感を誘う",
+            "templates": [
+                "3ヶ月前、クライアントから「サイト制作{budget}以内で」って言われて困ってた。従来なら{normal_cost}は最低必要。でも{service_name}使ったら{actual_cost}で完成。クライアントも大満足。",
+                "スタートアップの知人が資金調達前にサイト必要になって。予算{tight_budget}しかないって相談されて。普通なら「無理」って答えるけど、{solution}があって救われた。",
+                "フリーランス1年目の時、{expensive_quote}の見積もり出して案件流れた苦い思い出がある。今なら{affordable_option}を提案できるのに。当時知ってたら人生変わってたかも。"
+            ],
+            "engagement_rate": 8.8
+        },
+        
+        "data_driven": {
+            "description": "具体的なデータで説得力を持たせる",
+            "templates": [
+                "Web制作の価格破壊が数字で見えてきた。従来：平均{traditional_price} / 新サービス：{new_service_price} = {percentage}%削減。しかも{feature1}＋{feature2}＋{feature3}込み。業界構造が根本から変わる。",
+                "制作期間の比較データ見て驚愕。従来：{old_duration} / 最新：{new_duration}。品質は同等かそれ以上。{efficiency_factor}の効率化がここまで来た。",
+                "コスト内訳を分析してみた。人件費{labor_cost}%、ツール費{tool_cost}%、その他{other_cost}%。{technology}による自動化で人件費を{reduction}%削減したのが価格革命の正体。"
+            ],
+            "engagement_rate": 8.6
+        },
+        
+        "problem_solution": {
+            "description": "問題提起→解決策の流れ",
+            "templates": [
+                "中小企業のWebサイト問題：「{problem1}」「{problem2}」「{problem3}」。でも{solution_service}なら全て解決。{benefit}で{outcome}を実現。",
+                "起業家あるある：{startup_problem}。資金は限られてるのにサイトは必要。そんな状況を想定して作られたのが{service}。{key_feature}が画期的。",
+                "フリーランスの悩み：{freelancer_issue}。案件取りたいけどサイト制作は外注すると利益が薄い。{solution}を使えば{margin_improvement}の利益改善。"
+            ],
+            "engagement_rate": 8.9
+        },
+        
+        "industry_insider": {
+            "description": "業界の内情を暴露するスタイル",
+            "templates": [
+                "制作会社が言わない本当の話。{expensive_cost}の見積もりの内訳：実作業{actual_work}%、利益{profit}%、営業コスト{sales_cost}%。{automated_service}なら営業コスト削減で{final_price}を実現。",
+                "Web制作の「当たり前」を疑え。{myth1}？実際は{reality1}。{myth2}？本当は{reality2}。業界の常識を覆す{revolutionary_service}。",
+                "元制作会社勤務が暴露。{standard_process}で{typical_duration}かかる理由：{reason1}、{reason2}、{reason3}。でも{efficient_service}なら{shortened_time}で完成。"
+            ],
+            "engagement_rate": 9.0
+        },
+        
+        "comparison": {
+            "description": "他の選択肢との比較で優位性を示す",
+            "templates": [
+                "サイト制作の選択肢比較：制作会社{company_cost}、フリーランス{freelancer_cost}、テンプレート{template_cost}、{our_service}{our_cost}。機能と価格の両立なら圧倒的に{our_service}。",
+                "{competitor_a} vs {competitor_b} vs {our_service}。価格：{price_comparison}。機能：{feature_comparison}。サポート：{support_comparison}。総合評価で{our_service}の勝利。",
+                "DIYサイト作成に挫折した人へ。WordPressは{wp_difficulty}、Wixは{wix_limitation}、{our_service}なら{our_advantage}。挫折する前に試してほしい。"
+            ],
+            "engagement_rate": 8.4
+        },
+        
+        "urgency_scarcity": {
+            "description": "緊急性や希少性で行動を促す",
+            "templates": [
+                "この価格でサイト制作できるのは今だけかも。{technology}の普及で制作コストが下がってる今がチャンス。業界が価格調整する前に{action}した方がいい。",
+                "{limited_offer}まで残り{time_left}。通常{regular_price}の{discount_service}が{special_price}。{special_feature}も付いてこの価格は今後ありえない。",
+                "制作会社の価格見直しラッシュが始まってる。{affordable_service}の影響で業界全体の料金体系が崩れつつある。今のうちに{smart_choice}を。"
+            ],
+            "engagement_rate": 8.7
+        },
+        
+        "social_proof": {
+            "description": "他者の成功例や証言を活用",
+            "templates": [
+                "導入企業{company_count}社突破。スタートアップから上場企業まで{service}を選ぶ理由：{reason1}、{reason2}、{reason3}。{testimonial}との声も。",
+                "利用者の{satisfaction}%が満足と回答。「{user_quote}」「{another_quote}」実際の声が{service_quality}を物語ってる。",
+                "{industry}業界での導入率{adoption_rate}%。{case_study}では{improvement}を実現。数字が証明する{service_effectiveness}。"
+            ],
+            "engagement_rate": 8.5
+        },
+        
+        "behind_scenes": {
+            "description": "制作過程や舞台裏を見せる",
+            "templates": [
+                "{service}の制作工程を公開。{step1}→{step2}→{step3}→完成。{technology}と{human_touch}の組み合わせが{quality}と{speed}を両立。",
+                "なぜ{low_price}でプロ品質を実現できるのか。秘密は{secret1}と{secret2}。従来の{traditional_method}を{innovative_method}に変えたのがポイント。",
+                "{service_name}開発者が語る。「{developer_quote}」{optimization}により{cost_reduction}を実現しながら{quality_maintenance}を達成。"
+            ],
+            "engagement_rate": 8.3
+        },
+        
+        "future_prediction": {
+            "description": "業界の未来予測で関心を引く",
+            "templates": [
+                "2025年のWeb制作業界予測。{prediction1}、{prediction2}、{prediction3}。今から{preparation}しておくべき。{forward_thinking_service}はその先を行ってる。",
+                "{years}後、サイト制作は{future_state}になる。{current_service}はその未来を先取り。{early_adopter_advantage}を得るなら今がタイミング。",
+                "AI時代のサイト制作。{ai_impact}により{industry_change}が加速。{adaptive_service}なら{future_proof}で安心。"
+            ],
+            "engagement_rate": 8.1
+        }
+    }
+    
+    # 🎯 商材特化データ
+    SERVICE_DATA = {
+        "service_names": ["LiteWEB+", "この革新的サービス", "話題のWebサービス"],
+        "pricing": {
+            "old_prices": ["30万円", "50万円", "40万円", "60万円", "25万円"],
+            "new_prices": ["1万円", "19,800円", "9,800円"],
+            "reductions": ["90%", "95%", "80%", "85%"],
+            "budgets": ["10万円", "15万円", "20万円", "5万円"]
+        },
+        "features": [
+            "SEO最適化", "レスポンシブデザイン", "高速表示", "独自ドメイン設定",
+            "SSL証明書", "Google Analytics連携", "お問い合わせフォーム",
+            "SNS連携", "検索エンジン登録", "アフターサポート"
+        ],
+        "benefits": [
+            "制作期間3分の1", "維持費95%削減", "SEO効果2倍",
+            "コンバージョン率向上", "ユーザビリティ改善", "ブランド価値向上"
+        ],
+        "problems": [
+            "サイト制作費が高すぎる", "制作期間が長すぎる", "維持費が負担",
+            "SEO効果がない", "スマホ対応していない", "デザインが古い"
+        ]
+    }
+    
+    # 🏷️ 効果的なハッシュタグ
+    EFFECTIVE_HASHTAGS = {
+        "primary": ["Web制作", "ホームページ制作", "サイト制作", "格安制作"],
+        "target": ["スタートアップ", "個人事業主", "中小企業", "起業家"],
+        "benefit": ["コスト削減", "時短", "効率化", "DX推進"],
+        "action": ["無料相談", "見積り無料", "今すぐ相談", "限定価格"],
+        "trending": ["AI活用", "自動化", "デジタル化", "最新技術"]
+    }
+    
     def __init__(self):
         self.db_path = "threads_optimized.db"
         self.fixed_link = "https://s.lmes.jp/landing-qr/2006748792-BXVNxLLm?uLand=vqQV1u"
@@ -23,141 +163,10 @@ class ThreadsOptimizedEngine:
         # データベース初期化
         self._init_database()
         
-        # 🎯 Threadsで高反応の投稿パターン
-        self.threads_patterns = {
-            "shock_value": {
-                "description": "衝撃的な事実で注意を引く",
-                "templates": [
-                    "Web制作業界で革命が起きてる。{old_price}のサイトが{new_price}で作れる時代に。{feature}まで込みでこの価格って、もう従来の制作会社の存在意義って何？",
-                    "制作費{reduction}削減って聞いて「うそでしょ」って思ったけど、調べたら本当だった。{service}のせいで業界全体が価格見直しを迫られてる。",
-                    "「{high_price}の見積もり出したら断られた」って制作会社の友人が嘆いてた理由がわかった。{low_price}で同等のサイトが作れるサービスがあるらしい。"
-                ],
-                "engagement_rate": 9.2
-            },
-            
-            "storytelling": {
-                "description": "具体的なストーリーで共感を誘う",
-                "templates": [
-                    "3ヶ月前、クライアントから「サイト制作{budget}以内で」って言われて困ってた。従来なら{normal_cost}は最低必要。でも{service_name}使ったら{actual_cost}で完成。クライアントも大満足。",
-                    "スタートアップの知人が資金調達前にサイト必要になって。予算{tight_budget}しかないって相談されて。普通なら「無理」って答えるけど、{solution}があって救われた。",
-                    "フリーランス1年目の時、{expensive_quote}の見積もり出して案件流れた苦い思い出がある。今なら{affordable_option}を提案できるのに。当時知ってたら人生変わってたかも。"
-                ],
-                "engagement_rate": 8.8
-            },
-            
-            "data_driven": {
-                "description": "具体的なデータで説得力を持たせる",
-                "templates": [
-                    "Web制作の価格破壊が数字で見えてきた。従来：平均{traditional_price} / 新サービス：{new_service_price} = {percentage}%削減。しかも{feature1}＋{feature2}＋{feature3}込み。業界構造が根本から変わる。",
-                    "制作期間の比較データ見て驚愕。従来：{old_duration} / 最新：{new_duration}。品質は同等かそれ以上。{efficiency_factor}の効率化がここまで来た。",
-                    "コスト内訳を分析してみた。人件費{labor_cost}%、ツール費{tool_cost}%、その他{other_cost}%。{technology}による自動化で人件費を{reduction}%削減したのが価格革命の正体。"
-                ],
-                "engagement_rate": 8.6
-            },
-            
-            "problem_solution": {
-                "description": "問題提起→解決策の流れ",
-                "templates": [
-                    "中小企業のWebサイト問題：「{problem1}」「{problem2}」「{problem3}」。でも{solution_service}なら全て解決。{benefit}で{outcome}を実現。",
-                    "起業家あるある：{startup_problem}。資金は限られてるのにサイトは必要。そんな状況を想定して作られたのが{service}。{key_feature}が画期的。",
-                    "フリーランスの悩み：{freelancer_issue}。案件取りたいけどサイト制作は外注すると利益が薄い。{solution}を使えば{margin_improvement}の利益改善。"
-                ],
-                "engagement_rate": 8.9
-            },
-            
-            "industry_insider": {
-                "description": "業界の内情を暴露するスタイル",
-                "templates": [
-                    "制作会社が言わない本当の話。{expensive_cost}の見積もりの内訳：実作業{actual_work}%、利益{profit}%、営業コスト{sales_cost}%。{automated_service}なら営業コスト削減で{final_price}を実現。",
-                    "Web制作の「当たり前」を疑え。{myth1}？実際は{reality1}。{myth2}？本当は{reality2}。業界の常識を覆す{revolutionary_service}。",
-                    "元制作会社勤務が暴露。{standard_process}で{typical_duration}かかる理由：{reason1}、{reason2}、{reason3}。でも{efficient_service}なら{shortened_time}で完成。"
-                ],
-                "engagement_rate": 9.0
-            },
-            
-            "comparison": {
-                "description": "他の選択肢との比較で優位性を示す",
-                "templates": [
-                    "サイト制作の選択肢比較：制作会社{company_cost}、フリーランス{freelancer_cost}、テンプレート{template_cost}、{our_service}{our_cost}。機能と価格の両立なら圧倒的に{our_service}。",
-                    "{competitor_a} vs {competitor_b} vs {our_service}。価格：{price_comparison}。機能：{feature_comparison}。サポート：{support_comparison}。総合評価で{our_service}の勝利。",
-                    "DIYサイト作成に挫折した人へ。WordPressは{wp_difficulty}、Wixは{wix_limitation}、{our_service}なら{our_advantage}。挫折する前に試してほしい。"
-                ],
-                "engagement_rate": 8.4
-            },
-            
-            "urgency_scarcity": {
-                "description": "緊急性や希少性で行動を促す",
-                "templates": [
-                    "この価格でサイト制作できるのは今だけかも。{technology}の普及で制作コストが下がってる今がチャンス。業界が価格調整する前に{action}した方がいい。",
-                    "{limited_offer}まで残り{time_left}。通常{regular_price}の{discount_service}が{special_price}。{special_feature}も付いてこの価格は今後ありえない。",
-                    "制作会社の価格見直しラッシュが始まってる。{affordable_service}の影響で業界全体の料金体系が崩れつつある。今のうちに{smart_choice}を。"
-                ],
-                "engagement_rate": 8.7
-            },
-            
-            "social_proof": {
-                "description": "他者の成功例や証言を活用",
-                "templates": [
-                    "導入企業{company_count}社突破。スタートアップから上場企業まで{service}を選ぶ理由：{reason1}、{reason2}、{reason3}。{testimonial}との声も。",
-                    "利用者の{satisfaction}%が満足と回答。「{user_quote}」「{another_quote}」実際の声が{service_quality}を物語ってる。",
-                    "{industry}業界での導入率{adoption_rate}%。{case_study}では{improvement}を実現。数字が証明する{service_effectiveness}。"
-                ],
-                "engagement_rate": 8.5
-            },
-            
-            "behind_scenes": {
-                "description": "制作過程や舞台裏を見せる",
-                "templates": [
-                    "{service}の制作工程を公開。{step1}→{step2}→{step3}→完成。{technology}と{human_touch}の組み合わせが{quality}と{speed}を両立。",
-                    "なぜ{low_price}でプロ品質を実現できるのか。秘密は{secret1}と{secret2}。従来の{traditional_method}を{innovative_method}に変えたのがポイント。",
-                    "{service_name}開発者が語る。「{developer_quote}」{optimization}により{cost_reduction}を実現しながら{quality_maintenance}を達成。"
-                ],
-                "engagement_rate": 8.3
-            },
-            
-            "future_prediction": {
-                "description": "業界の未来予測で関心を引く",
-                "templates": [
-                    "2025年のWeb制作業界予測。{prediction1}、{prediction2}、{prediction3}。今から{preparation}しておくべき。{forward_thinking_service}はその先を行ってる。",
-                    "{years}後、サイト制作は{future_state}になる。{current_service}はその未来を先取り。{early_adopter_advantage}を得るなら今がタイミング。",
-                    "AI時代のサイト制作。{ai_impact}により{industry_change}が加速。{adaptive_service}なら{future_proof}で安心。"
-                ],
-                "engagement_rate": 8.1
-            }
-        }
-        
-        # 🎯 商材特化データ
-        self.service_data = {
-            "service_names": ["LiteWEB+", "この革新的サービス", "話題のWebサービス"],
-            "pricing": {
-                "old_prices": ["30万円", "50万円", "40万円", "60万円", "25万円"],
-                "new_prices": ["1万円", "19,800円", "9,800円"],
-                "reductions": ["90%", "95%", "80%", "85%"],
-                "budgets": ["10万円", "15万円", "20万円", "5万円"]
-            },
-            "features": [
-                "SEO最適化", "レスポンシブデザイン", "高速表示", "独自ドメイン設定",
-                "SSL証明書", "Google Analytics連携", "お問い合わせフォーム",
-                "SNS連携", "検索エンジン登録", "アフターサポート"
-            ],
-            "benefits": [
-                "制作期間3分の1", "維持費95%削減", "SEO効果2倍",
-                "コンバージョン率向上", "ユーザビリティ改善", "ブランド価値向上"
-            ],
-            "problems": [
-                "サイト制作費が高すぎる", "制作期間が長すぎる", "維持費が負担",
-                "SEO効果がない", "スマホ対応していない", "デザインが古い"
-            ]
-        }
-        
-        # 🏷️ 効果的なハッシュタグ
-        self.effective_hashtags = {
-            "primary": ["Web制作", "ホームページ制作", "サイト制作", "格安制作"],
-            "target": ["スタートアップ", "個人事業主", "中小企業", "起業家"],
-            "benefit": ["コスト削減", "時短", "効率化", "DX推進"],
-            "action": ["無料相談", "見積り無料", "今すぐ相談", "限定価格"],
-            "trending": ["AI活用", "自動化", "デジタル化", "最新技術"]
-        }
+        # パターン・商材データ・ハッシュタグはクラスで一度だけ組み立てたものを全インスタンスで共有する
+        self.threads_patterns = self.THREADS_PATTERNS
+        self.service_data = self.SERVICE_DATA
+        self.effective_hashtags = self.EFFECTIVE_HASHTAGS
     
     def _init_database(self):
         """データベース初期化"""
@@ -179,8 +188,8 @@ class ThreadsOptimizedEngine:
         conn.commit()
         conn.close()
     
-    async def generate_threads_post(self, post_number: int, target_datetime: datetime) -> Dict[str, Any]:
-        """Threads最適化投稿生成"""
+    async def generate_threads_post(self, post_number: int, target_datetime: datetime, attempt: int = 0) -> Dict[str, Any]:
+        """Threads最適化投稿生成（attempt を変えると同じ日時でも別の投稿になる）"""
         
         # パターン選択（時間帯と投稿番号で最適化）
         hour = target_datetime.hour
@@ -207,7 +216,7 @@ class ThreadsOptimizedEngine:
         pattern_type = preferred[post_number % len(preferred)]
         
         # コンテンツ生成
-        content = await self._generate_pattern_content(pattern_type, post_number, target_datetime)
+        content = await self._generate_pattern_content(pattern_type, post_number, target_datetime, attempt)
         
         # ハッシュタグ選択
         hashtags = self._select_hashtags(pattern_type, post_number)
@@ -230,11 +239,12 @@ class ThreadsOptimizedEngine:
             "engagement_prediction": engagement_score
         }
     
-    async def _generate_pattern_content(self, pattern_type: str, post_number: int, target_datetime: datetime) -> str:
+    async def _generate_pattern_content(self, pattern_type: str, post_number: int, target_datetime: datetime,
+                                        attempt: int = 0) -> str:
         """パターン別コンテンツ生成"""
         
-        # ランダムシード（日付と投稿番号で一意性確保）
-        random.seed(int(target_datetime.timestamp()) + post_number * 23)
+        # ランダムシード（日付と投稿番号で一意性確保、作り直す場合は試行番号で変える）
+        random.seed(int(target_datetime.timestamp()) + post_number * 23 + attempt)
         
         pattern_info = self.threads_patterns[pattern_type]
         template = random.choice(pattern_info["templates"])
@@ -264,9 +274,7 @@ class ThreadsOptimizedEngine:
             variables = {}
         
         # 変数置換
-        content = template
-        for key, value in variables.items():
-            content = content.replace(f"{{{key}}}", str(value))
+        content = render_template(template, variables)
         
         return content
     
@@ -519,8 +527,10 @@ class ThreadsOptimizedEngine:
             hour, minute = map(int, time_str.split(':'))
             post_time = target_date.replace(hour=hour, minute=minute)
             
-            # Threads最適化投稿生成
-            post_data = await self.generate_threads_post(i, post_time)
+            # Threads最適化投稿生成（過去の投稿と準重複なら作り直す）
+            post_data = await generate_unique(
+                lambda attempt: self.generate_threads_post(i, post_time, attempt)
+            )
             
             posts.append({
                 "content": f"{post_data['content']}\t{' '.join(post_data['hashtags'])}",
@@ -26,6 +26,7 @@ import joblib
 import requests
 from anthropic import Anthropic
 import openai
+from llm_cache import get_llm_cache
 from fastapi import FastAPI, BackgroundTasks
 from fastapi.responses import HTMLResponse
 import uvicorn
@@ -212,13 +213,17 @@ class UltimateThreadsSystem2025:
         4. 収益につながる行動を促す
         """
         
-        response = self.anthropic.messages.create(
-            model="claude-3-opus-20240229",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000
-        )
+        def create():
+            response = self.anthropic.messages.create(
+                model="claude-3-opus-20240229",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=1000
+            )
+            return response.content[0].text
         
-        return response.content[0].text
+        # 同じ投稿・パターンでの再最適化はキャッシュした応答を使う
+        optimized, _ = get_llm_cache().get_or_create("claude-3-opus-20240229", prompt, create)
+        return optimized
         
     def _predict_revenue(self, content: str, hashtags: List[str]) -> float:
         """機械学習で収益を予測"""
@@ -13,6 +13,8 @@ import sqlite3
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
 
+from near_duplicate_index import generate_unique
+
 class ViralBuzzEngine:
     """🔥 バイラルバズエンジン"""
     
@@ -190,8 +192,8 @@ class ViralBuzzEngine:
         conn.commit()
         conn.close()
     
-    async def generate_buzz_post(self, post_number: int, target_datetime: datetime) -> Dict[str, Any]:
-        """バズる口コミ風投稿生成"""
+    async def generate_buzz_post(self, post_number: int, target_datetime: datetime, attempt: int = 0) -> Dict[str, Any]:
+        """バズる口コミ風投稿生成（attempt を変えると別の投稿になる）"""
         
         # パターン選択（投稿番号と時間で変化）
         patterns = list(self.buzz_patterns.keys())
@@ -210,7 +212,7 @@ class ViralBuzzEngine:
             pattern_type = random.choice(["story", "social_proof"])
         
         # 投稿生成
-        content = await self._generate_pattern_content(pattern_type, post_number)
+        content = await self._generate_pattern_content(pattern_type, post_number, attempt)
         
         # ハッシュタグ選択
         hashtag = self._select_hashtag(pattern_type, post_number)
@@ -229,11 +231,11 @@ class ViralBuzzEngine:
             "engagement_prediction": random.uniform(8.5, 9.8)
         }
     
-    async def _generate_pattern_content(self, pattern_type: str, post_number: int) -> str:
+    async def _generate_pattern_content(self, pattern_type: str, post_number: int, attempt: int = 0) -> str:
         """パターン別コンテンツ生成"""
         
-        # ランダムシード（投稿番号ベース）
-        random.seed(int(datetime.now().timestamp()) + post_number * 17)
+        # ランダムシード（投稿番号ベース、作り直す場合は試行番号で変える）
+        random.seed(int(datetime.now().timestamp()) + post_number * 17 + attempt)
         
         if pattern_type == "discovery":
             return self._generate_discovery_pattern()
@@ -490,8 +492,10 @@ class ViralBuzzEngine:
             hour, minute = map(int, time_str.split(':'))
             post_time = target_date.replace(hour=hour, minute=minute)
             
-            # バズ投稿生成
-            post_data = await self.generate_buzz_post(i, post_time)
+            # バズ投稿生成（過去の投稿と準重複なら作り直す）
+            post_data = await generate_unique(
+                lambda attempt: self.generate_buzz_post(i, post_time, attempt)
+            )
             
             # ハッシュタグ付きコンテンツ
             content_with_tag = f"{post_data['content']}\t{post_data['hashtag']}"
@@ -39,6 +39,8 @@ class AutoPostScheduler:
         ]
         self.daily_post_limit = 4
         self.min_interval_hours = 3
+        # Selenium投稿1件にかかる時間より十分長く
+        self.lease_seconds = 600
         
     def setup_database(self):
         """データベースの初期設定"""
@@ -72,9 +74,26 @@ class AutoPostScheduler:
         )
         """)
         
+        # 送信中の投稿を他のプロセスが二重に投稿しないための貸出期限
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(auto_posts)")]
+        if 'lease_expires_at' not in columns:
+            cursor.execute("ALTER TABLE auto_posts ADD COLUMN lease_expires_at REAL")
+        
         conn.commit()
         conn.close()
     
+    def claim_post(self, conn, post_id) -> bool:
+        """投稿を scheduled → sending に切り替える（他のプロセスが取得済みなら False）"""
+        now = time.time()
+        cursor = conn.execute("""
+        UPDATE auto_posts
+        SET status = 'sending', lease_expires_at = ?
+        WHERE id = ?
+        AND (status = 'scheduled' OR (status = 'sending' AND lease_expires_at < ?))
+        """, (now + self.lease_seconds, post_id, now))
+        conn.commit()
+        return cursor.rowcount == 1
+    
     def calculate_next_post_time(self) -> datetime:
         """次の最適な投稿時間を計算"""
         now = datetime.now()
@@ -250,15 +269,19 @@ class AutoPostScheduler:
         """スケジュールされた投稿を実行"""
         conn = sqlite3.connect(self.db_path)
         
-        # 実行時刻を過ぎた投稿を取得
+        # 実行時刻を過ぎた投稿（と貸出期限の切れた送信中の投稿）を取得
         pending_posts = pd.read_sql_query("""
             SELECT * FROM auto_posts
-            WHERE status = 'scheduled'
-            AND scheduled_time <= datetime('now')
+            WHERE (status = 'scheduled' AND scheduled_time <= datetime('now'))
+            OR (status = 'sending' AND lease_expires_at < ?)
             ORDER BY scheduled_time ASC
-        """, conn)
+        """, conn, params=(time.time(),))
         
         for _, post in pending_posts.iterrows():
+            # 同じアカウントなので並列にはせず、1件ずつ確保してから投稿する
+            if not self.claim_post(conn, int(post['id'])):
+                continue
+            
             print(f"\n🚀 投稿を実行します (ID: {post['id']})")
             
             # ハッシュタグをパース
@@ -272,16 +295,16 @@ class AutoPostScheduler:
             if result['success']:
                 cursor.execute("""
                 UPDATE auto_posts
-                SET status = 'posted', posted_time = ?, post_url = ?
+                SET status = 'posted', posted_time = ?, post_url = ?, lease_expires_at = NULL
                 WHERE id = ?
-                """, (result['posted_at'], result.get('post_url'), post['id']))
+                """, (result['posted_at'], result.get('post_url'), int(post['id'])))
                 print(f"✅ 投稿成功!")
             else:
                 cursor.execute("""
                 UPDATE auto_posts
-                SET status = 'failed'
+                SET status = 'failed', lease_expires_at = NULL
                 WHERE id = ?
-                """, (post['id'],))
+                """, (int(post['id']),))
                 print(f"❌ 投稿失敗: {result.get('error')}")
             
             conn.commit()
@@ -5,13 +5,14 @@ complete_backend_server_final.py に追加するコード
 """
 
 import os
-import requests
 from flask import jsonify
 from datetime import datetime
 import schedule
 import time
 from threading import Thread
 
+from http_client import get_http_client
+
 # Threads API設定
 THREADS_ACCESS_TOKEN = os.getenv('THREADS_ACCESS_TOKEN')
 THREADS_USER_ID = os.getenv('THREADS_USER_ID')
@@ -81,7 +82,7 @@ def add_threads_routes(app, claude_client, logger):
                 'access_token': THREADS_ACCESS_TOKEN
             }
             
-            response = requests.get(url, params=params)
+            response = get_http_client().get(url, params=params)
             
             if response.status_code == 200:
                 user_data = response.json()
@@ -138,6 +139,8 @@ def generate_post_with_claude(claude_client):
 
 def post_to_threads(content):
     """Threads APIで投稿"""
+    # コンテナ作成と公開の2回の往復で同じキープアライブ接続を使う
+    http = get_http_client()
     try:
         # ステップ1: メディアコンテナ作成
         create_url = f"{THREADS_API_URL}/{THREADS_USER_ID}/threads"
@@ -147,7 +150,7 @@ def post_to_threads(content):
             'access_token': THREADS_ACCESS_TOKEN
         }
         
-        response = requests.post(create_url, data=create_data)
+        response = http.post(create_url, data=create_data)
         
         if response.status_code != 200:
             return {
@@ -164,7 +167,7 @@ def post_to_threads(content):
             'access_token': THREADS_ACCESS_TOKEN
         }
         
-        publish_response = requests.post(publish_url, data=publish_data)
+        publish_response = http.post(publish_url, data=publish_data)
         
         if publish_response.status_code == 200:
             return {
@@ -191,7 +194,7 @@ def setup_scheduler(app):
         """スケジュールされた投稿を実行"""
         with app.app_context():
             try:
-                response = requests.post('http://localhost:5000/api/webhook/auto-post')
+                response = get_http_client().post('http://localhost:5000/api/webhook/auto-post')
                 print(f"Scheduled post: {response.json()}")
             except Exception as e:
                 print(f"Scheduled post error: {e}")
@@ -0,0 +1,166 @@
+"""
+一括類似度計算
+N件の候補投稿とM件の履歴投稿を文字n-gramのハッシュ化疎ベクトルに変換し、
+SciPyの疎行列積でまとめてJaccard係数を求める（Pythonの二重ループを使わない）
+"""
+
+import threading
+import zlib
+
+import numpy as np
+from scipy import sparse
+
+from near_duplicate_index import NEAR_DUPLICATE_THRESHOLD, shingles
+
+# n-gramをハッシュで割り当てる特徴次元数（衝突は類似度をわずかに押し上げるだけ）
+NGRAM_FEATURES = 1 << 20
+
+
+def ngram_vectors(texts, n_features=NGRAM_FEATURES):
+    """テキストごとのn-gram集合を0/1の疎行列（len(texts) × n_features）に変換"""
+    indptr = [0]
+    indices = []
+    for text in texts:
+        indices.extend({zlib.crc32(value.encode('utf-8')) % n_features for value in shingles(text)})
+        indptr.append(len(indices))
+
+    data = np.ones(len(indices), dtype=np.float32)
+    return sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(texts), n_features)
+    )
+
+
+def row_sizes(matrix):
+    """各行のn-gram数"""
+    return np.diff(matrix.indptr).astype(np.float32)
+
+
+def jaccard_matrix(left, right, right_transposed=None, right_sizes=None):
+    """0/1疎行列どうしのJaccard係数の疎行列（共通のn-gramがない組は0のまま格納しない）
+
+    right を何度も使う場合は転置（CSR）と行サイズを渡すと毎回の変換を省ける。
+    """
+    if right_transposed is None:
+        right_transposed = right.T.tocsr()
+    if right_sizes is None:
+        right_sizes = row_sizes(right)
+    intersection = (left @ right_transposed).tocoo()
+    left_sizes = row_sizes(left)
+    union = left_sizes[intersection.row] + right_sizes[intersection.col] - intersection.data
+    return sparse.csr_matrix(
+        (intersection.data / union, (intersection.row, intersection.col)),
+        shape=intersection.shape
+    )
+
+
+def top_pairs(matrix, k=10, threshold=0.0):
+    """類似度行列から上位k組を [(行, 列, 類似度)] の降順で返す"""
+    coo = matrix.tocoo()
+    mask = coo.data >= threshold
+    rows, cols, values = coo.row[mask], coo.col[mask], coo.data[mask]
+    if len(values) > k:
+        selected = np.argpartition(-values, k - 1)[:k]
+        rows, cols, values = rows[selected], cols[selected], values[selected]
+
+    order = np.argsort(-values, kind='stable')
+    return [(int(rows[i]), int(cols[i]), float(values[i])) for i in order]
+
+
+def top_similar_pairs(candidates, history, k=10, threshold=0.0):
+    """候補 N 件と履歴 M 件の中で最も似ている上位k組 [(候補の番号, 履歴の番号, 類似度)]"""
+    if not candidates or not history:
+        return []
+    return top_pairs(jaccard_matrix(ngram_vectors(candidates), ngram_vectors(history)), k, threshold)
+
+
+class SimilarityCorpus:
+    """履歴投稿のn-gram行列を保持し、候補の一括判定に使う
+
+    履歴は最初に一度だけベクトル化し、以降は add() で追加分だけを積み増す。
+    追加分は小さなブロックのまま比較し、ある程度溜まったら本体に統合する。
+    """
+
+    # 追加ブロックを本体に統合する行数（本体の1割とこの値の大きい方）
+    COMPACT_ROWS = 5000
+
+    def __init__(self, texts=(), keys=None):
+        self._lock = threading.Lock()
+        self._segments = []  # [(行列, 転置, 行サイズ)]。転置は n-gram → 履歴の転置索引として働く
+        self.keys = []
+        self.add(texts, keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, texts, keys=None):
+        """履歴に投稿を追加（keys 未指定なら通し番号）"""
+        texts = list(texts)
+        if not texts:
+            return
+        block = ngram_vectors(texts)
+        segment = (block, block.T.tocsr(), row_sizes(block))
+        with self._lock:
+            start = len(self.keys)
+            self.keys.extend(keys if keys is not None else range(start, start + len(texts)))
+            self._segments.append(segment)
+            self._compact()
+
+    def _compact(self):
+        if len(self._segments) < 2:
+            return
+        base_rows = self._segments[0][0].shape[0]
+        pending_rows = sum(segment[0].shape[0] for segment in self._segments[1:])
+        if pending_rows < max(self.COMPACT_ROWS, base_rows // 10):
+            return
+        matrix = sparse.vstack([segment[0] for segment in self._segments], format='csr')
+        self._segments = [(matrix, matrix.T.tocsr(), row_sizes(matrix))]
+
+    def _scores(self, vectors):
+        """候補 × 履歴全体の類似度行列（列の並びは keys と同じ）"""
+        with self._lock:
+            segments = list(self._segments)
+        return sparse.hstack(
+            [jaccard_matrix(vectors, matrix, transposed, sizes) for matrix, transposed, sizes in segments],
+            format='csr'
+        )
+
+    def top_pairs(self, candidates, k=10, threshold=0.0):
+        """候補と履歴の上位k組 [(候補の番号, 履歴のキー, 類似度)]"""
+        if not candidates or not self.keys:
+            return []
+        pairs = top_pairs(self._scores(ngram_vectors(candidates)), k, threshold)
+        return [(row, self.keys[col], similarity) for row, col, similarity in pairs]
+
+    def find_near_duplicates(self, candidates, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """候補ごとに類似度 threshold 以上の相手を返す（なければ None）
+
+        相手は履歴なら ('history', キー, 類似度)、同じバッチ内の先の候補なら
+        ('batch', 候補の番号, 類似度)。バッチ内で重複と判定された候補は後続の比較相手にしない。
+        """
+        if not candidates:
+            return []
+
+        vectors = ngram_vectors(candidates)
+        results = [None] * len(candidates)
+
+        if self.keys:
+            scores = self._scores(vectors)
+            best_cols = np.asarray(scores.argmax(axis=1)).ravel()
+            best_scores = scores.max(axis=1).toarray().ravel()
+            for row in np.flatnonzero(best_scores >= threshold):
+                results[row] = ('history', self.keys[best_cols[row]], float(best_scores[row]))
+
+        # バッチ内（N×N は小さいので密行列で十分）
+        within = jaccard_matrix(vectors, vectors).toarray()
+        accepted = []
+        for row in range(len(candidates)):
+            if results[row] is None and accepted:
+                earlier = np.asarray(accepted)
+                best = int(np.argmax(within[row, earlier]))
+                if within[row, earlier[best]] >= threshold:
+                    results[row] = ('batch', int(earlier[best]), float(within[row, earlier[best]]))
+            if results[row] is None:
+                accepted.append(row)
+
+        return results
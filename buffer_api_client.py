@@ -5,12 +5,13 @@ Threads投稿を自動化するためのBuffer API連携
 """
 
 import os
-import requests
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from http_client import get_http_client
+
 load_dotenv()
 
 class BufferAPIClient:
@@ -20,6 +21,7 @@ class BufferAPIClient:
         self.access_token = os.getenv('BUFFER_ACCESS_TOKEN')
         self.profile_id = os.getenv('BUFFER_PROFILE_ID')
         self.base_url = "https://api.bufferapp.com/1"
+        self.http = get_http_client()
         
         if not self.access_token:
             raise ValueError("BUFFER_ACCESS_TOKENが設定されていません。")
@@ -28,7 +30,7 @@ class BufferAPIClient:
     
     def get_profile_info(self) -> Dict:
         """プロファイル情報を取得"""
-        response = requests.get(
+        response = self.http.get(
             f"{self.base_url}/profiles/{self.profile_id}.json",
             params={"access_token": self.access_token}
         )
@@ -54,7 +56,7 @@ class BufferAPIClient:
             # 即座に投稿
             data["now"] = True
         
-        response = requests.post(
+        response = self.http.post(
             f"{self.base_url}/updates/create.json",
             data=data
         )
@@ -80,7 +82,7 @@ class BufferAPIClient:
     
     def get_pending_posts(self) -> List[Dict]:
         """予約投稿一覧を取得"""
-        response = requests.get(
+        response = self.http.get(
             f"{self.base_url}/profiles/{self.profile_id}/updates/pending.json",
             params={"access_token": self.access_token}
         )
@@ -92,7 +94,7 @@ class BufferAPIClient:
     
     def get_sent_posts(self, limit: int = 10) -> List[Dict]:
         """送信済み投稿を取得"""
-        response = requests.get(
+        response = self.http.get(
             f"{self.base_url}/profiles/{self.profile_id}/updates/sent.json",
             params={
                 "access_token": self.access_token,
@@ -107,7 +109,7 @@ class BufferAPIClient:
     
     def delete_post(self, update_id: str) -> bool:
         """投稿を削除"""
-        response = requests.post(
+        response = self.http.post(
             f"{self.base_url}/updates/{update_id}/destroy.json",
             data={"access_token": self.access_token}
         )
@@ -116,7 +118,7 @@ class BufferAPIClient:
     
     def get_analytics(self, update_id: str) -> Dict:
         """投稿の分析データを取得"""
-        response = requests.get(
+        response = self.http.get(
             f"{self.base_url}/updates/{update_id}/analytics.json",
             params={"access_token": self.access_token}
         )
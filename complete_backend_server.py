@@ -10,12 +10,12 @@ import requests
 import json
 import os
 import sqlite3
+import sys
 from datetime import datetime, timedelta
 import logging
 import uuid
-import threading
 import time
-import schedule
+import calendar
 from werkzeug.utils import secure_filename
 import pandas as pd
 from pathlib import Path
@@ -23,6 +23,7 @@ from pathlib import Path
 # 新しい多様性管理システムをインポート
 from post_diversity_manager import PostDiversityManager
 from enhanced_post_generator import EnhancedPostGenerator
+from event_scheduler import EventScheduler
 
 # ログ設定
 logging.basicConfig(
@@ -49,6 +50,32 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 # アップロードフォルダの作成
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 送信時刻の来た投稿（LEAD_TIME 先までの範囲）
+PENDING_POSTS_QUERY = '''
+    SELECT * FROM posts 
+    WHERE status = 'pending' 
+    AND scheduled_ts <= CAST(strftime('%s', ?) AS INTEGER)
+    AND scheduled_ts > CAST(strftime('%s', ?) AS INTEGER)
+    ORDER BY scheduled_ts
+'''
+
+# 指定時刻より後で最も早い投稿の予定時刻
+NEXT_PENDING_TIME_QUERY = '''
+    SELECT MIN(scheduled_ts) FROM posts
+    WHERE status = 'pending'
+    AND scheduled_ts > CAST(strftime('%s', ?) AS INTEGER)
+'''
+
+POSTS_LIST_QUERY = "SELECT * FROM posts ORDER BY created_ts DESC"
+
+def hot_queries(now):
+    """実行計画を確認する主要クエリ {名前: (SQL, パラメータ)}"""
+    return {
+        'pending_posts': (PENDING_POSTS_QUERY, (now, now)),
+        'next_pending_time': (NEXT_PENDING_TIME_QUERY, (now,)),
+        'posts_list': (POSTS_LIST_QUERY, ())
+    }
+
 class Database:
     """SQLiteデータベースマネージャー"""
     
@@ -98,10 +125,55 @@ class Database:
             )
         ''')
         
+        # 時刻の整数カラムとインデックスを追加
+        self._migrate_posts_timestamps(cursor)
+        
         conn.commit()
         conn.close()
+        
+        # 主要クエリがインデックスを使えているか起動時に確認する
+        for name, plan in self.check_query_plans():
+            logger.warning(f"主要クエリがテーブルスキャン・一時ソートになっています: {name} {plan}")
+        
         logger.info("データベースの初期化完了")
     
+    def _migrate_posts_timestamps(self, cursor):
+        """scheduled_time/created_at のエポック秒カラム（生成カラム）とインデックスを追加
+
+        datetime(scheduled_time) のような比較ではインデックスが使えないため、
+        整数の scheduled_ts/created_ts で比較・並び替えを行う。
+        """
+        cursor.execute("PRAGMA table_xinfo(posts)")
+        columns = {row[1] for row in cursor.fetchall()}
+        
+        for ts_column, source_column in (('scheduled_ts', 'scheduled_time'), ('created_ts', 'created_at')):
+            if ts_column not in columns:
+                cursor.execute(f'''
+                    ALTER TABLE posts ADD COLUMN {ts_column} INTEGER
+                    GENERATED ALWAYS AS (CAST(strftime('%s', {source_column}) AS INTEGER)) VIRTUAL
+                ''')
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_scheduled_ts ON posts (status, scheduled_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_genre_created_ts ON posts (genre, created_ts)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_posts_created_ts ON posts (created_ts)")
+    
+    def check_query_plans(self):
+        """主要クエリの実行計画を確認し、テーブルスキャンや一時ソートになっているものを返す
+
+        戻り値は [(クエリ名, 実行計画の行リスト)]。空ならすべてインデックスを使用している。
+        （"SCAN posts USING INDEX ..." はインデックス順の走査なので問題としない）
+        """
+        now = datetime.now().isoformat()
+        problems = []
+        
+        for name, (query, params) in hot_queries(now).items():
+            plan = [row[3] for row in self.execute_query(f"EXPLAIN QUERY PLAN {query}", params, fetch=True)]
+            if any(detail in ('SCAN posts', 'SCAN TABLE posts') or 'TEMP B-TREE' in detail
+                   for detail in plan):
+                problems.append((name, plan))
+        
+        return problems
+    
     def get_connection(self):
         """データベース接続を取得"""
         return sqlite3.connect(self.db_path)
@@ -471,10 +543,7 @@ def posts():
     if request.method == 'GET':
         try:
             # データベースから投稿を取得
-            result = db.execute_query(
-                "SELECT * FROM posts ORDER BY created_at DESC",
-                fetch=True
-            )
+            result = db.execute_query(POSTS_LIST_QUERY, fetch=True)
             
             posts_data = []
             for row in result:
@@ -511,11 +580,18 @@ def posts():
             for post in posts_to_save:
                 post_id = post.get('id', str(uuid.uuid4()))
                 
+                # 同じIDは置き換える（UPSERT なら置換でも統計カウンタの更新トリガーが発火する）
                 db.execute_query('''
-                    INSERT OR REPLACE INTO posts 
+                    INSERT INTO posts 
                     (id, text, image_urls, genre, scheduled_time, buffer_sent_time, 
                      status, concept_source, reference_post, created_at, updated_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        text = excluded.text, image_urls = excluded.image_urls, genre = excluded.genre,
+                        scheduled_time = excluded.scheduled_time, buffer_sent_time = excluded.buffer_sent_time,
+                        status = excluded.status, concept_source = excluded.concept_source,
+                        reference_post = excluded.reference_post, created_at = excluded.created_at,
+                        updated_at = excluded.updated_at
                 ''', (
                     post_id,
                     post.get('text', ''),
@@ -532,6 +608,7 @@ def posts():
                 saved_count += 1
             
             logger.info(f"投稿保存完了: {saved_count}件")
+            scheduler.wake()
             
             return jsonify({
                 "success": True,
@@ -564,6 +641,7 @@ def post_operations(post_id):
             ))
             
             logger.info(f"投稿更新完了: {post_id}")
+            scheduler.wake()
             
             return jsonify({
                 "success": True,
@@ -745,8 +823,14 @@ def settings():
 class PostScheduler:
     """投稿スケジューラー"""
     
+    # 予約時刻の何分前にBufferへ送るか
+    LEAD_TIME = timedelta(minutes=15)
+    # 送信に失敗した投稿の再試行間隔
+    RETRY_INTERVAL = timedelta(minutes=5)
+    
     def __init__(self):
         self.running = False
+        self.event_scheduler = EventScheduler('post-scheduler')
     
     def start(self):
         """スケジューラーを開始"""
@@ -754,30 +838,44 @@ class PostScheduler:
             return
         
         self.running = True
-        schedule.every(5).minutes.do(self.check_pending_posts)
-        
-        def run_scheduler():
-            while self.running:
-                schedule.run_pending()
-                time.sleep(30)
-        
-        scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-        scheduler_thread.start()
+        # 5分ごとのポーリングではなく、次の投稿の送信時刻まで待機する
+        self.event_scheduler.add_job('check', self.run_check)
+        self.event_scheduler.start()
         logger.info("投稿スケジューラーを開始しました")
     
+    def wake(self):
+        """投稿の追加・予約時刻の変更時に呼び出し、次の送信時刻を再計算させる"""
+        if self.running:
+            self.event_scheduler.wake('check')
+    
+    def run_check(self):
+        """送信時刻の来た投稿を送り、次に起きる時刻（time.time() 基準）を返す"""
+        failed = self.check_pending_posts()
+        
+        now = datetime.now()
+        window_end = now + self.LEAD_TIME
+        # 今回の対象範囲より後で最も早い投稿
+        result = db.execute_query(NEXT_PENDING_TIME_QUERY, (window_end.isoformat(),), fetch=True)
+        
+        candidates = []
+        if result and result[0][0] is not None:
+            # scheduled_ts はタイムゾーン無しの時刻をUTCとして換算した値なので、差分で待ち時間を求める
+            seconds_until_window = result[0][0] - calendar.timegm(window_end.timetuple())
+            candidates.append(time.time() + max(0, seconds_until_window))
+        if failed:
+            candidates.append(time.time() + self.RETRY_INTERVAL.total_seconds())
+        
+        return min(candidates) if candidates else None
+    
     def check_pending_posts(self):
-        """投稿予定をチェックして送信"""
+        """投稿予定をチェックして送信（送信に失敗した件数を返す）"""
+        failed = 0
         try:
             now = datetime.now()
             # 現在時刻から15分後の投稿を検索
-            target_time = now + timedelta(minutes=15)
+            target_time = now + self.LEAD_TIME
             
-            result = db.execute_query('''
-                SELECT * FROM posts 
-                WHERE status = 'pending' 
-                AND datetime(scheduled_time) <= datetime(?)
-                AND datetime(scheduled_time) > datetime(?)
-            ''', (
+            result = db.execute_query(PENDING_POSTS_QUERY, (
                 target_time.isoformat(),
                 now.isoformat()
             ), fetch=True)
@@ -797,10 +895,14 @@ class PostScheduler:
                     logger.info(f"投稿をBuffer送信: {post_id}")
                     
                 except Exception as e:
+                    failed += 1
                     logger.error(f"Buffer送信失敗 {post_id}: {str(e)}")
                     
         except Exception as e:
+            failed += 1
             logger.error(f"スケジューラーエラー: {str(e)}")
+        
+        return failed
     
     def send_to_buffer(self, post_row):
         """Buffer APIに投稿を送信"""
@@ -839,12 +941,38 @@ class PostScheduler:
     def stop(self):
         """スケジューラーを停止"""
         self.running = False
+        self.event_scheduler.stop(timeout=10)
         logger.info("投稿スケジューラーを停止しました")
 
 # スケジューラーインスタンス
 scheduler = PostScheduler()
 
+def self_test():
+    """新しいデータベースで主要クエリがすべてインデックスを使い、インデックスを消すと検出できることを確認"""
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as directory:
+        test_db = Database(os.path.join(directory, 'self_test.db'))
+        problems = test_db.check_query_plans()
+        assert problems == [], f"テーブルスキャン・一時ソートになっている主要クエリがあります: {problems}"
+        print(f"✅ 主要クエリ{len(hot_queries(datetime.now().isoformat()))}件はすべてインデックスを使用")
+        
+        test_db.execute_query("DROP INDEX idx_posts_created_ts")
+        names = [name for name, _ in test_db.check_query_plans()]
+        assert 'posts_list' in names, names
+        print("✅ インデックスがなければテーブルスキャンとして検出")
+    return True
+
 if __name__ == '__main__':
+    # 自己診断（python complete_backend_server.py --self-test）
+    if len(sys.argv) > 1 and sys.argv[1] == "--self-test":
+        try:
+            self_test()
+        except AssertionError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        sys.exit(0)
+    
     # 設定ファイルのサンプルを作成
     if not os.path.exists('settings.json'):
         example_settings = {
@@ -3,7 +3,7 @@ Threads自動投稿システム - 完全版バックエンドサーバー（最
 多様性システムを統合し、完全に動作するバージョン
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import anthropic
 import requests
@@ -15,12 +15,15 @@ import logging
 import uuid
 import threading
 import time
-import schedule
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 import pandas as pd
 from pathlib import Path
 import random
 import hashlib
+import base64
+import calendar
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # 環境変数を読み込み
@@ -31,6 +34,17 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from post_diversity_manager import PostDiversityManager
 from enhanced_post_generator import EnhancedPostGenerator
+from event_scheduler import EventScheduler
+from csv_watcher import CSVWatcher
+from concept_matcher import ConceptMatcher
+from generation_pool import DEFAULT_CONCURRENCY, DEFAULT_DEADLINE, DEFAULT_RATE_PER_MINUTE, GenerationPool, StubLLMClient
+from llm_cache import get_llm_cache
+from scrape_archive import PYARROW_AVAILABLE, ScrapeArchiveWriter, top_posts_by_genre
+from http_client import get_http_client
+from batch_similarity import SimilarityCorpus
+from csv_ingestion import (
+    CSVColumnError, DEFAULT_COLUMN_MAPPING, DEFAULT_TOP_K_PER_GENRE, GenreTopK, iter_csv_rows, parse_column_mapping, pending_files
+)
 
 # ログ設定
 logging.basicConfig(
@@ -63,16 +77,261 @@ os.makedirs('csv_processed', exist_ok=True)
 diversity_manager = PostDiversityManager()
 enhanced_generator = EnhancedPostGenerator()
 
+# statisticsテーブルで全期間の累計を保持する行のキー（それ以外の行はYYYY-MM-DDの日別）
+STATS_TOTAL_KEY = 'all'
+STATS_COLUMNS = (
+    'total_posts', 'scheduled_posts', 'completed_posts',
+    'failed_posts', 'unique_posts', 'duplicate_posts'
+)
+
+# postsの生成カラム（名前: 式）。定義順に追加するため、他の生成カラムを参照する式は後ろに置く
+# scheduled_ts/created_ts は時刻カラムのエポック秒、due_ts は再送待ちなら次回の送信時刻
+POSTS_GENERATED_COLUMNS = {
+    'scheduled_ts': "CAST(strftime('%s', scheduled_time) AS INTEGER)",
+    'created_ts': "CAST(strftime('%s', created_at) AS INTEGER)",
+    'due_ts': "COALESCE(next_attempt_ts, scheduled_ts)"
+}
+
+# 一覧の並び順に使う作成日時。created_at が無い（created_ts が NULL の）行も
+# キーセットの比較から漏れないよう 0 として最後に並べる
+POSTS_CREATED_SORT_KEY = 'COALESCE(created_ts, 0)'
+
+# 主要クエリ用のインデックス（名前: カラム）
+# 一覧は (作成日時, id) のキーセットでページングするため、作成日時系のインデックスには id も含める
+POSTS_INDEXES = {
+    'idx_posts_status_due_ts': 'status, due_ts',
+    'idx_posts_status_created_sort_id': f'status, {POSTS_CREATED_SORT_KEY}, id',
+    'idx_posts_genre_created_sort_id': f'genre, {POSTS_CREATED_SORT_KEY}, id',
+    'idx_posts_created_sort_id': f'{POSTS_CREATED_SORT_KEY}, id'
+}
+
+# 上記に置き換えられた旧インデックス
+OBSOLETE_POSTS_INDEXES = (
+    'idx_posts_status_scheduled_ts',
+    'idx_posts_status_created_ts',
+    'idx_posts_genre_created_ts',
+    'idx_posts_created_ts',
+    'idx_posts_status_created_ts_id',
+    'idx_posts_genre_created_ts_id',
+    'idx_posts_created_ts_id'
+)
+
+# /api/posts のレスポンス項目名とカラムの対応
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'imageUrls': 'image_urls',
+    'genre': 'genre',
+    'scheduledTime': 'scheduled_time',
+    'bufferSentTime': 'buffer_sent_time',
+    'status': 'status',
+    'conceptSource': 'concept_source',
+    'referencePost': 'reference_post',
+    'createdAt': 'created_at',
+    'updatedAt': 'updated_at',
+    'isUnique': 'is_unique',
+    'retryAttempts': 'retry_attempts',
+    'profileId': 'profile_id'
+}
+
+# 送信処理用に後から追加したカラム
+POSTS_DISPATCH_COLUMNS = {
+    'profile_id': 'TEXT',          # 送信先のBufferプロファイル（NULLなら設定の既定値）
+    'lease_expires_at': 'INTEGER', # status='sending' の貸出期限（time.time() 基準の秒）
+    'next_attempt_ts': 'INTEGER'   # 一時的なエラーで再送待ちの投稿の次回送信時刻（sqlite_epoch）
+}
+
+# 送信中（sending）の投稿を他のワーカーに渡さない期間（秒）。期限切れは再取得される
+DISPATCH_LEASE_SECONDS = 300
+# 1回に取得して並列送信する投稿数と送信スレッド数
+DISPATCH_BATCH_SIZE = 20
+DISPATCH_WORKERS = 4
+
+# 一時的なエラーの再送（指数バックオフ）。試行回数の上限は設定 retry_max_attempts で変更可
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60      # 1回目の再送までの基準秒数（以降は2倍ずつ）
+RETRY_MAX_DELAY = 3600     # 再送間隔の上限（秒）
+# 再送すれば成功しうるHTTPステータス（それ以外の4xxは内容の問題とみなし再送しない）
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# 送信時刻（予約時刻または再送時刻）を過ぎた投稿（パラメータは sqlite_epoch(現在時刻), 件数）
+CLAIM_DUE_POSTS_QUERY = """
+    SELECT id FROM posts
+    WHERE status = 'pending' AND due_ts <= ?
+    ORDER BY due_ts ASC
+    LIMIT ?
+"""
+
+# 貸出期限が切れた送信中の投稿（送信中にプロセスが落ちた場合など）
+EXPIRED_LEASES_QUERY = """
+    SELECT id FROM posts
+    WHERE status = 'sending' AND lease_expires_at < ?
+    LIMIT ?
+"""
+
+# 未投稿の中で最も早い送信時刻（再送待ちを含む）
+NEXT_DUE_TIME_QUERY = """
+    SELECT MIN(due_ts) FROM posts WHERE status = 'pending'
+"""
+
+def sqlite_epoch(dt):
+    """scheduled_ts/created_ts と同じ換算（タイムゾーン無しの時刻をUTCとみなしたエポック秒）"""
+    return calendar.timegm(dt.timetuple())
+
+class BufferAPIError(Exception):
+    """Buffer APIがエラーのステータスを返した"""
+    
+    def __init__(self, status_code, message=''):
+        super().__init__(f"Buffer API error: {status_code} {message}".rstrip())
+        self.status_code = status_code
+
+def is_transient_error(error):
+    """再送すれば成功しうるエラー（タイムアウト・接続エラー・5xx・429など）かどうか"""
+    if isinstance(error, BufferAPIError):
+        return error.status_code in TRANSIENT_STATUS_CODES or error.status_code >= 500
+    return isinstance(error, (requests.Timeout, requests.ConnectionError))
+
+def retry_delay(attempt):
+    """attempt 回目の再送までの秒数（指数バックオフ + ジッター）
+
+    同時に失敗した投稿が同じ時刻に再送されないよう、間隔の後半をランダムにずらす。
+    """
+    backoff = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+# 一括保存時の posts カラム順
+POST_INSERT_COLUMNS = (
+    'id', 'text', 'image_urls', 'genre', 'scheduled_time', 'buffer_sent_time',
+    'status', 'concept_source', 'reference_post', 'created_at', 'updated_at',
+    'is_unique', 'retry_attempts', 'post_hash', 'profile_id'
+)
+
+# 投稿の保存（同じIDは置き換え）。INSERT OR REPLACE の置換による削除は recursive_triggers が
+# 無効な接続では削除トリガーを発火させず統計カウンタがずれるため、UPSERT で更新トリガーを発火させる。
+# 置き換えた投稿の送信状態（貸出期限・再送時刻）は INSERT OR REPLACE と同じく初期化する
+POST_UPSERT_QUERY = f'''
+    INSERT INTO posts ({', '.join(POST_INSERT_COLUMNS)})
+    VALUES ({', '.join('?' * len(POST_INSERT_COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET
+        {', '.join(f"{column} = excluded.{column}" for column in POST_INSERT_COLUMNS[1:])},
+        lease_expires_at = NULL, next_attempt_ts = NULL
+'''
+
+# IN (...) に渡すパラメータ数の上限（SQLiteの変数上限より十分小さく）
+SQL_IN_CHUNK_SIZE = 500
+
+def build_posts_list_query(status=None, genre=None, fields=None, after_cursor=False, limit=True):
+    """/api/posts 一覧取得のクエリを組み立てる（作成日時の新しい順）
+
+    選択カラムの末尾には常にカーソル用の作成日時（NULL は 0）と id を付ける。
+    after_cursor=True の場合は (作成日時, id) がカーソルより前の行に絞り込む。
+    パラメータは (作成日時, 作成日時, id) の順に渡す。
+    """
+    columns = [POST_FIELDS[field] for field in (fields or POST_FIELDS)]
+    query = f"SELECT {', '.join(columns)}, {POSTS_CREATED_SORT_KEY}, id FROM posts"
+    conditions = []
+    
+    if status:
+        conditions.append("status = ?")
+    
+    if genre:
+        conditions.append("genre = ?")
+    
+    if after_cursor:
+        # 式インデックスは行値の範囲検索に使われないため、先頭カラムの上限も別に指定する
+        conditions.append(f"{POSTS_CREATED_SORT_KEY} <= ? AND ({POSTS_CREATED_SORT_KEY}, id) < (?, ?)")
+    
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    
+    query += f" ORDER BY {POSTS_CREATED_SORT_KEY} DESC, id DESC"
+    if limit:
+        query += " LIMIT ?"
+    return query
+
+def parse_post_fields(fields_param):
+    """fields パラメータ（カンマ区切り）を検証して項目名のリストを返す"""
+    if not fields_param:
+        return list(POST_FIELDS)
+    
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in POST_FIELDS]
+    if unknown:
+        raise ValueError(f"不明なフィールド: {', '.join(unknown)}")
+    return fields
+
+def encode_posts_cursor(created_ts, post_id):
+    """一覧の続きを取得するためのカーソル文字列を作成"""
+    raw = json.dumps([created_ts, post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_posts_cursor(cursor):
+    """カーソル文字列を build_posts_list_query(after_cursor=True) のパラメータ (作成日時, 作成日時, id) に戻す"""
+    try:
+        created_ts, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("カーソルが不正です") from e
+    # 作成日時の NULL を 0 に揃える前に発行されたカーソルも受け付ける
+    if created_ts is None:
+        created_ts = 0
+    return created_ts, created_ts, post_id
+
+def post_row_to_dict(row, fields):
+    """build_posts_list_query の結果行をレスポンス用の辞書に変換"""
+    post = {}
+    for field, value in zip(fields, row):
+        if field == 'imageUrls':
+            value = json.loads(value) if value else []
+        elif field == 'isUnique':
+            value = bool(value)
+        post[field] = value
+    return post
+
+def hot_queries(now):
+    """実行計画を確認する主要クエリ {名前: (SQL, パラメータ)}"""
+    return {
+        'claim_due_posts': (CLAIM_DUE_POSTS_QUERY, (sqlite_epoch(datetime.fromisoformat(now)), 20)),
+        'expired_leases': (EXPIRED_LEASES_QUERY, (int(time.time()), 20)),
+        'next_due_time': (NEXT_DUE_TIME_QUERY, ()),
+        'posts_list': (build_posts_list_query(), (100,)),
+        'posts_list_by_status': (build_posts_list_query(status='pending'), ('pending', 100)),
+        'posts_list_by_genre': (build_posts_list_query(genre='ビジネス'), ('ビジネス', 100)),
+        'posts_list_next_page': (
+            build_posts_list_query(fields=['id', 'status'], after_cursor=True),
+            (0, 0, '', 100)
+        ),
+        'posts_list_by_genre_next_page': (
+            build_posts_list_query(genre='ビジネス', after_cursor=True),
+            ('ビジネス', 0, 0, '', 100)
+        ),
+        'due_pending_posts': ("""
+            SELECT id FROM posts
+            WHERE status = 'pending' AND due_ts <= CAST(strftime('%s', ?) AS INTEGER)
+            ORDER BY due_ts
+        """, (now,))
+    }
+
 class Database:
-    """SQLiteデータベースマネージャー"""
+    """SQLiteデータベースマネージャー
+
+    接続はスレッドごとに1本をプールして再利用する（WALモード・busy_timeout付き）。
+    Flaskのリクエストスレッドと自動化ワーカーが同時に書き込んでも
+    "database is locked" にならないよう、書き込みロックの待機はSQLite側に任せる。
+    """
+    
+    BUSY_TIMEOUT_MS = 5000
+    CACHED_STATEMENTS = 256
     
     def __init__(self, db_path='threads_auto_post.db'):
         self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_database()
     
     def init_database(self):
         """データベースとテーブルの初期化"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         # 投稿データテーブル
@@ -106,6 +365,15 @@ class Database:
             )
         ''')
         
+        # テーブルごとの変更回数（キャッシュの無効化に使う）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self._create_version_triggers(cursor, 'company_concepts')
+        
         # 設定テーブル
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
@@ -128,6 +396,19 @@ class Database:
             )
         ''')
         
+        # CSV取り込みのチェックポイント（ファイルごとの読み込み済み行数）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS csv_ingestion_checkpoints (
+                path TEXT PRIMARY KEY,
+                file_size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                rows_processed INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                message TEXT,
+                updated_at TEXT
+            )
+        ''')
+        
         # 統計テーブル
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS statistics (
@@ -142,153 +423,606 @@ class Database:
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # 送信処理用のカラムを追加
+        self._migrate_posts_dispatch_columns(cursor)
+        
+        # 時刻の整数カラム（next_attempt_ts を参照するため送信用カラムの後）とインデックスを追加
+        self._migrate_posts_timestamps(cursor)
+        
+        # 統計カウンタをpostsの変更に追従させるトリガー
+        self._create_statistics_triggers(cursor)
+        
+        # トリガー導入前のデータベースは一度だけ集計し直す
+        cursor.execute("SELECT 1 FROM statistics WHERE date = ?", (STATS_TOTAL_KEY,))
+        if cursor.fetchone() is None:
+            self.rebuild_statistics()
+        
+        # 主要クエリがインデックスを使えているか起動時に確認する
+        for name, plan in self.check_query_plans():
+            logger.warning(f"主要クエリがテーブルスキャン・一時ソートになっています: {name} {plan}")
+        
         logger.info("データベースの初期化完了")
     
+    def _migrate_posts_dispatch_columns(self, cursor):
+        """送信先プロファイル・貸出期限・再送時刻のカラムを追加"""
+        cursor.execute("PRAGMA table_xinfo(posts)")
+        columns = {row[1] for row in cursor.fetchall()}
+        
+        for column, column_type in POSTS_DISPATCH_COLUMNS.items():
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE posts ADD COLUMN {column} {column_type}")
+                logger.info(f"postsに{column}カラムを追加しました")
+    
+    def _migrate_posts_timestamps(self, cursor):
+        """scheduled_time/created_at のエポック秒カラム（生成カラム）とインデックスを追加
+
+        ISO文字列を datetime() などで包むとインデックスが効かないため、
+        比較・並び替えは整数の scheduled_ts/created_ts/due_ts で行う。
+        タイムゾーン無しの時刻はSQLiteの仕様どおりUTCとして換算する（大小関係は保たれる）。
+        """
+        cursor.execute("PRAGMA table_xinfo(posts)")
+        columns = {row[1] for row in cursor.fetchall()}
+        
+        for ts_column, expression in POSTS_GENERATED_COLUMNS.items():
+            if ts_column not in columns:
+                cursor.execute(f'''
+                    ALTER TABLE posts ADD COLUMN {ts_column} INTEGER
+                    GENERATED ALWAYS AS ({expression}) VIRTUAL
+                ''')
+                logger.info(f"postsに{ts_column}カラムを追加しました")
+        
+        for index_name in OBSOLETE_POSTS_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        
+        for index_name, index_columns in POSTS_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON posts ({index_columns})")
+    
+    def check_query_plans(self):
+        """主要クエリの実行計画を確認し、テーブルスキャンや一時ソートになっているものを返す
+
+        戻り値は [(クエリ名, 実行計画の行リスト)]。空ならすべてインデックスを使用している。
+        （"SCAN posts USING INDEX ..." はインデックス順の走査なので問題としない）
+        """
+        now = datetime.now().isoformat()
+        problems = []
+        
+        # プール中の接続はキャッシュ済みの EXPLAIN 文がスキーマ変更前の計画を返すことがあるため、使い捨ての接続で確認する
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for name, (query, params) in hot_queries(now).items():
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+                if any(detail in ('SCAN posts', 'SCAN TABLE posts') or 'TEMP B-TREE' in detail
+                       for detail in plan):
+                    problems.append((name, plan))
+        finally:
+            conn.close()
+        
+        return problems
+    
+    @staticmethod
+    def _statistics_delta_sql(row, sign):
+        """postsの1行(NEW/OLD)分だけstatisticsの全体行と日別行を増減するSQL
+
+        外側の INSERT OR REPLACE の競合解決はトリガー内の文にも適用されてしまうため、
+        行の作成は INSERT OR IGNORE ではなく NOT EXISTS で行う。
+        """
+        day = f"COALESCE(substr({row}.created_at, 1, 10), 'unknown')"
+        status = f"COALESCE({row}.status, '')"
+        is_unique = f"(COALESCE({row}.is_unique, 1) != 0)"
+        return f'''
+            INSERT INTO statistics (date)
+                SELECT '{STATS_TOTAL_KEY}' WHERE NOT EXISTS (SELECT 1 FROM statistics WHERE date = '{STATS_TOTAL_KEY}');
+            INSERT INTO statistics (date)
+                SELECT {day} WHERE NOT EXISTS (SELECT 1 FROM statistics WHERE date = {day});
+            UPDATE statistics SET
+                total_posts = total_posts {sign} 1,
+                scheduled_posts = scheduled_posts {sign} ({status} IN ('pending', 'scheduled')),
+                completed_posts = completed_posts {sign} ({status} = 'posted'),
+                failed_posts = failed_posts {sign} ({status} = 'failed'),
+                unique_posts = unique_posts {sign} {is_unique},
+                duplicate_posts = duplicate_posts {sign} (NOT {is_unique}),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE date IN ('{STATS_TOTAL_KEY}', {day});
+        '''
+    
+    def _create_statistics_triggers(self, cursor):
+        """statisticsテーブルを投稿の追加・更新・削除と同じトランザクションで更新する
+
+        INSERT OR REPLACE による置換は接続の recursive_triggers の設定次第で削除トリガーが発火しないため、
+        postsの置き換えは ON CONFLICT(id) DO UPDATE（更新トリガーが発火する）で行う。
+        """
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_statistics_insert
+            AFTER INSERT ON posts
+            BEGIN
+                {self._statistics_delta_sql('NEW', '+')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_statistics_delete
+            AFTER DELETE ON posts
+            BEGIN
+                {self._statistics_delta_sql('OLD', '-')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_statistics_update
+            AFTER UPDATE OF status, is_unique, created_at ON posts
+            BEGIN
+                {self._statistics_delta_sql('OLD', '-')}
+                {self._statistics_delta_sql('NEW', '+')}
+            END
+        ''')
+    
+    def _create_version_triggers(self, cursor, table):
+        """table への書き込みのたびに table_versions の変更回数を増やすトリガー"""
+        cursor.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
+    
+    def get_table_version(self, table):
+        """テーブルの変更回数（他のプロセスからの書き込みも含む）"""
+        result = self.execute_query("SELECT version FROM table_versions WHERE name = ?", (table,), fetch=True)
+        return result[0][0] if result else 0
+    
+    def _aggregate_statistics(self):
+        """postsを全件集計した場合のstatisticsの内容を返す（{date: (件数...)}）"""
+        aggregates = '''
+            COUNT(*),
+            SUM(COALESCE(status, '') IN ('pending', 'scheduled')),
+            SUM(COALESCE(status, '') = 'posted'),
+            SUM(COALESCE(status, '') = 'failed'),
+            SUM(COALESCE(is_unique, 1) != 0),
+            SUM(COALESCE(is_unique, 1) = 0)
+        '''
+        rows = self.execute_query(f'''
+            SELECT COALESCE(substr(created_at, 1, 10), 'unknown'), {aggregates}
+            FROM posts GROUP BY 1
+            UNION ALL
+            SELECT ?, {aggregates} FROM posts
+        ''', (STATS_TOTAL_KEY,), fetch=True)
+        return {row[0]: tuple(value or 0 for value in row[1:]) for row in rows}
+    
+    def rebuild_statistics(self):
+        """statisticsテーブルをpostsから再構築"""
+        with self.transaction():
+            expected = self._aggregate_statistics()
+            self.execute_query("DELETE FROM statistics")
+            self.get_connection().executemany(f'''
+                INSERT INTO statistics (date, {', '.join(STATS_COLUMNS)}, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (date, *counts, datetime.now().isoformat())
+                for date, counts in expected.items()
+            ])
+        logger.info(f"統計テーブルを再構築しました: {len(expected)}行")
+        return len(expected)
+    
+    def verify_statistics(self):
+        """statisticsテーブルとpostsの実件数のずれを検出
+
+        ずれのある日付ごとに {date: {'expected': (...), 'actual': (...)}} を返す（空ならずれなし）。
+        """
+        with self.transaction():
+            expected = self._aggregate_statistics()
+            rows = self.execute_query(
+                f"SELECT date, {', '.join(STATS_COLUMNS)} FROM statistics", fetch=True
+            )
+        actual = {row[0]: tuple(row[1:]) for row in rows}
+        zero = (0,) * len(STATS_COLUMNS)
+        
+        drift = {}
+        for date in set(expected) | set(actual):
+            # 全件削除された日付は0の行が残るので、0と欠損は同じ扱いにする
+            if expected.get(date, zero) != actual.get(date, zero):
+                drift[date] = {
+                    'expected': expected.get(date, zero),
+                    'actual': actual.get(date, zero)
+                }
+        return drift
+    
+    def get_statistics(self, date):
+        """全体と指定日のカウンタを1クエリで取得"""
+        rows = self.execute_query(
+            f"SELECT date, {', '.join(STATS_COLUMNS)} FROM statistics WHERE date IN (?, ?)",
+            (STATS_TOTAL_KEY, date),
+            fetch=True
+        )
+        zero = dict.fromkeys(STATS_COLUMNS, 0)
+        stats = {STATS_TOTAL_KEY: dict(zero), date: dict(zero)}
+        for row in rows:
+            stats[row[0]] = dict(zip(STATS_COLUMNS, row[1:]))
+        return stats[STATS_TOTAL_KEY], stats[date]
+    
+    def _connect(self):
+        """新しい接続を作成してPRAGMAを設定"""
+        # isolation_level=None: 単発クエリは自動コミット、複数文は transaction() で明示的に囲む
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.CACHED_STATEMENTS
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        
+        with self._connections_lock:
+            # threaded=True のFlaskはリクエストごとにスレッドが変わるため、終了済みスレッドの接続を回収する
+            alive = []
+            for thread, pooled in self._connections:
+                if thread.is_alive():
+                    alive.append((thread, pooled))
+                else:
+                    pooled.close()
+            alive.append((threading.current_thread(), conn))
+            self._connections = alive
+        return conn
+    
     def get_connection(self):
-        """データベース接続を取得"""
-        return sqlite3.connect(self.db_path)
+        """現在のスレッド用のデータベース接続を取得（なければ作成）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.tx_depth = 0
+        return conn
+    
+    def close_all(self):
+        """プール中のすべての接続を閉じる"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        
+        for _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    @contextmanager
+    def transaction(self):
+        """複数のクエリを1回のコミットにまとめる
+
+        使用例:
+            with db.transaction():
+                db.execute_query(...)
+                db.execute_query(...)
+
+        ネストした場合は最も外側のブロックでのみコミット/ロールバックする。
+        """
+        conn = self.get_connection()
+        depth = self._local.tx_depth
+        
+        if depth == 0:
+            # 書き込みロックを最初に取得し、途中でのロック昇格失敗を防ぐ
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.tx_depth = depth + 1
+        
+        try:
+            yield conn
+        except BaseException:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.rollback()
+            raise
+        else:
+            self._local.tx_depth = depth
+            if depth == 0:
+                conn.commit()
+    
+    def in_transaction(self):
+        """現在のスレッドがトランザクション中かどうか"""
+        return getattr(self._local, 'tx_depth', 0) > 0
     
     def execute_query(self, query, params=None, fetch=False):
-        """クエリを実行"""
+        """クエリを実行
+
+        transaction() の外では各文が自動コミットされ、内側ではブロック終了時にまとめてコミットされる。
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
+        
+        if params:
+            cursor = conn.execute(query, params)
+        else:
+            cursor = conn.execute(query)
         
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
             if fetch:
-                result = cursor.fetchall()
-                conn.close()
-                return result
-            else:
-                conn.commit()
-                conn.close()
-                return cursor.rowcount
-        except Exception as e:
-            conn.close()
-            raise e
+                return cursor.fetchall()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+    
+    def _select_in(self, query, values):
+        """WHERE ... IN ({}) のクエリを値の塊ごとに実行して結果を連結"""
+        values = list(values)
+        rows = []
+        for start in range(0, len(values), SQL_IN_CHUNK_SIZE):
+            chunk = values[start:start + SQL_IN_CHUNK_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            rows.extend(self.execute_query(query.format(placeholders), chunk, fetch=True))
+        return rows
+    
+    def bulk_save_posts(self, posts, replace=False):
+        """複数の投稿を1トランザクション・executemanyで保存
+
+        posts はカラム名をキーにした辞書のリスト（未指定のカラムは既定値）。
+        post_hash が別IDの既存投稿やバッチ内の先行行と重複する行は保存せずスキップする。
+        replace=True の場合、同じIDの既存投稿は置き換える（False ならスキップ）。
+
+        戻り値: {'inserted': [id...], 'replaced': [id...], 'skipped': [{'id', 'reason', 'conflictId'}...]}
+        """
+        now = datetime.now().isoformat()
+        defaults = {
+            'image_urls': json.dumps([]),
+            'status': 'pending',
+            'created_at': now,
+            'updated_at': now,
+            'is_unique': True,
+            'retry_attempts': 0
+        }
+        result = {'inserted': [], 'replaced': [], 'skipped': []}
+        
+        with self.transaction():
+            ids = {post['id'] for post in posts}
+            hashes = {post['post_hash'] for post in posts}
+            # 既存投稿の現在のハッシュ（置き換えで使われなくなるハッシュを解放するため）
+            existing_hashes = dict(
+                self._select_in("SELECT id, post_hash FROM posts WHERE id IN ({})", ids)
+            )
+            hash_owners = dict(
+                self._select_in("SELECT post_hash, id FROM posts WHERE post_hash IN ({})", hashes)
+            )
+            
+            rows = []
+            for post in posts:
+                post_id = post['id']
+                post_hash = post['post_hash']
+                owner = hash_owners.get(post_hash)
+                
+                if owner is not None and owner != post_id:
+                    result['skipped'].append({'id': post_id, 'reason': 'duplicate_hash', 'conflictId': owner})
+                    continue
+                if post_id in existing_hashes and not replace:
+                    result['skipped'].append({'id': post_id, 'reason': 'duplicate_id', 'conflictId': post_id})
+                    continue
+                
+                result['replaced' if post_id in existing_hashes else 'inserted'].append(post_id)
+                # 置き換え前のハッシュは以降の行で再び使えるようにし、新しいハッシュはこの行の所有にする
+                previous_hash = existing_hashes.get(post_id)
+                if previous_hash != post_hash and hash_owners.get(previous_hash) == post_id:
+                    del hash_owners[previous_hash]
+                hash_owners[post_hash] = post_id
+                existing_hashes[post_id] = post_hash
+                rows.append(tuple(
+                    post[column] if post.get(column) is not None else defaults.get(column)
+                    for column in POST_INSERT_COLUMNS
+                ))
+            
+            # post_hash の競合は上で除外済みなので、競合するのは置き換える同じIDだけ
+            self.get_connection().executemany(POST_UPSERT_QUERY, rows)
+        
+        return result
+    
+    def get_csv_checkpoints(self, paths):
+        """CSVファイルのチェックポイント {パス: {'file_size', 'mtime_ns', 'rows_processed', 'status'}}"""
+        rows = self._select_in('''
+            SELECT path, file_size, mtime_ns, rows_processed, status
+            FROM csv_ingestion_checkpoints WHERE path IN ({})
+        ''', paths)
+        return {
+            row[0]: {'file_size': row[1], 'mtime_ns': row[2], 'rows_processed': row[3], 'status': row[4]}
+            for row in rows
+        }
+    
+    def save_csv_checkpoints(self, checkpoints):
+        """チェックポイントを保存（(path, file_size, mtime_ns, rows_processed, status, message) のリスト）"""
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO csv_ingestion_checkpoints
+                (path, file_size, mtime_ns, rows_processed, status, message, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [tuple(checkpoint) + (now,) for checkpoint in checkpoints])
+    
+    def delete_csv_checkpoints(self, paths):
+        """処理済みフォルダに移動したファイルのチェックポイントを削除"""
+        with self.transaction():
+            for path in paths:
+                self.execute_query("DELETE FROM csv_ingestion_checkpoints WHERE path = ?", (path,))
+    
+    def claim_due_posts(self, limit, lease_seconds=DISPATCH_LEASE_SECONDS):
+        """送信する投稿を pending → sending に切り替えて取得
+
+        BEGIN IMMEDIATE の中で選択と更新を行うため、複数のワーカー・プロセスが
+        同時に呼び出しても同じ投稿を二重に取得しない。貸出期限切れの投稿を優先する。
+        戻り値は {'id', 'text', 'image_urls', 'genre', 'profile_id', 'retry_attempts', 'lease_expires_at'} のリスト。
+        lease_expires_at は貸出の識別に使い、結果を記録する record_post_results() にそのまま渡す。
+        """
+        now = int(time.time())
+        
+        with self.transaction():
+            ids = [row[0] for row in self.execute_query(EXPIRED_LEASES_QUERY, (now, limit), fetch=True)]
+            if len(ids) < limit:
+                ids += [
+                    row[0] for row in self.execute_query(
+                        CLAIM_DUE_POSTS_QUERY,
+                        (sqlite_epoch(datetime.now()), limit - len(ids)),
+                        fetch=True
+                    )
+                ]
+            if not ids:
+                return []
+            
+            placeholders = ', '.join('?' * len(ids))
+            self.execute_query(
+                f"UPDATE posts SET status = 'sending', lease_expires_at = ?, updated_at = ? WHERE id IN ({placeholders})",
+                (now + lease_seconds, datetime.now().isoformat(), *ids)
+            )
+            rows = self.execute_query(
+                f"SELECT id, text, image_urls, genre, profile_id, retry_attempts, lease_expires_at "
+                f"FROM posts WHERE id IN ({placeholders})",
+                ids,
+                fetch=True
+            )
+        
+        columns = ('id', 'text', 'image_urls', 'genre', 'profile_id', 'retry_attempts', 'lease_expires_at')
+        return [dict(zip(columns, row)) for row in rows]
+    
+    def record_post_results(self, results):
+        """送信結果 [(post_id, status, buffer_sent_time, next_attempt_ts, lease_expires_at)] を1トランザクションで反映
+
+        status='pending' は再送待ちで、retry_attempts を1増やし next_attempt_ts まで送信を見送る。
+        lease_expires_at は claim_due_posts() で取得した時の値で、その貸出が続いている投稿のみ更新する
+        （期限切れで他のワーカーが取得し直した後に届いた古い結果は無視する）。
+        """
+        now = datetime.now().isoformat()
+        with self.transaction():
+            self.get_connection().executemany('''
+                UPDATE posts SET status = ?, buffer_sent_time = ?, next_attempt_ts = ?,
+                    retry_attempts = COALESCE(retry_attempts, 0) + ?,
+                    lease_expires_at = NULL, updated_at = ?
+                WHERE id = ? AND status = 'sending' AND lease_expires_at = ?
+            ''', [
+                (status, sent_time, next_attempt_ts, int(status == 'pending'), now, post_id, lease_expires_at)
+                for post_id, status, sent_time, next_attempt_ts, lease_expires_at in results
+            ])
+    
+    def iter_query(self, query, params=None, batch_size=500):
+        """SELECTの結果をbatch_size行ずつ読み出して1行ずつ返す（全件をメモリに載せない）"""
+        conn = self.get_connection()
+        cursor = conn.execute(query, params or ())
+        
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
     
     def create_mock_data(self):
         """モックデータを作成"""
         logger.info("モックデータ作成開始")
         
-        # モック設定データ
-        mock_settings = [
-            ('CLAUDE_API_KEY', ''),
-            ('BUFFER_ACCESS_TOKEN', ''),
-            ('BUFFER_PROFILE_ID', ''),
-            ('automation_status', 'stopped'),
-            ('post_interval', '60'),
-            ('scraping_interval', '8'),
-            ('daily_post_limit', '10'),
-            ('post_start_time', '09:00'),
-            ('post_end_time', '21:00')
-        ]
+        with self.transaction():
+            # モック設定データ
+            mock_settings = [
+                ('CLAUDE_API_KEY', ''),
+                ('BUFFER_ACCESS_TOKEN', ''),
+                ('BUFFER_PROFILE_ID', ''),
+                ('automation_status', 'stopped'),
+                ('post_interval', '60'),
+                ('scraping_interval', '8'),
+                ('daily_post_limit', '10'),
+                ('post_start_time', '09:00'),
+                ('post_end_time', '21:00'),
+                ('retry_max_attempts', str(RETRY_MAX_ATTEMPTS))
+            ]
         
-        for key, value in mock_settings:
-            self.execute_query(
-                "INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, ?)",
-                (key, value, datetime.now().isoformat())
-            )
+            for key, value in mock_settings:
+                self.execute_query(
+                    "INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, ?)",
+                    (key, value, datetime.now().isoformat())
+                )
         
-        # モック自社構想データ
-        mock_concepts = [
-            {
-                'id': str(uuid.uuid4()),
-                'keywords': 'AI, 自動化, 効率化',
-                'genre': 'テクノロジー',
-                'reflection_status': False
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'keywords': 'マーケティング, SNS, ブランディング',
-                'genre': 'ビジネス',
-                'reflection_status': False
-            },
-            {
-                'id': str(uuid.uuid4()),
-                'keywords': 'ライフスタイル, ワークライフバランス, 健康',
-                'genre': 'ライフスタイル',
-                'reflection_status': False
-            }
-        ]
+            # モック自社構想データ
+            mock_concepts = [
+                {
+                    'id': str(uuid.uuid4()),
+                    'keywords': 'AI, 自動化, 効率化',
+                    'genre': 'テクノロジー',
+                    'reflection_status': False
+                },
+                {
+                    'id': str(uuid.uuid4()),
+                    'keywords': 'マーケティング, SNS, ブランディング',
+                    'genre': 'ビジネス',
+                    'reflection_status': False
+                },
+                {
+                    'id': str(uuid.uuid4()),
+                    'keywords': 'ライフスタイル, ワークライフバランス, 健康',
+                    'genre': 'ライフスタイル',
+                    'reflection_status': False
+                }
+            ]
         
-        for concept in mock_concepts:
-            self.execute_query('''
-                INSERT OR REPLACE INTO company_concepts 
-                (id, keywords, genre, reflection_status, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                concept['id'],
-                concept['keywords'],
-                concept['genre'],
-                concept['reflection_status'],
-                datetime.now().isoformat()
-            ))
+            for concept in mock_concepts:
+                self.execute_query('''
+                    INSERT OR REPLACE INTO company_concepts 
+                    (id, keywords, genre, reflection_status, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (
+                    concept['id'],
+                    concept['keywords'],
+                    concept['genre'],
+                    concept['reflection_status'],
+                    datetime.now().isoformat()
+                ))
         
-        # モック投稿データ
-        genres = ['テクノロジー', 'ビジネス', 'ライフスタイル', 'エンタメ', '教育']
-        statuses = ['pending', 'scheduled', 'posted', 'failed']
+            # モック投稿データ
+            genres = ['テクノロジー', 'ビジネス', 'ライフスタイル', 'エンタメ', '教育']
+            statuses = ['pending', 'scheduled', 'posted', 'failed']
         
-        for i in range(20):
-            post_text = diversity_manager.generate_unique_post(
-                f"サンプル投稿 {i+1}: 興味深いコンテンツをお届けします",
-                random.choice(genres),
-                []
-            )
+            for i in range(20):
+                post_text = diversity_manager.generate_unique_post(
+                    f"サンプル投稿 {i+1}: 興味深いコンテンツをお届けします",
+                    random.choice(genres),
+                    []
+                )
             
-            post_id = str(uuid.uuid4())
-            scheduled_time = (datetime.now() + timedelta(hours=random.randint(1, 48))).isoformat()
+                post_id = str(uuid.uuid4())
+                scheduled_time = (datetime.now() + timedelta(hours=random.randint(1, 48))).isoformat()
             
-            # ハッシュ値を生成
-            post_hash = hashlib.sha256(post_text.encode()).hexdigest()
+                # ハッシュ値を生成
+                post_hash = hashlib.sha256(post_text.encode()).hexdigest()
             
-            self.execute_query('''
-                INSERT OR REPLACE INTO posts 
-                (id, text, image_urls, genre, scheduled_time, buffer_sent_time, 
-                 status, concept_source, reference_post, created_at, updated_at, 
-                 is_unique, retry_attempts, post_hash)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                post_id,
-                post_text,
-                json.dumps([]),
-                random.choice(genres),
-                scheduled_time,
-                None,
-                random.choice(statuses),
-                None,
-                None,
-                datetime.now().isoformat(),
-                datetime.now().isoformat(),
-                True,
-                0,
-                post_hash
-            ))
+                self.execute_query(POST_UPSERT_QUERY, (
+                    post_id,
+                    post_text,
+                    json.dumps([]),
+                    random.choice(genres),
+                    scheduled_time,
+                    None,
+                    random.choice(statuses),
+                    None,
+                    None,
+                    datetime.now().isoformat(),
+                    datetime.now().isoformat(),
+                    True,
+                    0,
+                    post_hash,
+                    None
+                ))
         
-        # モックスクレイピング履歴
-        for i in range(5):
-            history_id = str(uuid.uuid4())
-            timestamp = (datetime.now() - timedelta(hours=i*8)).isoformat()
+            # モックスクレイピング履歴
+            for i in range(5):
+                history_id = str(uuid.uuid4())
+                timestamp = (datetime.now() - timedelta(hours=i*8)).isoformat()
             
-            self.execute_query('''
-                INSERT INTO scraping_history 
-                (id, timestamp, status, message, posts_found, posts_processed, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                history_id,
-                timestamp,
-                'success' if i % 3 != 0 else 'failed',
-                f'スクレイピング完了: {10 + i*2}件の投稿を処理' if i % 3 != 0 else 'ネットワークエラー',
-                10 + i*2 if i % 3 != 0 else 0,
-                8 + i*2 if i % 3 != 0 else 0,
-                datetime.now().isoformat()
-            ))
+                self.execute_query('''
+                    INSERT INTO scraping_history 
+                    (id, timestamp, status, message, posts_found, posts_processed, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    history_id,
+                    timestamp,
+                    'success' if i % 3 != 0 else 'failed',
+                    f'スクレイピング完了: {10 + i*2}件の投稿を処理' if i % 3 != 0 else 'ネットワークエラー',
+                    10 + i*2 if i % 3 != 0 else 0,
+                    8 + i*2 if i % 3 != 0 else 0,
+                    datetime.now().isoformat()
+                ))
         
         logger.info("モックデータ作成完了")
 
@@ -298,18 +1032,185 @@ db = Database()
 # グローバル変数
 automation_worker = None
 
+def notify_posts_changed():
+    """投稿の追加・予約時刻の変更を自動化ワーカーに知らせる"""
+    if automation_worker:
+        automation_worker.wake_posting()
+
+# CSV取り込みの排他（手動実行と自動化ワーカー）
+csv_ingestion_lock = threading.Lock()
+
+# 保存済み投稿のn-gram行列（CSV由来の投稿候補をまとめて準重複判定する）
+similarity_corpus = None
+similarity_corpus_lock = threading.Lock()
+
+def get_similarity_corpus():
+    """保存済み投稿のコーパスを返す（初回のみpostsテーブルから読み込む）"""
+    global similarity_corpus
+    with similarity_corpus_lock:
+        if similarity_corpus is None:
+            started = time.time()
+            rows = list(db.iter_query("SELECT id, text FROM posts WHERE text IS NOT NULL"))
+            similarity_corpus = SimilarityCorpus(
+                [text for _, text in rows], [post_id for post_id, _ in rows]
+            )
+            logger.info(f"類似度コーパスを読み込みました: {len(rows)}件（{time.time() - started:.1f}秒）")
+        return similarity_corpus
+
+# 自社構想マッチャー（company_concepts の変更回数ごと・リクエストで渡された構想の内容ごとに1つ）
+concept_matchers = {}
+concept_matchers_lock = threading.Lock()
+
+def get_concept_matcher(concepts=None):
+    """自社構想のマッチャーを返す
+
+    concepts 未指定なら company_concepts テーブルの構想を使い、テーブルが書き換えられたときだけ作り直す。
+    指定した場合は内容が前回と同じならそのまま使い回す。
+    """
+    if concepts is None:
+        source, key = 'table', db.get_table_version('company_concepts')
+    else:
+        fingerprint = json.dumps(
+            [(c.get('id'), c.get('keywords'), c.get('genre')) for c in concepts], ensure_ascii=False
+        )
+        source, key = 'request', hashlib.sha256(fingerprint.encode()).hexdigest()
+    
+    with concept_matchers_lock:
+        cached = concept_matchers.get(source)
+        if cached and cached[0] == key:
+            return cached[1]
+    
+    if concepts is None:
+        concepts = [
+            {'id': row[0], 'keywords': row[1], 'genre': row[2], 'reflectionStatus': bool(row[3])}
+            for row in db.execute_query(
+                "SELECT id, keywords, genre, reflection_status FROM company_concepts ORDER BY created_at, id",
+                fetch=True
+            )
+        ]
+    matcher = ConceptMatcher(concepts)
+    with concept_matchers_lock:
+        concept_matchers[source] = (key, matcher)
+    logger.info(f"自社構想マッチャーを構築しました: {len(matcher)}件")
+    return matcher
+
+# Claude API呼び出し用の生成プール（初回使用時に設定値で作成）
+generation_pool = None
+generation_pool_lock = threading.Lock()
+
+def get_generation_pool():
+    """同時実行数（generation_concurrency）と流量（generation_rate_per_minute）を設定した生成プールを返す"""
+    global generation_pool
+    with generation_pool_lock:
+        if generation_pool is None:
+            generation_pool = GenerationPool(
+                ConfigManager.get_int('generation_concurrency', DEFAULT_CONCURRENCY),
+                ConfigManager.get_int('generation_rate_per_minute', DEFAULT_RATE_PER_MINUTE)
+            )
+        return generation_pool
+
+def generation_deadline_seconds(data):
+    """リクエストの期限（deadlineSeconds、未指定なら設定値）"""
+    return float(data.get('deadlineSeconds') or ConfigManager.get_int('generation_deadline', DEFAULT_DEADLINE))
+
+# 多様性を重視する生成で1つのプロンプトに溜める応答数（設定 llm_cache_variants）
+DEFAULT_LLM_CACHE_VARIANTS = 3
+
+def cached_claude_text(prompt, deadline, model="claude-3-haiku-20240307", temperature=0.7,
+                       max_tokens=1000, variants=1):
+    """LLM応答キャッシュを通して Claude API を呼び、(生成文, キャッシュから返したか) を返す"""
+    def create():
+        response = get_generation_pool().call_llm(
+            claude_client,
+            deadline,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return response.content[0].text
+    
+    return get_llm_cache().get_or_create(model, prompt, create, temperature=temperature, variants=variants)
+
 class ConfigManager:
-    """設定管理クラス"""
+    """設定管理クラス
+
+    設定値はプロセス内にTTL付きでキャッシュする（set_setting で即時に書き換え）。
+    他プロセスからの変更は最大 CACHE_TTL 秒遅れて反映される。
+    """
     
-    @staticmethod
-    def get_setting(key):
-        """設定値を取得"""
+    CACHE_TTL = 60  # 秒
+    
+    # key -> (有効期限, 生の値, 型ごとの変換結果)
+    _cache = {}
+    _cache_lock = threading.Lock()
+    _cache_stats = {'hits': 0, 'misses': 0}
+    
+    @classmethod
+    def _get_entry(cls, key):
+        """キャッシュのエントリを取得（期限切れならDBから読み直す）"""
+        now = time.monotonic()
+        with cls._cache_lock:
+            entry = cls._cache.get(key)
+            if entry and entry[0] > now:
+                cls._cache_stats['hits'] += 1
+                return entry
+            cls._cache_stats['misses'] += 1
+        
         result = db.execute_query(
             "SELECT value FROM settings WHERE key = ?", 
             (key,), 
             fetch=True
         )
-        return result[0][0] if result else None
+        entry = (now + cls.CACHE_TTL, result[0][0] if result else None, {})
+        with cls._cache_lock:
+            cls._cache[key] = entry
+        return entry
+    
+    @classmethod
+    def _get_parsed(cls, key, kind, parser, default):
+        """設定値を型変換して取得（変換結果もキャッシュする）"""
+        _, raw, parsed = cls._get_entry(key)
+        if kind not in parsed:
+            try:
+                parsed[kind] = parser(raw) if raw not in (None, '') else None
+            except ValueError:
+                logger.warning(f"設定値 {key}={raw!r} を{kind}として解釈できません")
+                parsed[kind] = None
+        value = parsed[kind]
+        return default if value is None else value
+    
+    @staticmethod
+    def get_setting(key):
+        """設定値を取得"""
+        return ConfigManager._get_entry(key)[1]
+    
+    @staticmethod
+    def get_int(key, default=None):
+        """整数の設定値を取得"""
+        return ConfigManager._get_parsed(key, 'int', int, default)
+    
+    @staticmethod
+    def get_bool(key, default=None):
+        """真偽値の設定値を取得（true/1/yes/on を True とする）"""
+        def parse_bool(value):
+            return str(value).strip().lower() in ('true', '1', 'yes', 'on')
+        return ConfigManager._get_parsed(key, 'bool', parse_bool, default)
+    
+    @staticmethod
+    def get_time(key, default=None):
+        """HH:MM形式の設定値を datetime.time で取得（default も HH:MM 文字列で指定）"""
+        def parse_time(value):
+            return datetime.strptime(value.strip(), '%H:%M').time()
+        value = ConfigManager._get_parsed(key, 'time', parse_time, None)
+        if value is None and default is not None:
+            return parse_time(default)
+        return value
+    
+    @staticmethod
+    def get_json(key, parser=json.loads, default=None):
+        """JSON形式の設定値を parser で変換して取得"""
+        return ConfigManager._get_parsed(key, f'json:{parser.__name__}', parser, default)
     
     @staticmethod
     def set_setting(key, value):
@@ -318,6 +1219,26 @@ class ConfigManager:
             "INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, ?)",
             (key, str(value), datetime.now().isoformat())
         )
+        # 書き込んだ値でキャッシュを更新（型変換結果は破棄）
+        with ConfigManager._cache_lock:
+            ConfigManager._cache[key] = (time.monotonic() + ConfigManager.CACHE_TTL, str(value), {})
+    
+    @staticmethod
+    def invalidate(key=None):
+        """キャッシュを破棄（key 未指定ならすべて）"""
+        with ConfigManager._cache_lock:
+            if key is None:
+                ConfigManager._cache.clear()
+            else:
+                ConfigManager._cache.pop(key, None)
+    
+    @staticmethod
+    def cache_stats():
+        """キャッシュのヒット数・ミス数"""
+        with ConfigManager._cache_lock:
+            stats = dict(ConfigManager._cache_stats)
+            stats['size'] = len(ConfigManager._cache)
+        return stats
     
     @staticmethod
     def get_all_settings():
@@ -341,7 +1262,11 @@ def get_api_config():
 claude_client = None
 claude_api_key, buffer_access_token, buffer_profile_id = get_api_config()
 
-if claude_api_key:
+if os.getenv('LLM_STUB'):
+    # 動作確認用: Claude APIの代わりにローカルのスタブを使う
+    claude_client = StubLLMClient(latency=float(os.getenv('LLM_STUB_LATENCY', '0.5')))
+    logger.warning("スタブLLMを使用します（LLM_STUB）")
+elif claude_api_key:
     try:
         claude_client = anthropic.Anthropic(api_key=claude_api_key)
         logger.info("Claude API初期化成功")
@@ -379,33 +1304,9 @@ def home():
 def dashboard_stats():
     """ダッシュボード統計情報を取得"""
     try:
-        # 投稿統計を取得
-        total_posts = db.execute_query(
-            "SELECT COUNT(*) FROM posts", fetch=True
-        )[0][0]
-        
-        scheduled_posts = db.execute_query(
-            "SELECT COUNT(*) FROM posts WHERE status = 'scheduled' OR status = 'pending'", 
-            fetch=True
-        )[0][0]
-        
-        completed_posts = db.execute_query(
-            "SELECT COUNT(*) FROM posts WHERE status = 'posted'", 
-            fetch=True
-        )[0][0]
-        
-        failed_posts = db.execute_query(
-            "SELECT COUNT(*) FROM posts WHERE status = 'failed'", 
-            fetch=True
-        )[0][0]
-        
-        # 今日の投稿数
+        # statisticsテーブル（トリガーで更新）から全体と今日のカウンタを取得
         today = datetime.now().date().isoformat()
-        today_posts = db.execute_query(
-            "SELECT COUNT(*) FROM posts WHERE DATE(created_at) = ?",
-            (today,),
-            fetch=True
-        )[0][0]
+        totals, today_stats = db.get_statistics(today)
         
         # 自動化ステータス
         automation_status = ConfigManager.get_setting('automation_status') or 'stopped'
@@ -413,11 +1314,11 @@ def dashboard_stats():
         return jsonify({
             "success": True,
             "data": {
-                "totalPosts": total_posts,
-                "scheduledPosts": scheduled_posts,
-                "completedPosts": completed_posts,
-                "failedPosts": failed_posts,
-                "todayPosts": today_posts,
+                "totalPosts": totals['total_posts'],
+                "scheduledPosts": totals['scheduled_posts'],
+                "completedPosts": totals['completed_posts'],
+                "failedPosts": totals['failed_posts'],
+                "todayPosts": today_stats['total_posts'],
                 "automationStatus": automation_status
             }
         })
@@ -461,6 +1362,37 @@ def scraping_history():
         logger.error(f"履歴取得エラー: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/scraping/archive/top', methods=['GET'])
+def scraping_archive_top():
+    """アーカイブから直近 days 日のジャンル別いいね数上位 k 件を取得"""
+    try:
+        if not PYARROW_AVAILABLE:
+            return jsonify({"success": False, "error": "pyarrow がインストールされていません"}), 501
+        
+        days = request.args.get('days', 30, type=int)
+        k = request.args.get('k', 10, type=int)
+        platform = request.args.get('platform')
+        
+        df = top_posts_by_genre(days, k, platform)
+        data = {}
+        if df is not None:
+            for row in df.itertuples(index=False):
+                data.setdefault(str(row.genre), []).append({
+                    "text": row.text,
+                    "likes": int(row.likes),
+                    "platform": str(row.platform),
+                    "scrapedAt": row.scraped_at.isoformat()
+                })
+        
+        return jsonify({
+            "success": True,
+            "data": data
+        })
+        
+    except Exception as e:
+        logger.error(f"アーカイブ集計エラー: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/automation/start', methods=['POST'])
 def start_automation():
     """自動化を開始"""
@@ -524,11 +1456,12 @@ def trigger_scraping():
         # スクレイピング履歴を記録
         history_id = str(uuid.uuid4())
         
-        # CSVファイルをチェック
+        # 未処理のCSVをすべて取り込む
         csv_path = ConfigManager.get_setting('csvWatchPath') or './csv_input'
-        csv_files = list(Path(csv_path).glob('*.csv'))
         
-        if not csv_files:
+        try:
+            summary = ingest_csv_files(csv_path, history_id, '{posts_processed}件の投稿を処理しました')
+        except Exception as e:
             db.execute_query('''
                 INSERT INTO scraping_history 
                 (id, timestamp, status, message, posts_found, posts_processed)
@@ -537,59 +1470,13 @@ def trigger_scraping():
                 history_id,
                 datetime.now().isoformat(),
                 'failed',
-                'CSVファイルが見つかりません',
+                f'CSV処理エラー: {str(e)}',
                 0,
                 0
             ))
-            
-            return jsonify({
-                "success": False,
-                "error": "CSVファイルが見つかりません"
-            }), 404
-        
-        # 最新のCSVを処理
-        latest_csv = max(csv_files, key=os.path.getctime)
+            raise e
         
-        try:
-            df = pd.read_csv(latest_csv)
-            posts_found = len(df)
-            
-            # 上位10件を処理
-            top_posts = df.nlargest(10, 'likes') if 'likes' in df.columns else df.head(10)
-            posts_processed = len(top_posts)
-            
-            # 各投稿を生成・保存
-            for _, row in top_posts.iterrows():
-                text = row.get('text', '')
-                genre = row.get('genre', 'その他')
-                
-                # 多様性を考慮した投稿生成
-                improved_text = diversity_manager.generate_unique_post(text, genre, [])
-                
-                # 投稿を保存
-                post_id = str(uuid.uuid4())
-                scheduled_time = (datetime.now() + timedelta(hours=random.randint(1, 24))).isoformat()
-                post_hash = hashlib.sha256(improved_text.encode()).hexdigest()
-                
-                db.execute_query('''
-                    INSERT OR IGNORE INTO posts 
-                    (id, text, image_urls, genre, scheduled_time, status, 
-                     created_at, updated_at, is_unique, post_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    post_id,
-                    improved_text,
-                    json.dumps([]),
-                    genre,
-                    scheduled_time,
-                    'pending',
-                    datetime.now().isoformat(),
-                    datetime.now().isoformat(),
-                    True,
-                    post_hash
-                ))
-            
-            # 成功履歴を記録
+        if summary is None:
             db.execute_query('''
                 INSERT INTO scraping_history 
                 (id, timestamp, status, message, posts_found, posts_processed)
@@ -597,26 +1484,82 @@ def trigger_scraping():
             ''', (
                 history_id,
                 datetime.now().isoformat(),
-                'success',
-                f'{posts_processed}件の投稿を処理しました',
-                posts_found,
-                posts_processed
+                'failed',
+                'CSVファイルが見つかりません',
+                0,
+                0
             ))
             
-            # 処理済みフォルダに移動
-            processed_path = Path('./csv_processed') / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{latest_csv.name}"
-            latest_csv.rename(processed_path)
-            
-            logger.info(f"スクレイピング完了: {posts_processed}件を処理")
-            
             return jsonify({
-                "success": True,
-                "message": f"{posts_processed}件の投稿を処理しました",
-                "postsFound": posts_found,
-                "postsProcessed": posts_processed
-            })
+                "success": False,
+                "error": "CSVファイルが見つかりません"
+            }), 404
+        
+        notify_posts_changed()
+        
+        return jsonify({
+            "success": bool(summary['completedFiles']),
+            "message": f"{summary['postsProcessed']}件の投稿を処理しました",
+            **summary
+        })
             
-        except Exception as e:
+    except Exception as e:
+        logger.error(f"スクレイピングエラー: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def ingest_csv_files(csv_path, history_id, message_format, paths=None):
+    """監視フォルダの未処理CSVをすべて（paths 指定時はそのファイルだけ）取り込み、
+    ジャンルごとの上位投稿から投稿を生成して保存
+
+    各ファイルはチェックポイントの行から続きをチャンク単位で読む。生成した投稿・チェックポイント・
+    スクレイピング履歴（message_format の {posts_processed} に生成件数が入る）は1回のコミットで保存し、
+    読み終えたファイルは処理済みフォルダに移動する。列が読み替えられないファイルは失敗として記録し、
+    変更されるまで読み直さない。取り込むCSVがなければ None を返す。
+    手動実行と自動化ワーカーが同時に呼んでも同じファイルを二重に取り込まないよう直列化する。
+    """
+    with csv_ingestion_lock:
+        if paths is None:
+            paths = Path(csv_path).glob('*.csv')
+        paths = [Path(path).resolve() for path in paths]
+        files = pending_files(paths, db.get_csv_checkpoints([str(path) for path in paths]))
+        if not files:
+            return None
+        
+        mapping = ConfigManager.get_json('csvColumnMapping', parse_column_mapping, DEFAULT_COLUMN_MAPPING)
+        top_posts = GenreTopK(ConfigManager.get_int('csvTopKPerGenre', DEFAULT_TOP_K_PER_GENRE))
+        checkpoints = []
+        completed = []
+        errors = []
+        
+        for path, start_row, (file_size, mtime_ns) in files:
+            rows_processed = start_row
+            # 全行をParquetアーカイブにも追記（後から期間・ジャンル別に集計できるように）
+            archive = ScrapeArchiveWriter(path, start_row) if PYARROW_AVAILABLE else None
+            try:
+                for row in iter_csv_rows(path, mapping, start_row):
+                    top_posts.add(row)
+                    if archive:
+                        archive.add(row)
+                    rows_processed += 1
+            except (CSVColumnError, pd.errors.ParserError, UnicodeDecodeError) as e:
+                logger.warning(f"CSV取り込みエラー（{path.name}）: {str(e)}")
+                errors.append({'file': path.name, 'error': str(e)})
+                checkpoints.append((str(path), file_size, mtime_ns, rows_processed, 'failed', str(e)))
+                continue
+            finally:
+                if archive:
+                    archive.close()
+            checkpoints.append((str(path), file_size, mtime_ns, rows_processed, 'completed', None))
+            completed.append(path)
+        
+        posts_found = top_posts.seen
+        new_posts = generate_posts_from_rows(top_posts.rows())
+        posts_processed = len(new_posts)
+        
+        # 生成した投稿・チェックポイント・履歴を1回のコミットで保存
+        with db.transaction():
+            result = db.bulk_save_posts(new_posts)
+            db.save_csv_checkpoints(checkpoints)
             db.execute_query('''
                 INSERT INTO scraping_history 
                 (id, timestamp, status, message, posts_found, posts_processed)
@@ -624,16 +1567,82 @@ def trigger_scraping():
             ''', (
                 history_id,
                 datetime.now().isoformat(),
-                'failed',
-                f'CSV処理エラー: {str(e)}',
-                0,
-                0
+                'success' if completed else 'failed',
+                message_format.format(posts_processed=posts_processed),
+                posts_found,
+                posts_processed
             ))
-            raise e
-            
-    except Exception as e:
-        logger.error(f"スクレイピングエラー: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        
+        if result['skipped']:
+            logger.info(f"重複のため{len(result['skipped'])}件をスキップしました")
+            # 保存しなかった投稿の予約を取り消す
+            skipped = {skip['id'] for skip in result['skipped']}
+            for post in new_posts:
+                if post['id'] in skipped:
+                    diversity_manager.release(post['text'])
+        
+        # 保存できた投稿だけを以降の準重複チェックの対象にする
+        inserted = set(result['inserted'])
+        saved_posts = [post for post in new_posts if post['id'] in inserted]
+        get_similarity_corpus().add([post['text'] for post in saved_posts], [post['id'] for post in saved_posts])
+        
+        # 読み終えたファイルを処理済みフォルダに移動（移動できたものはチェックポイントも不要）
+        moved = []
+        processed_prefix = datetime.now().strftime('%Y%m%d_%H%M%S')
+        for path in completed:
+            try:
+                path.rename(Path('./csv_processed') / f"{processed_prefix}_{path.name}")
+                moved.append(str(path))
+            except OSError as e:
+                logger.warning(f"処理済みフォルダへの移動に失敗しました（{path.name}）: {str(e)}")
+        if moved:
+            db.delete_csv_checkpoints(moved)
+        
+        logger.info(
+            f"CSV取り込み完了: {len(completed)}/{len(files)}ファイル・{posts_found}行から{posts_processed}件を生成"
+        )
+        return {
+            'files': len(files),
+            'completedFiles': len(completed),
+            'postsFound': posts_found,
+            'postsProcessed': posts_processed,
+            'postsInserted': len(result['inserted']),
+            'errors': errors
+        }
+
+def generate_posts_from_rows(top_posts):
+    """スクレイピングCSVの行（共通の項目名をキーにした辞書）から保存用の投稿データを生成
+
+    保存済み投稿・同じバッチ内の投稿と準重複になったものは除外する（除外した投稿の予約は取り消す）。
+    類似度コーパスへの登録は、bulk_save_posts() で実際に保存された投稿だけを呼び出し側で行う。
+    """
+    new_posts = []
+    for row in top_posts:
+        text = row.get('text', '')
+        genre = row.get('genre', 'その他')
+        
+        # 多様性を考慮した投稿生成
+        improved_text = diversity_manager.generate_unique_post(text, genre, [])
+        
+        new_posts.append({
+            'id': str(uuid.uuid4()),
+            'text': improved_text,
+            'genre': genre,
+            'scheduled_time': (datetime.now() + timedelta(hours=random.randint(1, 24))).isoformat(),
+            'post_hash': hashlib.sha256(improved_text.encode()).hexdigest()
+        })
+    
+    corpus = get_similarity_corpus()
+    matches = corpus.find_near_duplicates([post['text'] for post in new_posts])
+    unique_posts = []
+    for post, match in zip(new_posts, matches):
+        if match is None:
+            unique_posts.append(post)
+        else:
+            diversity_manager.release(post['text'])
+    if len(unique_posts) < len(new_posts):
+        logger.info(f"準重複のため{len(new_posts) - len(unique_posts)}件の投稿候補を除外しました")
+    return unique_posts
 
 @app.route('/api/generate-post', methods=['POST'])
 def generate_post():
@@ -648,8 +1657,9 @@ def generate_post():
         if not claude_client:
             # 多様性マネージャーで生成（Claude APIなしでも動作）
             if use_diversity:
+                # 保存前のプレビューなので予約しない（保存時に /api/posts で登録する）
                 improved_text = diversity_manager.generate_unique_post(
-                    original_text, genre, reference_posts
+                    original_text, genre, reference_posts, reserve=False
                 )
                 logger.info(f"多様性マネージャーで投稿生成: {len(improved_text)}文字")
                 
@@ -689,32 +1699,38 @@ def generate_post():
 改善された投稿文のみを出力してください。
             """
         
-        # Claude API呼び出し
-        response = claude_client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1000,
-            temperature=0.8 if use_diversity else 0.7,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
-        
-        improved_text = response.content[0].text
-        
-        # 重複チェック
-        is_duplicate = diversity_manager.is_duplicate(improved_text)
-        
-        logger.info(f"AI投稿生成完了: {len(improved_text)}文字")
+        def task(deadline):
+            # Claude API呼び出し（応答キャッシュ経由・生成プールの流量制限・期限つき）
+            # 多様性重視の場合は同じプロンプトでも複数の応答を順番に返す
+            improved_text, cached = cached_claude_text(
+                prompt,
+                deadline,
+                temperature=0.8 if use_diversity else 0.7,
+                variants=ConfigManager.get_int('llm_cache_variants', DEFAULT_LLM_CACHE_VARIANTS) if use_diversity else 1
+            )
+            
+            # 重複チェック
+            is_duplicate = diversity_manager.is_duplicate(improved_text)
+            
+            logger.info(f"AI投稿生成完了: {len(improved_text)}文字")
+            
+            return {
+                "original_text": original_text,
+                "improved_text": improved_text,
+                "model_used": "claude-3-haiku-20240307",
+                "character_count": len(improved_text),
+                "is_unique": not is_duplicate,
+                "cached": cached
+            }
         
-        return jsonify({
-            "success": True,
-            "original_text": original_text,
-            "improved_text": improved_text,
-            "model_used": "claude-3-haiku-20240307",
-            "character_count": len(improved_text),
-            "is_unique": not is_duplicate
-        })
+        deadline_seconds = generation_deadline_seconds(data)
+        job = get_generation_pool().submit([task], 'generate-post', deadline_seconds, lambda results: results[0])
+        if not data.get('async') and job.wait(deadline_seconds + 5):
+            error = job.error()
+            if error:
+                return jsonify({"success": False, "error": error}), 500
+            return jsonify({"success": True, **job.result})
+        return generation_job_response(job, True, deadline_seconds)
         
     except Exception as e:
         logger.error(f"投稿生成エラー: {str(e)}")
@@ -728,52 +1744,50 @@ def posts():
             # フィルタリングパラメータ
             status = request.args.get('status')
             genre = request.args.get('genre')
-            limit = request.args.get('limit', 100, type=int)
-            
-            # クエリ構築
-            query = "SELECT * FROM posts"
-            params = []
-            conditions = []
-            
-            if status:
-                conditions.append("status = ?")
-                params.append(status)
+            cursor = request.args.get('cursor')
+            stream = request.args.get('format') == 'ndjson'
+            # ストリーミング時は limit 未指定なら全件（エクスポート用）
+            limit = request.args.get('limit', None if stream else 100, type=int)
             
-            if genre:
-                conditions.append("genre = ?")
-                params.append(genre)
+            try:
+                fields = parse_post_fields(request.args.get('fields'))
+                after = decode_posts_cursor(cursor) if cursor else None
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
             
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
+            # クエリ構築
+            query = build_posts_list_query(
+                status, genre, fields,
+                after_cursor=after is not None,
+                limit=limit is not None
+            )
+            params = [value for value in (status, genre) if value]
+            if after:
+                params.extend(after)
+            if limit is not None:
+                params.append(limit)
             
-            query += " ORDER BY created_at DESC LIMIT ?"
-            params.append(limit)
+            # NDJSON: 1行ずつ読み出して書き出すため、件数に関係なくメモリ使用量は一定
+            if stream:
+                def generate():
+                    for row in db.iter_query(query, params):
+                        yield json.dumps(post_row_to_dict(row, fields), ensure_ascii=False) + "\n"
+                
+                return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
             
             result = db.execute_query(query, params, fetch=True)
+            posts_data = [post_row_to_dict(row, fields) for row in result]
             
-            posts_data = []
-            for row in result:
-                post = {
-                    "id": row[0],
-                    "text": row[1],
-                    "imageUrls": json.loads(row[2]) if row[2] else [],
-                    "genre": row[3],
-                    "scheduledTime": row[4],
-                    "bufferSentTime": row[5],
-                    "status": row[6],
-                    "conceptSource": row[7],
-                    "referencePost": row[8],
-                    "createdAt": row[9],
-                    "updatedAt": row[10],
-                    "isUnique": bool(row[11]),
-                    "retryAttempts": row[12]
-                }
-                posts_data.append(post)
+            # 1ページ分取得できた場合のみ続きのカーソルを返す
+            next_cursor = None
+            if limit is not None and len(result) == limit:
+                next_cursor = encode_posts_cursor(*result[-1][-2:])
             
             return jsonify({
                 "success": True,
                 "posts": posts_data,
-                "count": len(posts_data)
+                "count": len(posts_data),
+                "nextCursor": next_cursor
             })
             
         except Exception as e:
@@ -799,8 +1813,8 @@ def posts():
                 db.execute_query('''
                     INSERT INTO posts 
                     (id, text, image_urls, genre, scheduled_time, status, 
-                     created_at, updated_at, is_unique, retry_attempts, post_hash)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     created_at, updated_at, is_unique, retry_attempts, post_hash, profile_id)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
                     post_id,
                     text,
@@ -812,10 +1826,15 @@ def posts():
                     datetime.now().isoformat(),
                     is_unique,
                     0,
-                    post_hash
+                    post_hash,
+                    data.get('profileId')
                 ))
+                # 以降の生成・投稿の準重複チェックの対象にする
+                diversity_manager.remember(text)
+                get_similarity_corpus().add([text], [post_id])
                 
                 logger.info(f"投稿作成完了: {post_id}")
+                notify_posts_changed()
                 
                 return jsonify({
                     "success": True,
@@ -825,43 +1844,44 @@ def posts():
             
             # 複数投稿の保存
             else:
-                posts_to_save = data.get('posts', [])
-                saved_count = 0
-                
-                for post in posts_to_save:
-                    post_id = post.get('id', str(uuid.uuid4()))
+                posts_to_save = []
+                for post in data.get('posts', []):
                     text = post.get('text', '')
-                    post_hash = hashlib.sha256(text.encode()).hexdigest()
-                    
-                    db.execute_query('''
-                        INSERT OR REPLACE INTO posts 
-                        (id, text, image_urls, genre, scheduled_time, buffer_sent_time, 
-                         status, concept_source, reference_post, created_at, updated_at,
-                         is_unique, retry_attempts, post_hash)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        post_id,
-                        text,
-                        json.dumps(post.get('imageUrls', [])),
-                        post.get('genre', ''),
-                        post.get('scheduledTime', ''),
-                        post.get('bufferSentTime'),
-                        post.get('status', 'pending'),
-                        post.get('conceptSource'),
-                        post.get('referencePost'),
-                        post.get('createdAt', datetime.now().isoformat()),
-                        datetime.now().isoformat(),
-                        True,
-                        0,
-                        post_hash
-                    ))
-                    saved_count += 1
+                    posts_to_save.append({
+                        'id': post.get('id') or str(uuid.uuid4()),
+                        'text': text,
+                        'image_urls': json.dumps(post.get('imageUrls', [])),
+                        'genre': post.get('genre', ''),
+                        'scheduled_time': post.get('scheduledTime', ''),
+                        'buffer_sent_time': post.get('bufferSentTime'),
+                        'status': post.get('status', 'pending'),
+                        'concept_source': post.get('conceptSource'),
+                        'reference_post': post.get('referencePost'),
+                        'created_at': post.get('createdAt'),
+                        'post_hash': hashlib.sha256(text.encode()).hexdigest(),
+                        'profile_id': post.get('profileId')
+                    })
+                
+                result = db.bulk_save_posts(posts_to_save, replace=True)
+                saved_count = len(result['inserted']) + len(result['replaced'])
+                
+                inserted = set(result['inserted'])
+                new_texts = [(post['text'], post['id']) for post in posts_to_save if post['id'] in inserted]
+                get_similarity_corpus().add([text for text, _ in new_texts], [post_id for _, post_id in new_texts])
                 
-                logger.info(f"投稿保存完了: {saved_count}件")
+                logger.info(
+                    f"投稿保存完了: {saved_count}件"
+                    f"（新規{len(result['inserted'])}件・置換{len(result['replaced'])}件・"
+                    f"スキップ{len(result['skipped'])}件）"
+                )
+                notify_posts_changed()
                 
                 return jsonify({
                     "success": True,
-                    "saved_count": saved_count
+                    "saved_count": saved_count,
+                    "inserted": result['inserted'],
+                    "replaced": result['replaced'],
+                    "skipped": result['skipped']
                 })
             
         except Exception as e:
@@ -875,10 +1895,11 @@ def post_operations(post_id):
         try:
             data = request.json
             
+            # 手動での更新・再予約は新しい予定として扱い、再送の状態をリセットする
             db.execute_query('''
                 UPDATE posts SET 
                 text = ?, genre = ?, scheduled_time = ?, 
-                status = ?, updated_at = ?
+                status = ?, next_attempt_ts = NULL, retry_attempts = 0, updated_at = ?
                 WHERE id = ?
             ''', (
                 data.get('text'),
@@ -890,6 +1911,7 @@ def post_operations(post_id):
             ))
             
             logger.info(f"投稿更新完了: {post_id}")
+            notify_posts_changed()
             
             return jsonify({
                 "success": True,
@@ -921,7 +1943,7 @@ def process_csv():
     try:
         data = request.json
         csv_data = data.get('csvData', [])
-        company_concepts = data.get('companyConcepts', [])
+        company_concepts = data.get('companyConcepts') or None
         limit = data.get('limit', 10)
         sort_by = data.get('sortBy', 'likes')
         
@@ -934,74 +1956,104 @@ def process_csv():
         # 上位N件を取得
         top_posts = sorted_posts[:limit]
         
-        processed_posts = []
-        for post in top_posts:
-            # 自社構想とのマッチング
-            matched_concept = find_matching_concept(post, company_concepts)
-            
-            text = post.get('postText', '')
-            genre = post.get('genre', 'その他')
-            
-            # 多様性を考慮した投稿生成
-            if claude_client and matched_concept:
-                # AI生成で自社構想を反映
-                improved_text = generate_with_concept(post, matched_concept)
-            else:
-                # 多様性マネージャーで生成
-                improved_text = diversity_manager.generate_unique_post(text, genre, [])
-            
-            # 投稿を作成
-            post_id = str(uuid.uuid4())
-            scheduled_time = (datetime.now() + timedelta(hours=random.randint(1, 24))).isoformat()
-            
-            processed_post = {
-                'id': post_id,
-                'text': improved_text,
-                'imageUrls': [],
-                'genre': genre,
-                'scheduledTime': scheduled_time,
-                'status': 'pending',
-                'createdAt': datetime.now().isoformat(),
-                'updatedAt': datetime.now().isoformat(),
-                'isUnique': True,
-                'conceptSource': matched_concept.get('keywords', '') if matched_concept else None
-            }
-            
-            processed_posts.append(processed_post)
+        # 自社構想（未指定なら登録済みの構想）のマッチャーは全投稿で共有
+        matcher = get_concept_matcher(company_concepts)
         
-        logger.info(f"CSV処理完了: {len(processed_posts)}件の投稿候補を生成")
+        def make_task(post):
+            def task(deadline):
+                # 自社構想とのマッチング（投稿文を1回走査して一致した構想をスコア順に取得）
+                concept_matches = matcher.match(post.get('postText', ''), post.get('genre', ''))
+                matched_concept, concept_score = concept_matches[0] if concept_matches else (None, 0)
+                
+                text = post.get('postText', '')
+                genre = post.get('genre', 'その他')
+                
+                # 多様性を考慮した投稿生成
+                if claude_client and matched_concept:
+                    # AI生成で自社構想を反映
+                    improved_text = generate_with_concept(post, matched_concept, deadline)
+                else:
+                    # 多様性マネージャーで生成（保存前の候補なので予約しない）
+                    improved_text = diversity_manager.generate_unique_post(text, genre, [], reserve=False)
+                
+                # 投稿を作成
+                return {
+                    'id': str(uuid.uuid4()),
+                    'text': improved_text,
+                    'imageUrls': [],
+                    'genre': genre,
+                    'scheduledTime': (datetime.now() + timedelta(hours=random.randint(1, 24))).isoformat(),
+                    'status': 'pending',
+                    'createdAt': datetime.now().isoformat(),
+                    'updatedAt': datetime.now().isoformat(),
+                    'isUnique': True,
+                    'conceptSource': matched_concept.get('keywords', '') if matched_concept else None,
+                    'conceptScore': concept_score,
+                    'matchedConceptIds': [concept.get('id') for concept, _ in concept_matches]
+                }
+            return task
         
-        return jsonify({
-            "success": True,
-            "data": {
+        def finalize(results):
+            processed_posts = [post for post in results if post is not None]
+            
+            # 保存済み投稿・他の候補との準重複をまとめて判定
+            matches = get_similarity_corpus().find_near_duplicates([post['text'] for post in processed_posts])
+            for processed_post, match in zip(processed_posts, matches):
+                if match:
+                    source, similar_to, similarity = match
+                    processed_post['isUnique'] = False
+                    processed_post['similarTo'] = similar_to if source == 'history' else processed_posts[similar_to]['id']
+                    processed_post['similarity'] = round(similarity, 3)
+            
+            logger.info(f"CSV処理完了: {len(processed_posts)}件の投稿候補を生成")
+            return {
                 "posts": processed_posts,
                 "processedCount": len(processed_posts),
                 "totalCount": len(csv_data)
             }
-        })
+        
+        # 投稿ごとの生成はプールで並列に実行（async=true ならジョブIDをすぐに返す）
+        deadline_seconds = generation_deadline_seconds(data)
+        job = get_generation_pool().submit(
+            [make_task(post) for post in top_posts], 'process-csv', deadline_seconds, finalize
+        )
+        return generation_job_response(job, data.get('async'), deadline_seconds)
         
     except Exception as e:
         logger.error(f"CSV処理エラー: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
-def find_matching_concept(post, concepts):
-    """投稿と自社構想のマッチング"""
-    post_genre = post.get('genre', '').lower()
-    post_text = post.get('postText', '').lower()
+def generation_job_response(job, run_async, deadline_seconds):
+    """ジョブの結果を返す。非同期指定時、または期限内に終わらなかった場合はジョブIDを返す"""
+    if not run_async and job.wait(deadline_seconds + 5):
+        error = job.error()
+        if error:
+            return jsonify({"success": False, "error": error}), 500
+        return jsonify({"success": True, "data": job.result})
     
-    for concept in concepts:
-        concept_genre = concept.get('genre', '').lower()
-        concept_keywords = concept.get('keywords', '').lower()
-        
-        # ジャンルまたはキーワードでマッチング
-        if (concept_genre in post_genre or 
-            any(keyword.strip() in post_text for keyword in concept_keywords.split(','))):
-            return concept
+    return jsonify({
+        "success": True,
+        "jobId": job.id,
+        "statusUrl": f"/api/jobs/{job.id}",
+        "total": job.total
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def generation_job_status(job_id):
+    """生成ジョブの進捗と、since 件目以降に完了した部分結果を取得"""
+    job = get_generation_pool().get_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "ジョブが見つかりません"}), 404
     
-    return None
+    since = request.args.get('since', 0, type=int)
+    return jsonify({"success": True, "data": job.to_dict(since)})
 
-def generate_with_concept(post, concept):
-    """自社構想を反映した投稿生成"""
+def find_matching_concept(post, concepts=None):
+    """投稿と自社構想のマッチング（最もスコアの高い構想、なければ None）"""
+    return get_concept_matcher(concepts).best(post.get('postText', ''), post.get('genre', ''))
+
+def generate_with_concept(post, concept, deadline=None):
+    """自社構想を反映した投稿生成（deadline は time.monotonic() 基準の期限）"""
     try:
         prompt = f"""
 以下の人気投稿を参考に、自社の構想を自然に組み込んだ新しい投稿を作成してください。
@@ -1024,16 +2076,13 @@ def generate_with_concept(post, concept):
 改善された投稿文のみを出力してください。
         """
         
-        response = claude_client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1000,
-            temperature=0.7,
-            messages=[{"role": "user", "content": prompt}]
+        improved_text, cached = cached_claude_text(
+            prompt,
+            deadline or time.monotonic() + DEFAULT_DEADLINE,
+            variants=ConfigManager.get_int('llm_cache_variants', DEFAULT_LLM_CACHE_VARIANTS)
         )
         
-        improved_text = response.content[0].text
-        
-        logger.info(f"構想反映投稿生成完了: {concept.get('keywords', '')}")
+        logger.info(f"構想反映投稿生成完了: {concept.get('keywords', '')}{'（キャッシュ）' if cached else ''}")
         return improved_text
         
     except Exception as e:
@@ -1042,7 +2091,8 @@ def generate_with_concept(post, concept):
         return diversity_manager.generate_unique_post(
             post.get('postText', ''), 
             post.get('genre', ''), 
-            []
+            [],
+            reserve=False
         )
 
 @app.route('/api/settings', methods=['GET', 'POST'])
@@ -1058,7 +2108,10 @@ def settings():
                 "claude_configured": claude_configured,
                 "buffer_configured": buffer_configured,
                 "profile_id": profile_id,
-                "all_settings": ConfigManager.get_all_settings()
+                "all_settings": ConfigManager.get_all_settings(),
+                "cache_stats": ConfigManager.cache_stats(),
+                "http_stats": get_http_client().stats(),
+                "llm_cache_stats": get_llm_cache().stats()
             })
             
         except Exception as e:
@@ -1072,6 +2125,8 @@ def settings():
             # 設定を更新
             for key, value in new_settings.items():
                 ConfigManager.set_setting(key, value)
+            # 他の設定から導出した値も含めて次回は読み直す
+            ConfigManager.invalidate()
             
             # Claude APIクライアントを再初期化
             global claude_client
@@ -1088,6 +2143,10 @@ def settings():
             
             logger.info("設定更新完了")
             
+            # 投稿時間帯や間隔の変更を反映させる
+            if automation_worker:
+                automation_worker.wake_all()
+            
             return jsonify({
                 "success": True,
                 "message": "設定を更新しました"
@@ -1097,66 +2156,226 @@ def settings():
             logger.error(f"設定更新エラー: {str(e)}")
             return jsonify({"error": str(e)}), 500
 
+def send_to_buffer(text, image_urls, profile_id):
+    """Buffer APIに即時投稿を送信（失敗時は例外）"""
+    buffer_data = {
+        "text": text,
+        "profile_ids": [profile_id],
+        "now": True
+    }
+    
+    if image_urls:
+        buffer_data["media"] = {
+            "link": image_urls[0],
+            "description": "Threads投稿画像"
+        }
+    
+    headers = {
+        "Authorization": f"Bearer {BUFFER_ACCESS_TOKEN}",
+        "Content-Type": "application/json"
+    }
+    
+    response = get_http_client().post(
+        f"{BUFFER_API_URL}/updates/create.json",
+        headers=headers,
+        json=buffer_data
+    )
+    
+    if response.status_code != 200:
+        raise BufferAPIError(response.status_code, response.text[:200])
+
+class ProfileRateLimiter:
+    """Bufferプロファイル（アカウント）ごとに送信間隔を空けるレートリミッター"""
+    
+    def __init__(self):
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+    
+    def wait(self, key, interval):
+        """key の前回の送信から interval 秒経つまで待機（送信枠は呼び出し順に予約）"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_allowed.get(key, now))
+            self._next_allowed[key] = slot + interval
+        
+        if slot > now:
+            time.sleep(slot - now)
+
 # 自動化ワーカークラス
-class AutomationWorker(threading.Thread):
-    """自動化処理を行うワーカースレッド"""
+class AutomationWorker:
+    """自動化処理を行うワーカー
+
+    一定間隔のポーリングではなく EventScheduler で次の予約投稿・スクレイピング時刻まで待機する。
+    投稿の追加や予約時刻の変更時は wake_posting() で待機を打ち切って再計算する。
+    CSV監視フォルダに書き込まれたファイルはスクレイピング間隔を待たずに取り込む。
+    """
     
     def __init__(self):
-        super().__init__(daemon=True)
         self.running = True
         self.last_scraping = datetime.now()
-        self.last_post = datetime.now()
+        # 最後に投稿を送信した時刻（time.time() 基準）。設定 post_interval（分）の間隔を空けて次を送る
+        self.last_dispatch = None
+        self.scheduler = EventScheduler('automation-worker')
+        self.executor = ThreadPoolExecutor(max_workers=DISPATCH_WORKERS, thread_name_prefix='post-dispatch')
+        self.rate_limiter = ProfileRateLimiter()
+        # CSV監視フォルダで書き込みが完了したファイル（ingestion ジョブが取り込む）
+        self.csv_watcher = None
+        self.ingestion_queue = []
+        self.ingestion_lock = threading.Lock()
+    
+    def start(self):
+        """ワーカーを開始"""
+        scraping_interval = ConfigManager.get_int('scraping_interval', 8)
+        self.scheduler.add_job('posting', self.run_posting)
+        self.scheduler.add_job(
+            'scraping', self.run_scraping,
+            when=(self.last_scraping + timedelta(hours=scraping_interval)).timestamp()
+        )
+        self.scheduler.add_job('ingestion', self.run_ingestion)
+        self.scheduler.start()
+        self._start_csv_watcher()
+        logger.info("自動化ワーカーを開始しました")
     
     def stop(self):
-        """ワーカーを停止"""
+        """ワーカーを停止（実行中の処理の完了を待つ）"""
         self.running = False
         logger.info("自動化ワーカーを停止します")
+        if self.csv_watcher:
+            self.csv_watcher.stop(timeout=5)
+        self.scheduler.stop(timeout=30)
+        self.executor.shutdown(wait=True)
     
-    def run(self):
-        """ワーカーのメインループ"""
-        logger.info("自動化ワーカーを開始しました")
+    def is_alive(self):
+        """ワーカーが動作中かどうか"""
+        return self.running and self.scheduler.is_alive()
+    
+    def wake_posting(self):
+        """次の投稿時刻を再計算させる"""
+        self.scheduler.wake('posting')
+    
+    def wake_all(self):
+        """設定変更時などにすべてのジョブの予定を再計算させる"""
+        self.scheduler.wake('posting')
+        self.scheduler.wake('scraping')
+        # 監視フォルダが変わっていれば監視し直す
+        csv_path = ConfigManager.get_setting('csvWatchPath') or './csv_input'
+        if self.csv_watcher and self.csv_watcher.path != os.path.abspath(csv_path):
+            self.csv_watcher.stop(timeout=5)
+            self._start_csv_watcher()
+    
+    def _start_csv_watcher(self):
+        """CSV監視フォルダのウォッチャーを開始（フォルダがなければ作成）"""
+        csv_path = ConfigManager.get_setting('csvWatchPath') or './csv_input'
+        os.makedirs(csv_path, exist_ok=True)
+        self.csv_watcher = CSVWatcher(csv_path, self.enqueue_csv_files)
+        self.csv_watcher.start()
+    
+    def enqueue_csv_files(self, paths):
+        """書き込みが完了したCSVを取り込み待ちに加え、ingestion ジョブを起こす"""
+        with self.ingestion_lock:
+            self.ingestion_queue.extend(path for path in paths if path not in self.ingestion_queue)
+        self.scheduler.wake('ingestion')
+    
+    def _next_window_open(self, now):
+        """投稿時間外なら次に投稿時間が始まる日時を、時間内なら None を返す"""
+        start_time = ConfigManager.get_time('post_start_time', '09:00')
+        end_time = ConfigManager.get_time('post_end_time', '21:00')
+        current_time = now.time().replace(second=0, microsecond=0)
         
-        while self.running:
-            try:
-                # 設定を取得
-                post_interval = int(ConfigManager.get_setting('post_interval') or 60)
-                scraping_interval = int(ConfigManager.get_setting('scraping_interval') or 8)
-                daily_limit = int(ConfigManager.get_setting('daily_post_limit') or 10)
-                start_time = ConfigManager.get_setting('post_start_time') or '09:00'
-                end_time = ConfigManager.get_setting('post_end_time') or '21:00'
-                
-                now = datetime.now()
-                current_time = now.strftime('%H:%M')
-                
-                # 投稿時間内かチェック
-                if start_time <= current_time <= end_time:
-                    # スクレイピング実行チェック
-                    if (now - self.last_scraping).total_seconds() >= scraping_interval * 3600:
-                        self.perform_scraping()
-                        self.last_scraping = now
-                    
-                    # 投稿実行チェック
-                    if (now - self.last_post).total_seconds() >= post_interval * 60:
-                        # 今日の投稿数をチェック
-                        today = now.date().isoformat()
-                        today_posts = db.execute_query(
-                            "SELECT COUNT(*) FROM posts WHERE DATE(created_at) = ? AND status = 'posted'",
-                            (today,),
-                            fetch=True
-                        )[0][0]
-                        
-                        if today_posts < daily_limit:
-                            self.perform_posting()
-                            self.last_post = now
-                        else:
-                            logger.info(f"本日の投稿上限（{daily_limit}件）に達しました")
-                
-                # 30秒待機
-                time.sleep(30)
-                
-            except Exception as e:
-                logger.error(f"自動化ワーカーエラー: {str(e)}")
-                time.sleep(60)  # エラー時は1分待機
+        if start_time <= current_time <= end_time:
+            return None
+        
+        open_date = now.date() if current_time < start_time else now.date() + timedelta(days=1)
+        return datetime.combine(open_date, start_time)
+    
+    def run_posting(self):
+        """予約時刻を過ぎた投稿を送信し、次に起きる時刻（time.time() 基準）を返す"""
+        now = datetime.now()
+        window_open = self._next_window_open(now)
+        if window_open:
+            return window_open.timestamp()
+        
+        # 前回の送信から post_interval 分が経つまでは送信しない
+        post_interval = ConfigManager.get_int('post_interval', 60) * 60
+        if self.last_dispatch is not None and time.time() < self.last_dispatch + post_interval:
+            return self.last_dispatch + post_interval
+        
+        # 今日の投稿数をチェック
+        daily_limit = ConfigManager.get_int('daily_post_limit', 10)
+        _, today_stats = db.get_statistics(now.date().isoformat())
+        remaining = daily_limit - today_stats['completed_posts']
+        if remaining <= 0:
+            logger.info(f"本日の投稿上限（{daily_limit}件）に達しました")
+            tomorrow = now.date() + timedelta(days=1)
+            start_time = ConfigManager.get_time('post_start_time', '09:00')
+            return datetime.combine(tomorrow, start_time).timestamp()
+        
+        # 1回の起床で送信するのは1バッチまで。残りは post_interval 分後に送る
+        if self.dispatch_due_posts(remaining):
+            self.last_dispatch = time.time()
+            return self.last_dispatch + post_interval
+        
+        # 次の予約投稿まで待機（未投稿がなければ wake_posting() まで待機）
+        candidates = []
+        next_ts = db.execute_query(NEXT_DUE_TIME_QUERY, fetch=True)[0][0]
+        if next_ts is not None:
+            delay = next_ts - sqlite_epoch(datetime.now())
+            # 予約時刻を過ぎた投稿が残っている = 他のワーカーが送信中など。1分後に再確認
+            candidates.append(time.time() + (delay if delay > 0 else 60))
+        
+        # 他のワーカーが送信中のまま止まった投稿は貸出期限が切れたら引き取る
+        lease_expires_at = db.execute_query(
+            "SELECT MIN(lease_expires_at) FROM posts WHERE status = 'sending'", fetch=True
+        )[0][0]
+        if lease_expires_at is not None:
+            candidates.append(max(lease_expires_at, time.time() + 1))
+        
+        if not candidates:
+            return None
+        if self.last_dispatch is not None:
+            return max(min(candidates), self.last_dispatch + post_interval)
+        return min(candidates)
+    
+    def run_scraping(self):
+        """スクレイピング間隔が経過していれば実行し、次に起きる時刻を返す"""
+        now = datetime.now()
+        scraping_interval = timedelta(hours=ConfigManager.get_int('scraping_interval', 8))
+        
+        next_scraping = self.last_scraping + scraping_interval
+        if now < next_scraping:
+            return next_scraping.timestamp()
+        
+        window_open = self._next_window_open(now)
+        if window_open:
+            return window_open.timestamp()
+        
+        self.perform_scraping()
+        self.last_scraping = now
+        # 生成した投稿の予約時刻に合わせて投稿ジョブを起こす
+        self.wake_posting()
+        return (now + scraping_interval).timestamp()
+    
+    def run_ingestion(self):
+        """ウォッチャーから届いたCSVを取り込む（次は enqueue_csv_files() で起こされるまで待機）"""
+        with self.ingestion_lock:
+            paths, self.ingestion_queue = self.ingestion_queue, []
+        if not paths:
+            return None
+        
+        csv_path = ConfigManager.get_setting('csvWatchPath') or './csv_input'
+        try:
+            summary = ingest_csv_files(
+                csv_path, str(uuid.uuid4()), 'CSV監視: {posts_processed}件を処理', paths=paths
+            )
+        except Exception:
+            # 取り込めなかったファイルは次の実行（エラー時は EventScheduler が再実行）に回す
+            with self.ingestion_lock:
+                self.ingestion_queue[:0] = paths
+            raise
+        if summary:
+            logger.info(f"CSV監視: {summary['completedFiles']}ファイルから{summary['postsProcessed']}件を処理")
+            self.wake_posting()
+        return None
     
     def perform_scraping(self):
         """スクレイピングを実行"""
@@ -1165,148 +2384,130 @@ class AutomationWorker(threading.Thread):
             
             # trigger_scraping と同様の処理
             csv_path = ConfigManager.get_setting('csvWatchPath') or './csv_input'
-            csv_files = list(Path(csv_path).glob('*.csv'))
+            summary = ingest_csv_files(
+                csv_path, str(uuid.uuid4()), '自動スクレイピング完了: {posts_processed}件を処理'
+            )
             
-            if csv_files:
-                latest_csv = max(csv_files, key=os.path.getctime)
-                df = pd.read_csv(latest_csv)
-                
-                # 処理とログ記録
-                history_id = str(uuid.uuid4())
-                posts_found = len(df)
-                
-                # 上位投稿を処理
-                top_posts = df.nlargest(10, 'likes') if 'likes' in df.columns else df.head(10)
-                posts_processed = 0
-                
-                for _, row in top_posts.iterrows():
-                    text = row.get('text', '')
-                    genre = row.get('genre', 'その他')
-                    
-                    # 多様性を考慮した投稿生成
-                    improved_text = diversity_manager.generate_unique_post(text, genre, [])
-                    
-                    # 投稿を保存
-                    post_id = str(uuid.uuid4())
-                    scheduled_time = (datetime.now() + timedelta(hours=random.randint(1, 24))).isoformat()
-                    post_hash = hashlib.sha256(improved_text.encode()).hexdigest()
-                    
-                    db.execute_query('''
-                        INSERT OR IGNORE INTO posts 
-                        (id, text, image_urls, genre, scheduled_time, status, 
-                         created_at, updated_at, is_unique, post_hash)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        post_id,
-                        improved_text,
-                        json.dumps([]),
-                        genre,
-                        scheduled_time,
-                        'pending',
-                        datetime.now().isoformat(),
-                        datetime.now().isoformat(),
-                        True,
-                        post_hash
-                    ))
-                    posts_processed += 1
-                
-                # 履歴を記録
-                db.execute_query('''
-                    INSERT INTO scraping_history 
-                    (id, timestamp, status, message, posts_found, posts_processed)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    history_id,
-                    datetime.now().isoformat(),
-                    'success',
-                    f'自動スクレイピング完了: {posts_processed}件を処理',
-                    posts_found,
-                    posts_processed
-                ))
-                
-                # CSVを処理済みフォルダに移動
-                processed_path = Path('./csv_processed') / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{latest_csv.name}"
-                latest_csv.rename(processed_path)
-                
-                logger.info(f"自動スクレイピング完了: {posts_processed}件を処理")
+            if summary:
+                logger.info(f"自動スクレイピング完了: {summary['postsProcessed']}件を処理")
                 
         except Exception as e:
             logger.error(f"自動スクレイピングエラー: {str(e)}")
     
-    def perform_posting(self):
-        """投稿を実行"""
+    def dispatch_due_posts(self, limit):
+        """予約時刻を過ぎた投稿を最大 limit 件取得し、スレッドプールで並列に送信する
+
+        送信結果はまとめて1トランザクションで記録する。処理した件数を返す。
+        """
+        posts = db.claim_due_posts(min(limit, DISPATCH_BATCH_SIZE))
+        if not posts:
+            logger.info("投稿する記事がありません")
+            return 0
+        
+        default_profile_id = ConfigManager.get_setting('BUFFER_PROFILE_ID')
+        send_interval = ConfigManager.get_int('buffer_send_interval', 5)
+        
+        results = list(self.executor.map(
+            lambda post: self.send_post(post, post['profile_id'] or default_profile_id, send_interval),
+            posts
+        ))
+        db.record_post_results([
+            (*result, post['lease_expires_at']) for result, post in zip(results, posts)
+        ])
+        
+        counts = {status: 0 for status in ('posted', 'pending', 'failed')}
+        for _, status, _, _ in results:
+            counts[status] += 1
+        logger.info(
+            f"投稿送信完了: 成功{counts['posted']}件・再送待ち{counts['pending']}件・失敗{counts['failed']}件"
+        )
+        return len(results)
+    
+    def send_post(self, post, profile_id, send_interval):
+        """1件の投稿を送信して (post_id, status, buffer_sent_time, next_attempt_ts) を返す
+
+        一時的なエラーは上限回数まで status='pending' と次回の送信時刻を返して再送させる。
+        """
+        post_id = post['id']
+        
+        # Buffer未設定の場合はシミュレーション
+        if not BUFFER_ACCESS_TOKEN:
+            logger.info(f"投稿シミュレーション完了: {post_id}")
+            return post_id, 'posted', None, None
+        
+        image_urls = json.loads(post['image_urls']) if post['image_urls'] else []
+        
+        # 同じアカウントへの送信は間隔を空ける
+        self.rate_limiter.wait(profile_id, send_interval)
+        
         try:
-            # 次の投稿を取得
-            result = db.execute_query(
-                """SELECT id, text, image_urls, genre FROM posts 
-                   WHERE status = 'pending' 
-                   ORDER BY scheduled_time ASC 
-                   LIMIT 1""",
-                fetch=True
-            )
-            
-            if not result:
-                logger.info("投稿する記事がありません")
-                return
+            send_to_buffer(post['text'], image_urls, profile_id)
+            logger.info(f"投稿成功: {post_id}")
+            return post_id, 'posted', datetime.now().isoformat(), None
+        except Exception as e:
+            attempt = (post['retry_attempts'] or 0) + 1
+            max_attempts = ConfigManager.get_int('retry_max_attempts', RETRY_MAX_ATTEMPTS)
+            if is_transient_error(e) and attempt < max_attempts:
+                delay = retry_delay(attempt)
+                logger.warning(f"投稿失敗 {post_id}（{attempt}回目・{delay:.0f}秒後に再送）: {str(e)}")
+                return post_id, 'pending', None, sqlite_epoch(datetime.now()) + int(delay)
             
-            post_id, text, image_urls_json, genre = result[0]
-            image_urls = json.loads(image_urls_json) if image_urls_json else []
+            logger.error(f"投稿失敗 {post_id}（{attempt}回目）: {str(e)}")
+            return post_id, 'failed', None, None
+
+def self_test():
+    """新しいデータベースで主要クエリがすべてインデックスを使い、インデックスを消すと検出できることを確認"""
+    import tempfile
+    
+    with tempfile.TemporaryDirectory() as directory:
+        test_db = Database(os.path.join(directory, 'self_test.db'))
+        try:
+            problems = test_db.check_query_plans()
+            assert problems == [], f"テーブルスキャン・一時ソートになっている主要クエリがあります: {problems}"
+            print(f"✅ 主要クエリ{len(hot_queries(datetime.now().isoformat()))}件はすべてインデックスを使用")
             
-            # Buffer APIが設定されている場合は送信
-            if BUFFER_ACCESS_TOKEN:
-                try:
-                    buffer_data = {
-                        "text": text,
-                        "profile_ids": [ConfigManager.get_setting('BUFFER_PROFILE_ID')],
-                        "now": True
-                    }
-                    
-                    if image_urls:
-                        buffer_data["media"] = {
-                            "link": image_urls[0],
-                            "description": "Threads投稿画像"
-                        }
-                    
-                    headers = {
-                        "Authorization": f"Bearer {BUFFER_ACCESS_TOKEN}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    response = requests.post(
-                        f"{BUFFER_API_URL}/updates/create.json",
-                        headers=headers,
-                        json=buffer_data
-                    )
-                    
-                    if response.status_code == 200:
-                        # 成功時のステータス更新
-                        db.execute_query(
-                            "UPDATE posts SET status = 'posted', updated_at = ? WHERE id = ?",
-                            (datetime.now().isoformat(), post_id)
-                        )
-                        logger.info(f"投稿成功: {post_id}")
-                    else:
-                        raise Exception(f"Buffer API error: {response.status_code}")
-                        
-                except Exception as e:
-                    # 失敗時のステータス更新
-                    db.execute_query(
-                        "UPDATE posts SET status = 'failed', updated_at = ? WHERE id = ?",
-                        (datetime.now().isoformat(), post_id)
-                    )
-                    logger.error(f"投稿失敗 {post_id}: {str(e)}")
-            else:
-                # Buffer未設定の場合はシミュレーション
-                db.execute_query(
-                    "UPDATE posts SET status = 'posted', updated_at = ? WHERE id = ?",
-                    (datetime.now().isoformat(), post_id)
-                )
-                logger.info(f"投稿シミュレーション完了: {post_id}")
-                
-        except Exception as e:
-            logger.error(f"自動投稿エラー: {str(e)}")
+            test_db.execute_query("DROP INDEX idx_posts_created_sort_id")
+            names = [name for name, _ in test_db.check_query_plans()]
+            assert 'posts_list' in names, names
+            print("✅ インデックスがなければテーブルスキャンとして検出")
+        finally:
+            test_db.close_all()
+    return True
 
 if __name__ == '__main__':
+    # 自己診断・統計テーブルのメンテナンスコマンド
+    if len(sys.argv) > 1:
+        if sys.argv[1] == "--self-test":
+            try:
+                self_test()
+            except AssertionError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+            sys.exit(0)
+        elif sys.argv[1] == "--rebuild-stats":
+            rows = db.rebuild_statistics()
+            print(f"統計テーブルを再構築しました: {rows}行")
+            sys.exit(0)
+        elif sys.argv[1] == "--verify-stats":
+            drift = db.verify_statistics()
+            if not drift:
+                print("統計テーブルは正常です")
+                sys.exit(0)
+            print(f"統計テーブルにずれがあります: {len(drift)}件（--rebuild-stats で修復）")
+            for date, values in sorted(drift.items()):
+                print(f"  {date}: 期待値={values['expected']} 実際={values['actual']}")
+            sys.exit(1)
+        elif sys.argv[1] == "--check-query-plans":
+            problems = db.check_query_plans()
+            if not problems:
+                print("主要クエリはすべてインデックスを使用しています")
+                sys.exit(0)
+            for name, plan in problems:
+                print(f"テーブルスキャン: {name}")
+                for detail in plan:
+                    print(f"  {detail}")
+            sys.exit(1)
+    
     # 初回起動時にモックデータを作成
     if not os.path.exists('threads_auto_post.db'):
         logger.info("初回起動のため、モックデータを作成します")
@@ -1332,4 +2533,5 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info("サーバーを終了します")
         if automation_worker:
-            automation_worker.stop()
\ No newline at end of file
+            automation_worker.stop()
+        db.close_all()
\ No newline at end of file
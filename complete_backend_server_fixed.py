@@ -486,11 +486,18 @@ def posts():
                 for post in posts_to_save:
                     post_id = post.get('id', str(uuid.uuid4()))
                     
+                    # 同じIDは置き換える（UPSERT なら置換でも統計カウンタの更新トリガーが発火する）
                     db.execute_query('''
-                        INSERT OR REPLACE INTO posts 
+                        INSERT INTO posts 
                         (id, text, image_urls, genre, scheduled_time, buffer_sent_time, 
                          status, concept_source, reference_post, created_at, updated_at)
                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(id) DO UPDATE SET
+                            text = excluded.text, image_urls = excluded.image_urls, genre = excluded.genre,
+                            scheduled_time = excluded.scheduled_time, buffer_sent_time = excluded.buffer_sent_time,
+                            status = excluded.status, concept_source = excluded.concept_source,
+                            reference_post = excluded.reference_post, created_at = excluded.created_at,
+                            updated_at = excluded.updated_at
                     ''', (
                         post_id,
                         post.get('text', ''),
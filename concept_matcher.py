@@ -0,0 +1,140 @@
+"""
+自社構想マッチャー
+全構想のキーワードから Aho–Corasick オートマトンを一度だけ構築し、
+投稿文を1回走査するだけで一致する構想とスコアをまとめて求める
+（構想数・キーワード数が増えても投稿ごとの処理量はほぼ投稿文の長さで決まる）
+"""
+
+import unicodedata
+from collections import deque
+
+# ジャンルが一致した場合にスコアへ加える値（キーワードの一致率は0〜1）
+GENRE_MATCH_SCORE = 0.5
+
+
+def normalize_keyword(text):
+    """比較用に正規化（NFKC・小文字化・前後の空白除去）"""
+    return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+
+def split_keywords(keywords):
+    """カンマ区切り（全角カンマ・読点も可）のキーワードを正規化して重複なく返す"""
+    normalized = normalize_keyword(keywords).replace('、', ',')
+    seen = []
+    for keyword in normalized.split(','):
+        keyword = keyword.strip()
+        if keyword and keyword not in seen:
+            seen.append(keyword)
+    return seen
+
+
+class AhoCorasick:
+    """複数パターンの同時検索オートマトン
+
+    add() でパターンと値を登録し、build() の後に find() で
+    テキスト中に現れたパターンの値を出現順に返す。
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._built = False
+
+    def add(self, pattern, value):
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append(value)
+        self._built = False
+
+    def build(self):
+        """失敗遷移を幅優先で求め、各ノードの出力に失敗先の出力を合流させる"""
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+        self._built = True
+        return self
+
+    def find(self, text):
+        """テキスト中に現れたパターンの値を（重複も含めて）出現順に返す"""
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = []
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if output[node]:
+                found.extend(output[node])
+        return found
+
+
+class ConceptMatcher:
+    """自社構想の一覧から構築したマッチャー
+
+    スコア = 一致したキーワード数 / 構想のキーワード数
+           + 構想のジャンルが投稿のジャンルに含まれていれば GENRE_MATCH_SCORE
+    空のキーワード・ジャンルは一致判定に使わない。
+    """
+
+    def __init__(self, concepts):
+        self.concepts = list(concepts)
+        self._keyword_counts = []
+        self._keywords = AhoCorasick()
+        self._genres = AhoCorasick()
+
+        for index, concept in enumerate(self.concepts):
+            keywords = split_keywords(concept.get('keywords', ''))
+            self._keyword_counts.append(len(keywords))
+            for keyword in keywords:
+                self._keywords.add(keyword, (index, keyword))
+            genre = normalize_keyword(concept.get('genre', ''))
+            if genre:
+                self._genres.add(genre, index)
+
+        self._keywords.build()
+        self._genres.build()
+
+    def __len__(self):
+        return len(self.concepts)
+
+    def match(self, text, genre=''):
+        """一致した構想を [(構想, スコア)] のスコアの高い順（同点は一覧の順）で返す"""
+        matched_keywords = {}
+        for index, keyword in self._keywords.find(normalize_keyword(text)):
+            matched_keywords.setdefault(index, set()).add(keyword)
+        genre_matches = set(self._genres.find(normalize_keyword(genre)))
+
+        scores = {}
+        for index, keywords in matched_keywords.items():
+            scores[index] = len(keywords) / self._keyword_counts[index]
+        for index in genre_matches:
+            scores[index] = scores.get(index, 0) + GENRE_MATCH_SCORE
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(self.concepts[index], round(score, 3)) for index, score in ranked]
+
+    def best(self, text, genre=''):
+        """最もスコアの高い構想（なければ None）"""
+        matches = self.match(text, genre)
+        return matches[0][0] if matches else None
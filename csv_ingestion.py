@@ -0,0 +1,179 @@
+"""
+スクレイピングCSVの取り込み
+監視フォルダのCSVを列名の対応表で共通の項目名（text/image_url/likes/genre）に読み替え、
+チャンク単位で読み進めながらジャンルごとにいいね数の上位k件だけを保持する
+（ファイル全体をメモリに載せない）
+"""
+
+import heapq
+import json
+import os
+
+import pandas as pd
+
+# 共通の項目名 -> CSVで使われうる列名（先頭から順に探す）
+DEFAULT_COLUMN_MAPPING = {
+    'text': ('text', 'postText', '投稿文'),
+    'image_url': ('image_url', 'imageUrl', '画像URL'),
+    'likes': ('likes', 'いいね数'),
+    'genre': ('genre', 'ジャンル'),
+}
+# 必須の項目（ほかは列がなければ既定値）
+REQUIRED_FIELDS = ('text',)
+DEFAULT_GENRE = 'その他'
+
+# 1回に読み込む行数
+CHUNK_ROWS = 5000
+# ジャンルごとに投稿生成の元にする上位件数
+DEFAULT_TOP_K_PER_GENRE = 3
+
+
+class CSVColumnError(ValueError):
+    """CSVに必須の列が見つからない"""
+
+
+def parse_column_mapping(value):
+    """設定値（JSON文字列または辞書）を既定の対応表に重ねた対応表を返す
+
+    例: {"text": "本文", "likes": ["いいね", "likes"]}
+    指定した列名は既定の列名より優先して探す。
+    """
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise ValueError("列の対応表はオブジェクトで指定してください")
+
+    mapping = dict(DEFAULT_COLUMN_MAPPING)
+    for field, columns in value.items():
+        if field not in mapping:
+            raise ValueError(f"不明な項目名です: {field}")
+        if isinstance(columns, str):
+            columns = (columns,)
+        mapping[field] = tuple(columns) + tuple(c for c in mapping[field] if c not in columns)
+    return mapping
+
+
+def resolve_columns(header, mapping=DEFAULT_COLUMN_MAPPING):
+    """ヘッダー行から {共通の項目名: CSVの列名} を求める"""
+    header = [str(column).strip().lstrip('﻿') for column in header]
+    resolved = {}
+    for field, candidates in mapping.items():
+        for candidate in candidates:
+            if candidate in header:
+                resolved[field] = candidate
+                break
+
+    missing = [field for field in REQUIRED_FIELDS if field not in resolved]
+    if missing:
+        raise CSVColumnError(f"必須の列が見つかりません: {', '.join(missing)}（ヘッダー: {', '.join(header)}）")
+    return resolved
+
+
+def read_header(path):
+    """CSVのヘッダー行（列名のリスト）"""
+    try:
+        return list(pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns)
+    except pd.errors.EmptyDataError:
+        return []
+
+
+def iter_csv_rows(path, mapping=DEFAULT_COLUMN_MAPPING, start_row=0, chunk_rows=CHUNK_ROWS):
+    """start_row 行目（ヘッダーを除いた0始まり）以降の行を順に返す
+
+    行の辞書は共通の項目名をキーにする（likes は数値、欠損は0）。
+    チェックポイントはCSVのレコード数で数えるため、引用符内の改行があっても
+    物理行ではなくレコード単位で読み飛ばす（skiprows は物理行を数えるので使わない）。
+    """
+    columns = resolve_columns(read_header(path), mapping)
+    renames = {column: field for field, column in columns.items()}
+    string_columns = {column: str for field, column in columns.items() if field != 'likes'}
+
+    reader = pd.read_csv(
+        path,
+        encoding='utf-8-sig',
+        usecols=list(renames),
+        dtype=string_columns,
+        keep_default_na=False,
+        chunksize=chunk_rows
+    )
+    skip = start_row
+    for chunk in reader:
+        if skip:
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+            chunk = chunk.iloc[skip:]
+            skip = 0
+        chunk.columns = [renames[str(column).strip().lstrip('﻿')] for column in chunk.columns]
+        if 'likes' in chunk:
+            chunk['likes'] = pd.to_numeric(chunk['likes'], errors='coerce').fillna(0).astype('int64')
+        for row in chunk.to_dict('records'):
+            row.setdefault('likes', 0)
+            row.setdefault('image_url', '')
+            row['genre'] = row.get('genre') or DEFAULT_GENRE
+            yield row
+
+
+def file_signature(path):
+    """ファイルの (サイズ, 更新時刻ns)。置き換え・追記の検出に使う"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class GenreTopK:
+    """ジャンルごとにいいね数の上位k件だけを保持する（各ジャンル大きさkの最小ヒープ）
+
+    いいね数が同じ場合は先に追加した行を残す。
+    """
+
+    def __init__(self, k=DEFAULT_TOP_K_PER_GENRE):
+        self.k = k
+        self._heaps = {}
+        self._seq = 0
+        self.seen = 0
+
+    def add(self, row):
+        self.seen += 1
+        self._seq += 1
+        heap = self._heaps.setdefault(row['genre'], [])
+        item = (row['likes'], -self._seq, row)
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def __len__(self):
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def rows(self):
+        """保持している行をいいね数の多い順に返す"""
+        items = [item for heap in self._heaps.values() for item in heap]
+        items.sort(key=lambda item: item[:2], reverse=True)
+        return [item[2] for item in items]
+
+
+def pending_files(paths, checkpoints):
+    """paths のうち取り込みが必要なCSVを古い順に [(パス, 読み始める行, (サイズ, 更新時刻))] で返す
+
+    checkpoints は {str(パス): {'file_size', 'mtime_ns', 'rows_processed', 'status'}}。
+    読み終えたファイルと、失敗したまま変更されていないファイルは除く。
+    ファイルが小さくなっていれば置き換えられたとみなして先頭から読み直す。
+    """
+    files = []
+    for path in paths:
+        try:
+            signature = file_signature(path)
+        except FileNotFoundError:
+            continue
+        checkpoint = checkpoints.get(str(path))
+        start_row = 0
+        if checkpoint:
+            unchanged = (checkpoint['file_size'], checkpoint['mtime_ns']) == signature
+            if unchanged and checkpoint['status'] in ('completed', 'failed'):
+                continue
+            if signature[0] >= checkpoint['file_size']:
+                start_row = checkpoint['rows_processed']
+        files.append((path, start_row, signature))
+
+    files.sort(key=lambda item: item[2][1])
+    return files
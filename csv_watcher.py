@@ -0,0 +1,295 @@
+"""
+CSV監視フォルダのウォッチャー
+Linuxでは inotify でファイルの作成・書き込み完了・移動を受け取り、
+それ以外の環境（または inotify を使えない場合）はフォルダの定期スキャンで代用する。
+書き込み途中のファイルを渡さないよう、一定時間変化がなくなってから通知する。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 最後の変更からこの秒数だけサイズ・更新時刻が変わらなければ書き込み完了とみなす
+DEBOUNCE_SECONDS = 2.0
+# inotify を使えない場合のスキャン間隔（秒）
+POLL_INTERVAL = 10.0
+
+# inotify の定数（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+# struct inotify_event のヘッダー（wd, mask, cookie, len）。後ろに len バイトのファイル名が続く
+EVENT_HEADER = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    INOTIFY_AVAILABLE = sys.platform.startswith('linux')
+except (OSError, AttributeError, TypeError):
+    _libc = None
+    INOTIFY_AVAILABLE = False
+
+
+def is_csv(name):
+    """監視対象のファイル名か（隠しファイル・一時ファイルは除く）"""
+    return name.lower().endswith('.csv') and not name.startswith('.')
+
+
+class CSVWatcher:
+    """フォルダ内のCSVの追加・更新を監視し、書き込みが落ち着いたものを on_files に渡す
+
+    on_files はパスのリストを受け取る（ウォッチャーのスレッドから呼ばれるので、
+    重い処理はキューに積んで別スレッドで行うこと）。
+    """
+
+    def __init__(self, path, on_files, debounce=DEBOUNCE_SECONDS, poll_interval=POLL_INTERVAL, use_inotify=None):
+        self.path = os.path.abspath(path)
+        self.on_files = on_files
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = INOTIFY_AVAILABLE if use_inotify is None else use_inotify and INOTIFY_AVAILABLE
+        self.backend = None
+        self._pending = {}  # パス -> (通知予定時刻, 最後に見た (サイズ, 更新時刻))
+        self._known = {}    # 定期スキャンで前回見た {パス: (サイズ, 更新時刻)}
+        self._running = False
+        self._thread = None
+        # stop() で select を起こすためのパイプ（start() で作り、監視スレッドの終了時に閉じる）
+        self._wakeup_read = self._wakeup_write = None
+        self._wakeup_lock = threading.Lock()
+
+    def start(self):
+        """監視スレッドを開始"""
+        if self._running:
+            return
+        if self._thread and self._thread.is_alive():
+            # 停止直後に再開する場合は前の監視スレッドがパイプを閉じ終わるのを待つ
+            self._thread.join()
+        self._running = True
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        self._thread = threading.Thread(target=self._run, name='csv-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """監視を停止"""
+        if not self._running:
+            return
+        self._running = False
+        with self._wakeup_lock:
+            # 監視スレッドが終了済みならパイプは閉じられている
+            if self._wakeup_write is not None:
+                os.write(self._wakeup_write, b'\0')
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        """監視スレッドが動作中かどうか"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        fd = self._open_inotify() if self.use_inotify else None
+        self.backend = 'inotify' if fd is not None else 'polling'
+        logger.info(f"CSV監視を開始しました: {self.path}（{self.backend}）")
+        try:
+            if fd is not None:
+                self._run_inotify(fd)
+            else:
+                self._run_polling()
+        finally:
+            if fd is not None:
+                os.close(fd)
+            with self._wakeup_lock:
+                os.close(self._wakeup_read)
+                os.close(self._wakeup_write)
+                self._wakeup_read = self._wakeup_write = None
+            logger.info("CSV監視を停止しました")
+
+    def _open_inotify(self):
+        """inotify を初期化してフォルダを登録（失敗したら None）"""
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify を初期化できません（{os.strerror(ctypes.get_errno())}）。定期スキャンで監視します")
+            return None
+        if _libc.inotify_add_watch(fd, os.fsencode(self.path), WATCH_MASK) < 0:
+            logger.warning(f"inotify で監視できません（{os.strerror(ctypes.get_errno())}）。定期スキャンで監視します")
+            os.close(fd)
+            return None
+        return fd
+
+    def _run_inotify(self, fd):
+        while self._running:
+            timeout = self._next_deadline_delay()
+            readable, _, _ = select.select([fd, self._wakeup_read], [], [], timeout)
+            if self._wakeup_read in readable:
+                os.read(self._wakeup_read, 64)
+            if fd in readable and not self._read_events(fd):
+                # 監視フォルダが削除・移動された
+                logger.warning(f"監視フォルダがなくなりました: {self.path}。定期スキャンに切り替えます")
+                self.backend = 'polling'
+                self._run_polling()
+                return
+            self._flush_ready()
+
+    def _read_events(self, fd):
+        """溜まったイベントを読み、監視を続けられるかを返す"""
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return True
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return True
+            raise
+
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                return False
+            if mask & IN_Q_OVERFLOW:
+                # イベントの取りこぼし。フォルダを一度スキャンし直す
+                self._scan()
+            elif name and is_csv(name):
+                self._touch(os.path.join(self.path, name))
+        return True
+
+    def _run_polling(self):
+        # 開始時点のファイルは通知しない（inotify と同じく、以降の追加・変更だけを通知）
+        self._scan(notify=False)
+        while self._running:
+            self._scan()
+            self._flush_ready()
+            delay = self._next_deadline_delay()
+            timeout = self.poll_interval if delay is None else min(delay, self.poll_interval)
+            readable, _, _ = select.select([self._wakeup_read], [], [], timeout)
+            if readable:
+                os.read(self._wakeup_read, 64)
+
+    def _scan(self, notify=True):
+        """フォルダのCSVのうち、新しいもの・変更されたものを通知待ちに加える"""
+        try:
+            entries = [entry for entry in os.scandir(self.path) if entry.is_file() and is_csv(entry.name)]
+        except FileNotFoundError:
+            return
+        current = {}
+        for entry in entries:
+            stat = entry.stat()
+            current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            if notify and self._known.get(entry.path) != current[entry.path]:
+                self._touch(entry.path, current[entry.path])
+        self._known = current
+
+    def _touch(self, path, signature=None):
+        """ファイルの変更を記録し、通知予定時刻を延ばす"""
+        if signature is None:
+            signature = self._signature(path)
+        self._pending[path] = (time.monotonic() + self.debounce, signature)
+
+    def _flush_ready(self):
+        """変化がなくなったファイルを通知する"""
+        now = time.monotonic()
+        ready = []
+        for path, (deadline, signature) in list(self._pending.items()):
+            if deadline > now:
+                continue
+            current = self._signature(path)
+            if current is None:
+                del self._pending[path]
+            elif current != signature:
+                # 待機中にも書き込まれていた
+                self._pending[path] = (now + self.debounce, current)
+            else:
+                del self._pending[path]
+                ready.append(path)
+
+        if ready:
+            ready.sort()
+            try:
+                self.on_files(ready)
+            except Exception as e:
+                logger.error(f"CSV監視の通知処理でエラー: {str(e)}")
+
+    def _next_deadline_delay(self):
+        """次に通知を判定するまでの秒数（通知待ちがなければ None）"""
+        if not self._pending:
+            return None
+        return max(0.0, min(deadline for deadline, _ in self._pending.values()) - time.monotonic())
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+
+def self_test():
+    """一時フォルダに少しずつ書き込んだCSVが、書き終わってから1回だけ通知されることを確認"""
+    import tempfile
+
+    backends = [False] + ([True] if INOTIFY_AVAILABLE else [])
+    for use_inotify in backends:
+        with tempfile.TemporaryDirectory() as directory:
+            received = []
+            watcher = CSVWatcher(directory, received.extend, debounce=0.5, poll_interval=0.2, use_inotify=use_inotify)
+            watcher.start()
+            time.sleep(0.3)
+
+            started = time.monotonic()
+            path = os.path.join(directory, 'scraped.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('投稿文,画像URL,いいね数,ジャンル\n')
+                for i in range(4):
+                    f.write(f'投稿{i},,{i},テスト\n')
+                    f.flush()
+                    time.sleep(0.2)
+            with open(os.path.join(directory, 'ignored.tmp'), 'w') as f:
+                f.write('x')
+
+            while not received and time.monotonic() - started < 5:
+                time.sleep(0.05)
+            elapsed = time.monotonic() - started
+            time.sleep(1)
+            watcher.stop(timeout=5)
+
+            assert received == [path], f"通知内容が想定外です: {received}"
+            print(f"✅ {watcher.backend}: 書き込み完了から{elapsed - 0.8:.2f}秒後に1回だけ通知")
+    return True
+
+
+if __name__ == "__main__":
+    # python csv_watcher.py            : 動作確認
+    # python csv_watcher.py ./csv_input : フォルダを監視して通知されたファイルを表示
+    if len(sys.argv) > 1:
+        logging.basicConfig(level=logging.INFO)
+        watcher = CSVWatcher(sys.argv[1], lambda paths: print('\n'.join(f"📄 {path}" for path in paths)))
+        watcher.start()
+        try:
+            while watcher.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            watcher.stop()
+    else:
+        self_test()
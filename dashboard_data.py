@@ -0,0 +1,846 @@
+"""
+ダッシュボード共通のデータアクセス
+各SQLiteファイルから読み込んだ結果を、ファイルのシグネチャ
+（更新時刻・サイズ・WALファイル・PRAGMA data_version）をキーにプロセス内へキャッシュする。
+Streamlitの再実行（ウィジェット操作）では変更のあったデータベースだけを読み直す。
+"""
+
+import copy
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ダッシュボードが参照する投稿データベース（名前 -> パス）
+POST_DATABASES = {
+    "scheduled_posts": "scheduled_posts.db",
+    "threads_optimized": "threads_optimized.db",
+    "buzz_history": "buzz_history.db",
+    "viral_history": "viral_history.db"
+}
+
+# データベースごとの投稿テーブル（パス -> テーブル名）
+POST_TABLES = {
+    'scheduled_posts.db': 'scheduled_posts',
+    'threads_optimized.db': 'threads_posts',
+    'buzz_history.db': 'buzz_history',
+    'viral_history.db': 'post_history'
+}
+
+# 読み込み順の候補（先に見つかった時刻カラムで新しい順に並べる）
+TIME_SORT_COLUMNS = ['scheduled_time', 'generated_at', 'created_at']
+TIME_COLUMNS = ['scheduled_time', 'generated_at', 'created_at', 'posted_at']
+
+# 差分読み込みで付ける rowid のカラム名と、更新・削除を記録するテーブル
+ROWID_COLUMN = '_rowid'
+CHANGE_LOG_TABLE = '_dashboard_changes'
+# 変更ログに残す件数の目安（これより古い位置から読む場合は全件を読み直す）
+CHANGE_LOG_KEEP = 10000
+# データベースファイルごとの識別子を保存するテーブル（削除後に同じ inode で作り直されたファイルを区別する）
+DATABASE_ID_TABLE = '_dashboard_database_id'
+
+# 日別・時間帯別・パターン別の集計（ロールアップ）を書き込み時に更新するテーブル
+ROLLUP_TABLE = '_dashboard_rollup'
+ROLLUP_META_TABLE = '_dashboard_rollup_meta'
+# ロールアップに使うカラムの候補（先に見つかったものを使う）
+ROLLUP_TIME_COLUMNS = ['scheduled_time', 'generated_at', 'created_at']
+ROLLUP_PREDICTION_COLUMNS = ['engagement_prediction', 'engagement_score']
+ROLLUP_METRICS = ['clicks', 'shares', 'comments', 'likes']
+
+# キャッシュする読み込み結果の上限（ページ単位の読み込みが増えても古いものから捨てる）
+MAX_CACHE_ENTRIES = 256
+
+_cache = {}  # (パス, キー) -> (シグネチャ, 値)（最後に保存した順）
+_cache_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+# data_version を読むための接続（同じ接続で見た他の接続のコミット回数が増える）
+_version_connections = {}  # パス -> (inode, 接続)
+_version_lock = threading.Lock()
+
+
+def _data_version(path, inode):
+    with _version_lock:
+        try:
+            entry = _version_connections.get(path)
+            if entry is None or entry[0] != inode:
+                # ファイルが作り直された場合は接続し直す
+                if entry is not None:
+                    entry[1].close()
+                conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+                entry = _version_connections[path] = (inode, conn)
+            return entry[1].execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            # 読めない場合は更新時刻・サイズだけで判定する
+            return None
+
+
+def database_signature(path) -> Optional[tuple]:
+    """データベースの変更を判定するシグネチャ（ファイルがなければ None）
+
+    WALモードではコミットが -wal ファイルにだけ書かれることがあるため、
+    本体に加えて -wal ファイルの更新時刻・サイズと PRAGMA data_version も含める。
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    try:
+        wal = os.stat(f"{path}-wal")
+        wal_signature = (wal.st_mtime_ns, wal.st_size)
+    except FileNotFoundError:
+        wal_signature = None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size, wal_signature, _data_version(path, stat.st_ino))
+
+
+class IncrementalQuery(NamedTuple):
+    """差分読み込みするテーブルの指定（cached_query の loader が返す）
+
+    columns は SELECT 句（params はその中の ? に渡す値）、parse は読み込んだ行だけに
+    適用する変換（日時の解析など）、order_by は結合後に降順で並べるカラム。
+    """
+    table: str
+    columns: str = '*'
+    params: tuple = ()
+    parse: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    order_by: Optional[List[str]] = None
+
+
+class _IncrementalFrame:
+    """差分読み込みの状態（rowid 付きの DataFrame と、読み込み済みの位置）"""
+
+    def __init__(self, query, df, max_rowid, change_seq, identity):
+        self.query = query
+        self.df = df
+        self.max_rowid = max_rowid    # 読み込み済みの最大 rowid（これより大きい行が追加分）
+        self.change_seq = change_seq  # 反映済みの変更ログの位置（None なら変更ログなし）
+        self.identity = identity      # (inode, ファイルの識別子, rootpage, schema_version)。変われば作り直されたとみなす
+
+
+def _copy(value):
+    """呼び出し側での変更がキャッシュに及ばないようコピーを返す"""
+    if isinstance(value, _IncrementalFrame):
+        return value.df.drop(columns=ROWID_COLUMN)
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    return copy.deepcopy(value)
+
+
+def _ensure_change_log(conn, table):
+    """更新・削除された行の rowid を記録するトリガーを作成し、作成できたかを返す
+
+    追加された行は rowid の最大値との比較で見つけるので、記録するのは更新と削除だけ。
+    書き込めないデータベースでは作成せず、変更のたびに全件を読み直す。
+    """
+    triggers = (f"_dashboard_{table}_update", f"_dashboard_{table}_delete")
+    installed = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (?, ?)", triggers
+    ).fetchone()[0]
+    if installed == len(triggers):
+        return True
+    try:
+        with conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER NOT NULL
+                )
+            ''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS _dashboard_{table}_update AFTER UPDATE ON {table}
+                BEGIN
+                    INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id) VALUES ('{table}', OLD.rowid);
+                    INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id) SELECT '{table}', NEW.rowid WHERE NEW.rowid != OLD.rowid;
+                END
+            ''')
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS _dashboard_{table}_delete AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id) VALUES ('{table}', OLD.rowid);
+                END
+            ''')
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _database_id(conn):
+    """データベースファイルの識別子（なければ作成する。書き込めなければ None）"""
+    try:
+        row = conn.execute(f"SELECT id FROM {DATABASE_ID_TABLE}").fetchone()
+        if row:
+            return row[0]
+    except sqlite3.Error:
+        pass
+    try:
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {DATABASE_ID_TABLE} (id TEXT NOT NULL)")
+            conn.execute(
+                f"INSERT INTO {DATABASE_ID_TABLE} (id) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM {DATABASE_ID_TABLE})",
+                (uuid.uuid4().hex,)
+            )
+        return conn.execute(f"SELECT id FROM {DATABASE_ID_TABLE}").fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+
+def _prune_change_log(conn, last_seq):
+    """古い変更ログを削除（削除済みの位置より前を読んでいた読み手は全件を読み直す）"""
+    try:
+        with conn:
+            conn.execute(f"DELETE FROM {CHANGE_LOG_TABLE} WHERE seq <= ?", (last_seq - CHANGE_LOG_KEEP,))
+    except sqlite3.Error:
+        pass
+
+
+def _read_incremental(conn, query, previous, inode):
+    """前回の状態から追加・更新・削除された行だけを読み、新しい状態を返す
+
+    previous が使えない（初回・SELECT 句の変更・変更ログの欠落・ファイルやテーブルの作り直し）場合は全件を読む。
+    rowid と変更ログの位置はファイル・テーブルごとのものなので、inode・ファイルの識別子・rootpage・
+    schema_version のいずれかが変わっていれば前回の位置は使わない。
+    """
+    tracked = _ensure_change_log(conn, query.table)
+    database_id = _database_id(conn) if tracked else None
+    select = f"SELECT rowid AS {ROWID_COLUMN}, {query.columns} FROM {query.table}"
+
+    # 変更ログの位置と行を同じスナップショットで読む
+    conn.execute("BEGIN")
+    try:
+        if tracked:
+            first_seq, last_seq = conn.execute(
+                f"SELECT MIN(seq), COALESCE(MAX(seq), 0) FROM {CHANGE_LOG_TABLE}"
+            ).fetchone()
+        else:
+            first_seq, last_seq = None, None
+        rootpage = conn.execute(
+            "SELECT rootpage FROM sqlite_master WHERE type = 'table' AND name = ?", (query.table,)
+        ).fetchone()
+        identity = (inode, database_id, rootpage[0] if rootpage else None,
+                    conn.execute("PRAGMA schema_version").fetchone()[0])
+
+        incremental = (
+            isinstance(previous, _IncrementalFrame)
+            and previous.query[:3] == query[:3]
+            and previous.identity == identity
+            and previous.change_seq is not None and last_seq is not None
+            and last_seq >= previous.change_seq
+            and (first_seq is None or previous.change_seq >= first_seq - 1)
+        )
+        if incremental:
+            changed = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT row_id FROM {CHANGE_LOG_TABLE} WHERE table_name = ? AND seq > ?",
+                (query.table, previous.change_seq)
+            )]
+            base = previous.df
+            if changed:
+                # 更新・削除された行を除き、残った行の最大 rowid から先を読み直す
+                # （最大の行が削除された後に同じ rowid で追加された場合も拾える）
+                base = base[~base[ROWID_COLUMN].isin(changed)]
+                max_rowid = int(base[ROWID_COLUMN].max()) if not base.empty else 0
+            else:
+                max_rowid = previous.max_rowid
+            new_rows = pd.read_sql_query(
+                f"""{select} WHERE rowid > ? OR rowid IN (
+                    SELECT row_id FROM {CHANGE_LOG_TABLE} WHERE table_name = ? AND seq > ?
+                )""",
+                conn, params=[*query.params, max_rowid, query.table, previous.change_seq]
+            )
+        else:
+            base = None
+            new_rows = pd.read_sql_query(select, conn, params=list(query.params))
+    finally:
+        conn.execute("COMMIT")
+
+    if base is not None and new_rows.empty:
+        # 削除だけ（空の DataFrame と結合すると型が object になるため結合しない）
+        df = base if len(base) == len(previous.df) else base.reset_index(drop=True)
+    else:
+        if query.parse and not new_rows.empty:
+            new_rows = query.parse(new_rows)
+        df = new_rows if base is None or base.empty else pd.concat([base, new_rows], ignore_index=True, sort=False)
+        if query.order_by:
+            df = df.sort_values(query.order_by, ascending=False, kind='stable').reset_index(drop=True)
+
+    if tracked and last_seq and first_seq is not None and last_seq - first_seq > 2 * CHANGE_LOG_KEEP:
+        _prune_change_log(conn, last_seq)
+
+    max_rowid = int(df[ROWID_COLUMN].max()) if not df.empty else 0
+    return _IncrementalFrame(query, df, max_rowid, last_seq if tracked else None, identity)
+
+
+def _store(cache_key, signature, value):
+    with _cache_lock:
+        _cache.pop(cache_key, None)
+        _cache[cache_key] = (signature, value)
+        while len(_cache) > MAX_CACHE_ENTRIES:
+            del _cache[next(iter(_cache))]
+
+
+def _load(path, loader, previous, inode):
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        value = loader(conn)
+        if isinstance(value, IncrementalQuery):
+            value = _read_incremental(conn, value, previous, inode)
+        return value
+    finally:
+        conn.close()
+
+
+def cached_query(path, key, loader: Callable[[sqlite3.Connection], object]):
+    """loader(conn) の結果を、データベースが変わるまでキャッシュして返す
+
+    key はデータベース内での読み込み内容を区別する名前。ファイルがなければ None。
+    loader が IncrementalQuery を返した場合は、前回からの差分だけを読んで DataFrame を返す。
+    loader の例外はキャッシュせずにそのまま送出する（次回の再実行で読み直す）。
+    """
+    signature = database_signature(path)
+    if signature is None:
+        return None
+
+    with _cache_lock:
+        entry = _cache.get((path, key))
+        if entry is not None and entry[0] == signature:
+            _stats['hits'] += 1
+            return _copy(entry[1])
+        _stats['misses'] += 1
+        previous = entry[1] if entry is not None else None
+
+    value = _load(path, loader, previous, signature[0])
+    # loader が変更ログのトリガー・集計テーブル・インデックスを作成するとシグネチャが変わるため、
+    # 作成後のシグネチャで読み直す（作成済みなので2回目は書き込まない）。
+    # 読み込みの前に取ったシグネチャで保存するので、読み込み中に他から書き込まれても次回は読み直す
+    latest = database_signature(path)
+    if latest is not None and latest != signature:
+        signature = latest
+        value = _load(path, loader, value, signature[0])
+
+    _store((path, key), signature, value)
+    return _copy(value)
+
+
+def load_sources(sources: Dict[str, str], loader: Callable[[sqlite3.Connection, str], object],
+                 postprocess: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None,
+                 key: Optional[str] = None) -> Tuple[pd.DataFrame, List[Tuple[str, Exception]]]:
+    """複数のデータベースから loader(conn, 名前) で読み込み、結合した DataFrame を返す
+
+    データベースごとにキャッシュするので、変更のあったものだけを読み直す。
+    loader が IncrementalQuery を返せば、変更のあったデータベースも差分の行だけを読む。
+    結合と postprocess の結果も、全データベースのシグネチャが同じ間はキャッシュする。
+    戻り値は (結合結果, [(名前, 例外)])。読めなかったデータベースは結合に含めない。
+    """
+    key = key or f"{loader.__module__}.{getattr(loader, '__qualname__', repr(loader))}"
+    frames = []
+    errors = []
+    signatures = []
+    for name, path in sources.items():
+        try:
+            df = cached_query(path, (key, name), lambda conn, name=name: loader(conn, name))
+        except Exception as e:
+            errors.append((name, e))
+            signatures.append((name, 'error'))
+            continue
+        signatures.append((name, database_signature(path) if df is not None else None))
+        if df is not None and not df.empty:
+            frames.append(df)
+
+    combined_key = (key, tuple(sources.items()))
+    signature = tuple(signatures)
+    with _cache_lock:
+        entry = _cache.get(('*', combined_key))
+        if not errors and entry is not None and entry[0] == signature:
+            _stats['hits'] += 1
+            return entry[1].copy(), errors
+
+    if frames:
+        combined = pd.concat(frames, ignore_index=True, sort=False)
+        if postprocess:
+            combined = postprocess(combined)
+    else:
+        combined = pd.DataFrame()
+
+    if not errors:
+        _store(('*', combined_key), signature, combined)
+    return combined.copy(), errors
+
+
+def table_columns(conn, table) -> List[str]:
+    """テーブルのカラム名一覧"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _describe_table(conn, table):
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    if table not in tables:
+        return None
+    return {
+        'records': conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0],
+        'columns': table_columns(conn, table)
+    }
+
+
+def database_info(databases: Dict[str, str] = None) -> Dict[str, dict]:
+    """データベースごとのテーブル・件数・カラム・状態（{パス: 情報}）
+
+    last_updated はデータベースファイルの更新時刻。
+    """
+    db_info = {}
+    for db_path, table_name in (databases or POST_TABLES).items():
+        info = {'table': table_name, 'records': 0, 'columns': [], 'last_updated': None}
+        try:
+            described = cached_query(db_path, ('describe', table_name),
+                                     lambda conn, table=table_name: _describe_table(conn, table))
+        except Exception as e:
+            info['status'] = f'ERROR: {str(e)}'
+        else:
+            if not os.path.exists(db_path):
+                info['status'] = 'FILE_NOT_EXISTS'
+            elif described is None:
+                info['status'] = 'TABLE_NOT_FOUND'
+            else:
+                info.update(described)
+                info['status'] = 'OK'
+                info['last_updated'] = datetime.fromtimestamp(os.path.getmtime(db_path))
+        db_info[db_path] = info
+    return db_info
+
+
+def _parse_times(df):
+    for time_col in TIME_COLUMNS:
+        if time_col in df.columns:
+            df[time_col] = pd.to_datetime(df[time_col], errors='coerce')
+    return df
+
+
+def _read_table(conn, table):
+    columns = table_columns(conn, table)
+    order = next((column for column in TIME_SORT_COLUMNS if column in columns), 'id')
+    return IncrementalQuery(table, '*', parse=_parse_times, order_by=[order])
+
+
+def load_table(db_path, table_name) -> Tuple[pd.DataFrame, str]:
+    """テーブル全体を時刻カラムの新しい順に読み込み、(DataFrame, 状態) を返す"""
+    try:
+        df = cached_query(db_path, ('table', table_name), lambda conn: _read_table(conn, table_name))
+        if df is None:
+            raise FileNotFoundError(db_path)
+        return df, "SUCCESS"
+    except Exception as e:
+        return pd.DataFrame(), f"ERROR: {str(e)}"
+
+
+class PageSource(NamedTuple):
+    """投稿履歴をページ単位で読むテーブルの指定
+
+    columns は日時・ステータス・ソース以外の SELECT 句。結果には time_column を
+    scheduled_time、ステータス（status_column がなければ default_status）を status、
+    ソース名を source として加える。
+    """
+    path: str
+    table: str
+    columns: str
+    time_column: str
+    status_column: str = 'status'
+    default_status: str = 'posted'
+
+
+def _ensure_index(conn, table, column):
+    """期間の絞り込み・並び替え用のインデックスを作成（書き込めなければ作らない）"""
+    name = f"idx_{table}_{column}"
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone():
+        return
+    try:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+    except sqlite3.Error:
+        pass
+
+
+def _read_page(conn, name, source, start_date, end_date, statuses, limit):
+    """1つのテーブルから条件に合う件数と、新しい順に先頭 limit 件を読む"""
+    columns = table_columns(conn, source.table)
+    if not columns:
+        return 0, pd.DataFrame()
+    if source.status_column in columns:
+        status_expr = source.status_column
+    elif statuses and source.default_status not in statuses:
+        return 0, pd.DataFrame()
+    else:
+        status_expr, statuses = f"'{source.default_status}'", None
+    _ensure_index(conn, source.table, source.time_column)
+
+    conditions, params = [], []
+    # 日時は ISO 形式の文字列。区切りが 'T' と空白の行が混在していても日付部分の比較は同じだが、
+    # 並び替えは区切りをそろえてから行う
+    if start_date:
+        conditions.append(f"{source.time_column} >= ?")
+        params.append(start_date.isoformat())
+    if end_date:
+        conditions.append(f"{source.time_column} < ?")
+        params.append((end_date + timedelta(days=1)).isoformat())
+    if statuses:
+        conditions.append(f"{status_expr} IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {source.table} {where}", params).fetchone()[0]
+    df = pd.read_sql_query(f"""
+        SELECT {source.columns},
+               {source.time_column} AS scheduled_time,
+               {status_expr} AS status,
+               ? AS source
+        FROM {source.table}
+        {where}
+        ORDER BY REPLACE({source.time_column}, 'T', ' ') DESC
+        LIMIT ?
+    """, conn, params=[name, *params, limit])
+    return total, df
+
+
+def query_post_page(sources: Dict[str, PageSource], start_date: Optional[date] = None,
+                    end_date: Optional[date] = None, statuses: Optional[List[str]] = None,
+                    page: int = 0, page_size: int = 50) -> Tuple[pd.DataFrame, int]:
+    """複数テーブルの投稿から条件に合うものを新しい順に並べた page ページ目と総件数を返す
+
+    期間（start_date〜end_date、両端を含む）とステータスの絞り込みは SQL で行い、
+    各テーブルからは (page + 1) * page_size 件だけを読んで結合する。
+    """
+    statuses = tuple(statuses) if statuses else None
+    limit = (page + 1) * page_size
+    frames = []
+    total = 0
+    for name, source in sources.items():
+        result = cached_query(
+            source.path,
+            ('page', name, source, start_date, end_date, statuses, limit),
+            lambda conn, name=name, source=source: _read_page(conn, name, source, start_date, end_date, statuses, limit)
+        )
+        if result is None:
+            continue
+        count, df = result
+        total += count
+        if not df.empty:
+            frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(), total
+    merged = pd.concat(frames, ignore_index=True, sort=False)
+    merged['scheduled_time'] = pd.to_datetime(merged['scheduled_time'], format='ISO8601', errors='coerce')
+    merged = merged.sort_values('scheduled_time', ascending=False, kind='stable')
+    return merged.iloc[page * page_size:limit].reset_index(drop=True), total
+
+
+class RollupSource(NamedTuple):
+    """ロールアップから統計を求めるテーブル
+
+    pattern_default / status_default は NULL またはカラムがない場合の値
+    （pattern_default が None なら、そのテーブルの投稿はパターン別の集計に含めない）。
+    """
+    path: str
+    table: str
+    pattern_default: Optional[str] = 'general'
+    status_default: Optional[str] = None
+
+
+def _rollup_definition(conn, table):
+    """テーブルのカラムからロールアップの各項目の式を決める（row は NEW または OLD）"""
+    columns = table_columns(conn, table)
+    if not columns:
+        return None
+    time_column = next((column for column in ROLLUP_TIME_COLUMNS if column in columns), None)
+    prediction_column = next((column for column in ROLLUP_PREDICTION_COLUMNS if column in columns), None)
+
+    def value(column, default):
+        return f"COALESCE(row.{column}, {default})" if column and column in columns else default
+
+    return {
+        # ISO 形式の日時の先頭10文字が日付、12〜13文字目が時（区切りが 'T' でも空白でも同じ）
+        'day': f"COALESCE(substr(row.{time_column}, 1, 10), '')" if time_column else "''",
+        'hour': f"COALESCE(CAST(substr(row.{time_column}, 12, 2) AS INTEGER), -1)" if time_column else "-1",
+        'pattern_type': value('pattern_type', "''"),
+        'status': value('status', "''"),
+        **{metric: value(metric, '0') for metric in ROLLUP_METRICS},
+        'engagement': value('actual_engagement', '0'),
+        'prediction': value(prediction_column, '0'),
+    }
+
+
+def _ensure_rollup(conn, table):
+    """ロールアップのテーブルとトリガーを作成し、既存の行から集計し直す
+
+    トリガーは追加・更新・削除のたびに該当する (日付, 時, パターン, ステータス) の行へ
+    差分を加えるので、どのプログラムが書き込んでもロールアップは最新に保たれる。
+    カラムの構成が変わった場合はトリガーを作り直して集計し直す。
+    """
+    definition = _rollup_definition(conn, table)
+    if definition is None:
+        return False
+    definition_text = repr(sorted(definition.items()))
+    if conn.execute(f"SELECT name FROM sqlite_master WHERE type = 'table' AND name = '{ROLLUP_META_TABLE}'").fetchone():
+        installed = conn.execute(
+            f"SELECT definition FROM {ROLLUP_META_TABLE} WHERE table_name = ?", (table,)
+        ).fetchone()
+        if installed and installed[0] == definition_text:
+            return True
+
+    keys = ['day', 'hour', 'pattern_type', 'status']
+    values = ROLLUP_METRICS + ['engagement', 'prediction']
+
+    def upsert(row, sign):
+        expressions = [definition[key].replace('row.', f'{row}.') for key in keys]
+        amounts = [f"{sign}{definition[value].replace('row.', f'{row}.')}" for value in values]
+        return f"""
+            INSERT INTO {ROLLUP_TABLE} (table_name, {', '.join(keys)}, posts, {', '.join(values)})
+            VALUES ('{table}', {', '.join(expressions)}, {sign}1, {', '.join(amounts)})
+            ON CONFLICT (table_name, {', '.join(keys)}) DO UPDATE SET
+                posts = posts + excluded.posts,
+                {', '.join(f'{value} = {value} + excluded.{value}' for value in values)};
+        """
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+                table_name TEXT NOT NULL,
+                day TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                pattern_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                posts INTEGER NOT NULL DEFAULT 0,
+                clicks REAL NOT NULL DEFAULT 0,
+                shares REAL NOT NULL DEFAULT 0,
+                comments REAL NOT NULL DEFAULT 0,
+                likes REAL NOT NULL DEFAULT 0,
+                engagement REAL NOT NULL DEFAULT 0,
+                prediction REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, day, hour, pattern_type, status)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ROLLUP_META_TABLE} (
+                table_name TEXT PRIMARY KEY,
+                definition TEXT NOT NULL
+            )
+        ''')
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS _dashboard_rollup_{table}_{event}")
+        conn.execute(f"""
+            CREATE TRIGGER _dashboard_rollup_{table}_insert AFTER INSERT ON {table}
+            BEGIN {upsert('NEW', '')} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER _dashboard_rollup_{table}_update AFTER UPDATE ON {table}
+            BEGIN {upsert('OLD', '-')} {upsert('NEW', '')} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER _dashboard_rollup_{table}_delete AFTER DELETE ON {table}
+            BEGIN {upsert('OLD', '-')} END
+        """)
+
+        # 既存の行から集計し直す（GROUP BY は元のカラムと区別するため式の位置で指定）
+        conn.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE table_name = ?", (table,))
+        expressions = [definition[key].replace('row.', '') for key in keys]
+        amounts = [f"SUM({definition[value].replace('row.', '')})" for value in values]
+        conn.execute(f"""
+            INSERT INTO {ROLLUP_TABLE} (table_name, {', '.join(keys)}, posts, {', '.join(values)})
+            SELECT ?, {', '.join(f'{expression} AS {key}' for expression, key in zip(expressions, keys))},
+                   COUNT(*), {', '.join(amounts)}
+            FROM {table}
+            GROUP BY 2, 3, 4, 5
+        """, (table,))
+        conn.execute(
+            f"INSERT OR REPLACE INTO {ROLLUP_META_TABLE} (table_name, definition) VALUES (?, ?)",
+            (table, definition_text)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def _read_rollup(conn, table):
+    if not _ensure_rollup(conn, table):
+        return pd.DataFrame()
+    return pd.read_sql_query(
+        f"SELECT day, hour, pattern_type, status, posts, {', '.join(ROLLUP_METRICS)}, engagement, prediction "
+        f"FROM {ROLLUP_TABLE} WHERE table_name = ? AND posts != 0",
+        conn, params=[table]
+    )
+
+
+def _grouped(keys, posts, sums, means):
+    """keys ごとに sums は合計、means は投稿数あたりの平均を求める（np.bincount による集計）"""
+    codes, uniques = pd.factorize(keys, sort=True)
+    counts = np.bincount(codes, weights=posts, minlength=len(uniques))
+    result = {'key': uniques}
+    for name, values in sums.items():
+        result[name] = np.bincount(codes, weights=values, minlength=len(uniques))
+    for name, values in means.items():
+        result[name] = np.bincount(codes, weights=values, minlength=len(uniques)) / np.maximum(counts, 1)
+    return pd.DataFrame(result)
+
+
+def rollup_stats(sources: Dict[str, RollupSource]) -> Optional[Dict[str, object]]:
+    """ロールアップからパフォーマンス統計を求める（ロールアップを使えなければ None）
+
+    ロールアップの行数は投稿数ではなく日数・時間帯・パターン・ステータスの組み合わせで
+    決まるため、履歴が増えても計算量はほぼ変わらない。
+    平均は NULL を 0 とみなした投稿あたりの値（DataFrame の fillna(0).mean() と同じ）。
+    """
+    frames = []
+    for name, source in sources.items():
+        try:
+            rollup = cached_query(source.path, ('rollup', source.table),
+                                  lambda conn, table=source.table: _read_rollup(conn, table))
+        except sqlite3.Error:
+            return None
+        if rollup is None or rollup.empty:
+            continue
+        if source.pattern_default is None:
+            rollup['pattern_type'] = None
+        else:
+            rollup['pattern_type'] = rollup['pattern_type'].where(rollup['pattern_type'] != '', source.pattern_default)
+        rollup['status'] = rollup['status'].where(rollup['status'] != '', source.status_default)
+        rollup['source'] = name
+        frames.append(rollup)
+
+    if not frames:
+        return {
+            'total_posts': 0, 'posted_count': 0, 'pending_count': 0,
+            'avg_engagement': 0.0, 'avg_prediction': 0.0,
+            'total_clicks': 0, 'total_shares': 0, 'total_comments': 0, 'total_likes': 0,
+            'daily_stats': pd.DataFrame(), 'hourly_stats': pd.DataFrame(),
+            'pattern_stats': pd.DataFrame(), 'source_stats': pd.DataFrame()
+        }
+
+    rollup = pd.concat(frames, ignore_index=True)
+    posts = rollup['posts'].to_numpy(dtype=float)
+    metrics = {metric: rollup[metric].to_numpy(dtype=float) for metric in ROLLUP_METRICS}
+    engagement = rollup['engagement'].to_numpy(dtype=float)
+    prediction = rollup['prediction'].to_numpy(dtype=float)
+    status = rollup['status'].to_numpy(dtype=object)
+    total_posts = posts.sum()
+
+    # 日別（日付のない投稿は除く）
+    dated = rollup['day'].to_numpy(dtype=object) != ''
+    daily_stats = _grouped(
+        rollup['day'][dated].to_numpy(dtype=object), posts[dated],
+        {metric: values[dated] for metric, values in metrics.items()},
+        {'actual_engagement': engagement[dated]}
+    ).rename(columns={'key': 'date'})
+    daily_stats['date'] = pd.to_datetime(daily_stats['date'], format='%Y-%m-%d', errors='coerce').dt.date
+
+    # 時間帯別（平均）
+    timed = rollup['hour'].to_numpy() >= 0
+    hourly_stats = _grouped(
+        rollup['hour'].to_numpy()[timed], posts[timed], {},
+        {'actual_engagement': engagement[timed], 'clicks': metrics['clicks'][timed]}
+    ).rename(columns={'key': 'hour'})
+
+    # パターン別
+    patterned = rollup['pattern_type'].notna().to_numpy()
+    pattern_stats = _grouped(
+        rollup['pattern_type'][patterned].to_numpy(dtype=object), posts[patterned],
+        {metric: metrics[metric][patterned] for metric in ('clicks', 'likes', 'shares')},
+        {'actual_engagement': engagement[patterned]}
+    ).rename(columns={'key': 'pattern_type'})
+
+    # データソース別
+    source_stats = _grouped(
+        rollup['source'].to_numpy(dtype=object), posts, {'clicks': metrics['clicks']},
+        {'actual_engagement': engagement, 'engagement_prediction': prediction}
+    ).rename(columns={'key': 'source'})
+
+    return {
+        'total_posts': int(total_posts),
+        'posted_count': int(posts[status == 'posted'].sum()),
+        'pending_count': int(posts[status == 'pending'].sum()),
+        'avg_engagement': float(engagement.sum() / total_posts) if total_posts else 0.0,
+        'avg_prediction': float(prediction.sum() / total_posts) if total_posts else 0.0,
+        'total_clicks': int(metrics['clicks'].sum()),
+        'total_shares': int(metrics['shares'].sum()),
+        'total_comments': int(metrics['comments'].sum()),
+        'total_likes': int(metrics['likes'].sum()),
+        'daily_stats': daily_stats,
+        'hourly_stats': hourly_stats,
+        'pattern_stats': pattern_stats,
+        'source_stats': source_stats
+    }
+
+
+def cache_stats():
+    """キャッシュのヒット数・ミス数と保持件数"""
+    with _cache_lock:
+        return dict(_stats, entries=len(_cache))
+
+
+def clear_cache():
+    """キャッシュをすべて破棄（🔄 更新ボタンなどで強制的に読み直す場合）"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def self_test():
+    """差分読み込みのキャッシュと、作り直されたデータベースファイル・テーブルを全件読み直すことを確認"""
+    import tempfile
+
+    def create(path, texts, recreate_file=False):
+        if recreate_file and os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS posts")
+            conn.execute("CREATE TABLE posts (id INTEGER PRIMARY KEY, text TEXT, created_at TEXT)")
+            conn.executemany("INSERT INTO posts (text, created_at) VALUES (?, ?)",
+                             [(text, f"2025-01-0{i + 1}") for i, text in enumerate(texts)])
+        conn.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'posts.db')
+        create(path, [f"旧{i}" for i in range(5)])
+        df, status = load_table(path, 'posts')
+        assert status == "SUCCESS" and len(df) == 5, (status, df)
+        # 変更ログのトリガーを作成した直後の再実行もキャッシュから返す
+        hits = cache_stats()['hits']
+        load_table(path, 'posts')
+        assert cache_stats()['hits'] == hits + 1, cache_stats()
+        print("✅ 初回の読み込み後の再実行はキャッシュから返す")
+
+        # ファイルを削除して作り直す（create_sample_db.py と同じ）
+        create(path, ["新しいファイル"], recreate_file=True)
+        df, _ = load_table(path, 'posts')
+        assert df['text'].tolist() == ["新しいファイル"], df
+        print("✅ 作り直したファイルは全件を読み直す")
+
+        create(path, [f"旧{i}" for i in range(5)], recreate_file=True)
+        load_table(path, 'posts')
+        # 同じファイルでテーブルを作り直す（FIX_DASHBOARD.py と同じ）
+        create(path, ["新しいテーブル"])
+        df, _ = load_table(path, 'posts')
+        assert df['text'].tolist() == ["新しいテーブル"], df
+        print("✅ 作り直したテーブルは全件を読み直す")
+
+        # 通常の追加は差分で読む
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute("INSERT INTO posts (text, created_at) VALUES ('追加', '2025-02-01')")
+        conn.close()
+        df, _ = load_table(path, 'posts')
+        assert df['text'].tolist() == ["追加", "新しいテーブル"], df
+        print("✅ 追加された行は差分で読む")
+
+    for _, conn in _version_connections.values():
+        conn.close()
+    _version_connections.clear()
+    clear_cache()
+    return True
+
+
+if __name__ == "__main__":
+    self_test()
@@ -0,0 +1,126 @@
+"""
+投稿多様性の共有状態
+投稿ハッシュの予約と、最近使った絵文字・CTA・開始パターンの履歴をSQLiteに保存し、
+Flaskサーバー・自動化ワーカー・各エンジンのプロセス間で共有する
+（パスは環境変数 DIVERSITY_STATE_DB で変更可）。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.getenv(
+    'DIVERSITY_STATE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'diversity_state.db')
+)
+
+
+class DiversityStateStore:
+    """投稿ハッシュと最近使った要素のリングバッファを保持するストア
+
+    起動時に履歴を読み込まず、必要な件数だけをその都度問い合わせる。
+    """
+
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def get_connection(self):
+        """スレッドごとの接続を返す（初回のみテーブルを作成）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    self._init_database(conn)
+                    self._initialized = True
+        return conn
+
+    def _init_database(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS post_hashes (
+                hash TEXT PRIMARY KEY,
+                reserved_at TEXT
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS recent_elements (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_recent_elements_kind_seq ON recent_elements (kind, seq)")
+
+    def has_hash(self, post_hash):
+        """ハッシュが登録済みかどうか"""
+        row = self.get_connection().execute(
+            "SELECT 1 FROM post_hashes WHERE hash = ?", (post_hash,)
+        ).fetchone()
+        return row is not None
+
+    def reserve_hash(self, post_hash):
+        """未登録なら登録して True、登録済みなら False を返す
+
+        INSERT OR IGNORE の1文で判定と登録を行うため、
+        複数のプロセスが同じハッシュを同時に予約しても成功するのは1つだけ。
+        """
+        cursor = self.get_connection().execute(
+            "INSERT OR IGNORE INTO post_hashes (hash, reserved_at) VALUES (?, ?)",
+            (post_hash, datetime.now().isoformat())
+        )
+        return cursor.rowcount == 1
+
+    def release_hash(self, post_hash):
+        """予約を取り消す（投稿を破棄した場合など）"""
+        self.get_connection().execute("DELETE FROM post_hashes WHERE hash = ?", (post_hash,))
+
+    def recent(self, kind, limit):
+        """kind の要素を新しい方から limit 件、古い順に並べて返す"""
+        rows = self.get_connection().execute('''
+            SELECT value FROM recent_elements
+            WHERE kind = ?
+            ORDER BY seq DESC
+            LIMIT ?
+        ''', (kind, limit)).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def push(self, kind, value, keep):
+        """kind の履歴に要素を追加し、新しい方から keep 件だけ残す"""
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO recent_elements (kind, value) VALUES (?, ?)", (kind, value))
+            conn.execute('''
+                DELETE FROM recent_elements
+                WHERE kind = ? AND seq <= (
+                    SELECT seq FROM recent_elements WHERE kind = ?
+                    ORDER BY seq DESC LIMIT 1 OFFSET ?
+                )
+            ''', (kind, kind, keep))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_diversity_state():
+    """プロセス内で共有する状態ストアを返す"""
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = DiversityStateStore()
+        return _shared_store
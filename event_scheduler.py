@@ -0,0 +1,141 @@
+"""
+イベント駆動スケジューラー
+次の予定時刻まで眠り、投稿の追加・変更時には条件変数で即座に起こされる
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventScheduler:
+    """予定時刻をヒープで管理し、期限が来たジョブを実行するスケジューラー
+
+    ジョブは名前（key）で登録し、コールバックは次回の実行時刻（time.time() 基準の秒）
+    を返す。None を返したジョブは wake() で起こされるまで実行されない。
+    同じ key を再登録すると前の予定は置き換えられる。
+    """
+
+    # 時計の変更などに備えた最大待機時間（秒）
+    MAX_SLEEP = 900
+    # コールバックが例外を出したときの再実行までの待機時間（秒）
+    ERROR_RETRY_DELAY = 60
+
+    def __init__(self, name='event-scheduler'):
+        self.name = name
+        self._heap = []
+        self._jobs = {}  # key -> (実行時刻, 通し番号, コールバック)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add_job(self, key, callback, when=None):
+        """ジョブを登録（when 未指定なら即時実行）"""
+        with self._condition:
+            self._push(key, callback, time.time() if when is None else when)
+            self._condition.notify()
+
+    def wake(self, key, when=None):
+        """登録済みジョブの実行時刻を早める（when 未指定なら即時）
+
+        すでにそれより早い予定がある場合は何もしない。
+        """
+        when = time.time() if when is None else when
+        with self._condition:
+            job = self._jobs.get(key)
+            if job is None:
+                return
+            scheduled, _, callback = job
+            if scheduled is None or when < scheduled:
+                self._push(key, callback, when)
+                self._condition.notify()
+
+    def start(self):
+        """スケジューラースレッドを開始"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """スケジューラーを停止し、実行中のジョブの終了を待つ"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def is_alive(self):
+        """スケジューラースレッドが動作中かどうか"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def next_run_times(self):
+        """各ジョブの次回実行時刻 {key: time.time() 基準の秒 or None}"""
+        with self._condition:
+            return {key: job[0] for key, job in self._jobs.items()}
+
+    def _push(self, key, callback, when):
+        """ヒープに予定を追加（古い予定は取り出し時に読み捨てる）"""
+        seq = next(self._counter)
+        self._jobs[key] = (when, seq, callback)
+        if when is not None:
+            heapq.heappush(self._heap, (when, seq, key))
+
+    def _pop_due(self):
+        """期限の来たジョブを1件取り出す。なければ次の予定までの秒数を返す"""
+        while self._heap:
+            when, seq, key = self._heap[0]
+            job = self._jobs.get(key)
+            if job is None or job[1] != seq:
+                # 置き換え済みの予定
+                heapq.heappop(self._heap)
+                continue
+
+            delay = when - time.time()
+            if delay > 0:
+                return None, delay
+
+            heapq.heappop(self._heap)
+            self._jobs[key] = (None, seq, job[2])
+            return (key, job[2]), 0
+
+        return None, None
+
+    def _run(self):
+        """メインループ: 次の予定まで待機し、期限が来たら実行"""
+        logger.info(f"{self.name} を開始しました")
+
+        while True:
+            with self._condition:
+                if not self._running:
+                    break
+
+                job, delay = self._pop_due()
+                if job is None:
+                    timeout = self.MAX_SLEEP if delay is None else min(delay, self.MAX_SLEEP)
+                    self._condition.wait(timeout)
+                    continue
+
+            key, callback = job
+            try:
+                next_time = callback()
+            except Exception as e:
+                logger.error(f"{self.name} ジョブ {key} エラー: {str(e)}")
+                next_time = time.time() + self.ERROR_RETRY_DELAY
+
+            with self._condition:
+                scheduled = self._jobs.get(key)
+                # 実行中に wake() で新しい予定が入っていればそちらを優先
+                if scheduled is not None and scheduled[0] is None:
+                    self._push(key, callback, next_time)
+
+        logger.info(f"{self.name} を停止しました")
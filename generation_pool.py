@@ -0,0 +1,288 @@
+"""
+投稿生成プール
+Claude APIの呼び出しを同時実行数の上限・トークンバケットによる流量制限・
+リクエストごとの期限つきでスレッドプールに流し、進捗をジョブとして参照できるようにする。
+テストやAPIキーのない環境向けにローカルのスタブLLM（StubLLMClient）も提供する。
+"""
+
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+# 同時に実行する生成タスク数
+DEFAULT_CONCURRENCY = 4
+# Claude APIの呼び出し回数の上限（1分あたり）
+DEFAULT_RATE_PER_MINUTE = 50
+# 1リクエスト（ジョブ）の期限（秒）。過ぎたタスクはAPIを呼ばずに代替の生成に切り替える
+DEFAULT_DEADLINE = 60
+# 終了したジョブを保持する秒数
+JOB_TTL = 3600
+
+
+class DeadlineExceeded(TimeoutError):
+    """期限までにAPIを呼び出せなかった"""
+
+
+class TokenBucket:
+    """トークンバケットによる流量制限（rate: 1秒あたりの補充数、capacity: 連続で使える数）"""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError(f"補充数は正の値にしてください: {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        """トークンを1つ取得（足りなければ補充まで待つ）。deadline（time.monotonic() 基準）までに取れなければ False"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class GenerationJob:
+    """生成タスクの集まり。完了したタスクの結果を完了順に events に積む"""
+
+    def __init__(self, kind, total, deadline):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.total = total
+        self.deadline = deadline
+        self.results = [None] * total
+        self.events = []  # [{'index', 'result' or 'error'}]（完了順）
+        self.completed = 0
+        self.failed = 0
+        self.result = None  # 全タスク完了後の集約結果
+        self.status = 'running'
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """完了まで待機し、完了したかどうかを返す"""
+        return self._done.wait(timeout)
+
+    def is_done(self):
+        return self._done.is_set()
+
+    def error(self):
+        """ジョブ全体の失敗理由（成功なら None）
+
+        集約（on_complete）が失敗した場合はその例外、すべてのタスクが失敗した場合は最初のタスクの例外を返す。
+        """
+        with self._lock:
+            if self.status == 'failed':
+                return next(event['error'] for event in self.events if 'error' in event and 'index' not in event)
+            if self.total and self.failed == self.total:
+                return next(event['error'] for event in self.events if 'error' in event)
+            return None
+
+    def _record(self, index, result=None, error=None):
+        """タスクの結果を記録し、最後のタスクなら True を返す"""
+        with self._lock:
+            if error is None:
+                self.results[index] = result
+                self.events.append({'index': index, 'result': result})
+            else:
+                self.failed += 1
+                self.events.append({'index': index, 'error': error})
+            self.completed += 1
+            return self.completed == self.total
+
+    def _finish(self, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.status = 'failed' if error else 'completed'
+            if error:
+                self.events.append({'error': error})
+            self.finished_at = datetime.now()
+        self._done.set()
+
+    def to_dict(self, since=0):
+        """進捗と、since 件目以降に完了したタスクの結果（部分結果の取得用）"""
+        with self._lock:
+            return {
+                'jobId': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'total': self.total,
+                'completed': self.completed,
+                'failed': self.failed,
+                'events': self.events[since:],
+                'next': len(self.events),
+                'result': self.result,
+                'createdAt': self.created_at.isoformat(),
+                'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+            }
+
+
+class GenerationPool:
+    """生成タスクを並列に実行するプール
+
+    タスクは期限（time.monotonic() 基準の秒）を受け取る関数で、APIの呼び出しには call_llm() を使う。
+    rate_per_minute が0以下なら流量制限をかけない。
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate_per_minute=DEFAULT_RATE_PER_MINUTE):
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='llm-generation')
+        self.rate_limiter = TokenBucket(rate_per_minute / 60, capacity=max(1, concurrency)) if rate_per_minute > 0 else None
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+
+    def call_llm(self, client, deadline, **kwargs):
+        """流量制限を守って client.messages.create を呼ぶ（タイムアウトは期限までの残り時間）"""
+        if self.rate_limiter and not self.rate_limiter.acquire(deadline):
+            raise DeadlineExceeded("期限までにAPIの呼び出し枠を確保できませんでした")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("期限を過ぎました")
+        return client.messages.create(timeout=remaining, **kwargs)
+
+    def submit(self, tasks, kind='generation', deadline_seconds=DEFAULT_DEADLINE, on_complete=None):
+        """タスクをまとめてジョブとして投入し、すぐにジョブを返す
+
+        on_complete(results) は全タスク完了後に1回だけ呼ばれ、戻り値がジョブの result になる。
+        """
+        self._purge_expired()
+        job = GenerationJob(kind, len(tasks), time.monotonic() + deadline_seconds)
+        with self._jobs_lock:
+            self._jobs[job.id] = job
+
+        if not tasks:
+            self._complete(job, on_complete)
+            return job
+
+        for index, task in enumerate(tasks):
+            self.executor.submit(self._run_task, job, index, task, on_complete)
+        return job
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def _run_task(self, job, index, task, on_complete):
+        try:
+            last = job._record(index, result=task(job.deadline))
+        except Exception as e:
+            logger.error(f"生成タスクエラー（{job.kind} {index + 1}/{job.total}）: {str(e)}")
+            last = job._record(index, error=str(e))
+        if last:
+            self._complete(job, on_complete)
+
+    def _complete(self, job, on_complete):
+        try:
+            job._finish(on_complete(job.results) if on_complete else job.results)
+        except Exception as e:
+            logger.error(f"生成ジョブの集約エラー（{job.kind}）: {str(e)}")
+            job._finish(error=str(e))
+
+    def _purge_expired(self):
+        now = datetime.now()
+        with self._jobs_lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at and (now - job.finished_at).total_seconds() > JOB_TTL
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+class StubLLMClient:
+    """anthropic.Anthropic の messages.create を模したローカルのスタブ
+
+    latency 秒（±jitter）待ってから、プロンプトの先頭を含む決まった形の応答を返す。
+    timeout がそれより短い場合は TimeoutError を送出する。
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, model, messages, max_tokens=1000, temperature=0.7, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        if timeout is not None and timeout < delay:
+            time.sleep(timeout)
+            raise TimeoutError(f"スタブLLMがタイムアウトしました（{timeout:.2f}秒）")
+        time.sleep(delay)
+
+        prompt = messages[-1]['content'].strip()
+        text = f"✨ {prompt.splitlines()[0][:60]}\n\n（スタブ応答 {model} temperature={temperature}）\n#スタブ #テスト"
+        return SimpleNamespace(model=model, content=[SimpleNamespace(type='text', text=text)])
+
+
+def self_test():
+    """スタブLLMで並列実行・流量制限・期限切れ時の代替を確認"""
+    client = StubLLMClient(latency=0.3, jitter=0.05, seed=1)
+    pool = GenerationPool(concurrency=4, rate_per_minute=600)
+
+    def make_task(i):
+        def task(deadline):
+            try:
+                response = pool.call_llm(client, deadline, model='stub', max_tokens=100,
+                                         messages=[{'role': 'user', 'content': f'投稿{i}'}])
+                return response.content[0].text
+            except (DeadlineExceeded, TimeoutError):
+                return f'代替{i}'
+        return task
+
+    try:
+        started = time.monotonic()
+        job = pool.submit([make_task(i) for i in range(12)], kind='self-test', deadline_seconds=10)
+        assert job.wait(10), "ジョブが終わりませんでした"
+        elapsed = time.monotonic() - started
+        assert all(result.startswith('✨ 投稿') for result in job.result), job.result
+        print(f"✅ 12件を{elapsed:.2f}秒で生成（逐次なら約{12 * 0.3:.1f}秒）・部分結果 {len(job.to_dict(since=6)['events'])}件")
+
+        # 1秒あたり2回の流量制限では期限1.5秒で全件は呼べず、残りは代替で完了する
+        pool.rate_limiter = TokenBucket(rate=2, capacity=1)
+        job = pool.submit([make_task(i) for i in range(8)], kind='self-test', deadline_seconds=1.5)
+        assert job.wait(5), "期限つきのジョブが終わりませんでした"
+        fallbacks = sum(result.startswith('代替') for result in job.result)
+        assert 0 < fallbacks < 8, job.result
+        print(f"✅ 期限1.5秒・毎秒2回の制限: {8 - fallbacks}件はAPI、{fallbacks}件は代替で完了")
+
+        # 流量0は制限なし、タスクがすべて失敗したジョブは最初の例外を失敗理由にする
+        unlimited = GenerationPool(concurrency=1, rate_per_minute=0)
+        try:
+            job = unlimited.submit([lambda deadline: 1 / 0], kind='self-test', on_complete=lambda results: results[0])
+            assert job.wait(5) and job.error() == 'division by zero', job.to_dict()
+        finally:
+            unlimited.shutdown()
+        print("✅ 流量0は制限なし・全タスク失敗はジョブの失敗として扱う")
+        return True
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    self_test()
@@ -0,0 +1,190 @@
+"""
+共有HTTPクライアント
+Buffer/Threads APIへのリクエストをキープアライブのセッションで再利用し、
+タイムアウト・ホストごとの同時接続数の上限・レイテンシの集計をまとめて扱う
+"""
+
+import bisect
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 接続・読み込みのタイムアウト（秒）
+DEFAULT_TIMEOUT = (5, 30)
+# ホストごとの同時リクエスト数の上限（コネクションプールの大きさも同じにする）
+DEFAULT_MAX_PER_HOST = 4
+# レイテンシのヒストグラムの区切り（秒）。最後の区間は上限なし
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class LatencyHistogram:
+    """リクエスト時間の分布（区切りごとの件数・合計・エラー数）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        """1件の所要時間を記録"""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def snapshot(self):
+        """JSONにできる形で集計を返す（le: 区間の上限秒、'inf' は上限なし）"""
+        labels = [str(bound) for bound in self.buckets] + ['inf']
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.total / self.count * 1000, 1) if self.count else 0,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class HTTPClient:
+    """requests.Session を共有し、ホストごとに同時リクエスト数を制限するクライアント
+
+    timeout を指定しない呼び出しには DEFAULT_TIMEOUT を付け、
+    応答しないエンドポイントで呼び出し元のスレッドが止まり続けないようにする。
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_per_host=DEFAULT_MAX_PER_HOST):
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=max_per_host)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._histograms = {}
+
+    def request(self, method, url, **kwargs):
+        """リクエストを送信（ホストの同時接続数が上限なら空くまで待機）"""
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+
+        with self._host_slot(host):
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                self._observe(host, time.monotonic() - started, error=True)
+                raise
+            self._observe(host, time.monotonic() - started, error=response.status_code >= 500)
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def stats(self):
+        """ホストごとのレイテンシ集計 {host: {...}}"""
+        with self._lock:
+            return {host: histogram.snapshot() for host, histogram in self._histograms.items()}
+
+    def close(self):
+        """プールしている接続を閉じる"""
+        self.session.close()
+
+    def _host_slot(self, host):
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+        return slot
+
+    def _observe(self, host, seconds, error):
+        with self._lock:
+            histogram = self._histograms.get(host)
+            if histogram is None:
+                histogram = self._histograms[host] = LatencyHistogram()
+            histogram.observe(seconds, error)
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client():
+    """プロセス内で共有するHTTPクライアントを返す"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HTTPClient()
+        return _shared_client
+
+
+def self_test():
+    """ローカルのスタブHTTPサーバーに対して動作を確認"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from concurrent.futures import ThreadPoolExecutor
+
+    active = {'now': 0, 'max': 0}
+    active_lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with active_lock:
+                active['now'] += 1
+                active['max'] = max(active['max'], active['now'])
+            time.sleep(2 if self.path == '/slow' else 0.05)
+            with active_lock:
+                active['now'] -= 1
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    client = HTTPClient(timeout=(1, 0.5), max_per_host=2)
+
+    try:
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            responses = list(executor.map(lambda _: client.get(f"{base_url}/fast"), range(12)))
+        assert all(response.status_code == 200 for response in responses)
+        assert active['max'] <= 2, f"同時接続数の上限を超えました: {active['max']}"
+        print(f"✅ 並列リクエスト: 12件成功（最大同時接続 {active['max']}）")
+
+        try:
+            client.get(f"{base_url}/slow")
+            raise AssertionError("タイムアウトしませんでした")
+        except requests.Timeout:
+            print("✅ 応答しないエンドポイントはタイムアウト")
+
+        stats = client.stats()[urlsplit(base_url).netloc]
+        assert stats['count'] == 13 and stats['errors'] == 1
+        print(f"✅ レイテンシ集計: {stats}")
+        return True
+    finally:
+        client.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    self_test()
@@ -0,0 +1,293 @@
+"""
+LLM応答キャッシュ
+(モデル, 正規化したプロンプト, temperatureの区分, シード) をキーに応答をSQLiteへ保存し、
+同じCSVの再処理やリトライでAPIを呼び直さないようにする（パスは環境変数 LLM_CACHE_DB で変更可）。
+variants を指定すると1つのキーにN件の応答を溜め、以降は順番に返して投稿の多様性を保つ。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_DB_PATH = os.getenv(
+    'LLM_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_cache.db')
+)
+
+# 応答の有効期間（秒）
+DEFAULT_TTL = 7 * 24 * 3600
+# 保持する応答の上限（件数・合計バイト数）。超えたら最後に使われた時刻の古い順に削除
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# temperature をこの幅で丸めてキーにする（0.78 と 0.8 は同じ区分）
+TEMPERATURE_BUCKET = 0.1
+
+
+def normalize_prompt(prompt):
+    """インデントや行末の空白・連続する空行の違いを無視するための正規化"""
+    lines = [line.strip() for line in (prompt or '').strip().splitlines()]
+    normalized = []
+    for line in lines:
+        if line or (normalized and normalized[-1]):
+            normalized.append(line)
+    return '\n'.join(normalized)
+
+
+def temperature_bucket(temperature):
+    if temperature is None:
+        return None
+    return round(round(temperature / TEMPERATURE_BUCKET) * TEMPERATURE_BUCKET, 3)
+
+
+def cache_key(model, prompt, temperature=None, seed=None):
+    """キャッシュのキー（SHA-256）"""
+    payload = json.dumps(
+        [model, normalize_prompt(prompt), temperature_bucket(temperature), seed],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """LLMの応答を保存するキャッシュ
+
+    get_or_create() でキャッシュを引き、なければ create() を呼んで保存する。
+    """
+
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_connection(self):
+        """スレッドごとの接続を返す（初回のみテーブルを作成）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    self._init_database(conn)
+                    self._initialized = True
+        return conn
+
+    def _init_database(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (key, variant)
+            ) WITHOUT ROWID
+        ''')
+        # 次に返す応答の番号（variants のローテーション用）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache_rotation (
+                key TEXT PRIMARY KEY,
+                next_variant INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used_at)")
+
+    def get_or_create(self, model, prompt, create, temperature=None, seed=None, variants=1):
+        """キャッシュ済みの応答を返し、なければ create() の結果を保存して返す
+
+        variants > 1 の場合、保存済みの応答が variants 件になるまでは create() を呼んで追加し、
+        揃った後は保存済みの応答を順番に返す。戻り値は (応答, キャッシュから返したか)。
+        """
+        key = cache_key(model, prompt, temperature, seed)
+        cached = self._lookup(key, variants)
+        if cached is not None:
+            self._count('hits')
+            return cached, True
+
+        self._count('misses')
+        response = create()
+        if response:
+            self._store(key, model, response, variants)
+        return response, False
+
+    def _lookup(self, key, variants):
+        conn = self.get_connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM llm_responses WHERE key = ? AND created_at < ?", (key, now - self.ttl))
+            rows = conn.execute(
+                "SELECT variant, response FROM llm_responses WHERE key = ? ORDER BY variant", (key,)
+            ).fetchall()
+            if len(rows) < variants or not rows:
+                conn.execute("COMMIT")
+                return None
+
+            row = conn.execute(
+                "SELECT next_variant FROM llm_cache_rotation WHERE key = ?", (key,)
+            ).fetchone()
+            position = (row[0] if row else 0) % len(rows)
+            variant, response = rows[position]
+            conn.execute('''
+                INSERT INTO llm_cache_rotation (key, next_variant) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET next_variant = excluded.next_variant
+            ''', (key, position + 1))
+            conn.execute(
+                "UPDATE llm_responses SET hits = hits + 1, last_used_at = ? WHERE key = ? AND variant = ?",
+                (now, key, variant)
+            )
+            conn.execute("COMMIT")
+            return response
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _store(self, key, model, response, variants):
+        conn = self.get_connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            next_variant = conn.execute(
+                "SELECT COALESCE(MAX(variant) + 1, 0), COUNT(*) FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            # 並行して同じキーを生成した場合などで上限を超える分は保存しない
+            if next_variant[1] < variants:
+                conn.execute('''
+                    INSERT INTO llm_responses (key, variant, model, response, size, created_at, last_used_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (key, next_variant[0], model, response, len(response.encode('utf-8')), now, now))
+            evicted = self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            self._count('evictions', evicted)
+
+    def _evict(self, conn):
+        """期限切れと、件数・バイト数の上限を超えた分を最後に使われた時刻の古い順に削除"""
+        evicted = conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl,)
+        ).rowcount
+        count, total_bytes = conn.execute("SELECT COUNT(*), TOTAL(size) FROM llm_responses").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return evicted
+
+        removed_bytes = 0
+        victims = []
+        for key, variant, size in conn.execute(
+            "SELECT key, variant, size FROM llm_responses ORDER BY last_used_at"
+        ):
+            if count - len(victims) <= self.max_entries and total_bytes - removed_bytes <= self.max_bytes:
+                break
+            victims.append((key, variant))
+            removed_bytes += size
+        conn.executemany("DELETE FROM llm_responses WHERE key = ? AND variant = ?", victims)
+        conn.execute('''
+            DELETE FROM llm_cache_rotation
+            WHERE key NOT IN (SELECT DISTINCT key FROM llm_responses)
+        ''')
+        return evicted + len(victims)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        """ヒット率・件数・バイト数"""
+        count, total_bytes = self.get_connection().execute(
+            "SELECT COUNT(*), TOTAL(size) FROM llm_responses"
+        ).fetchone()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+        stats['entries'] = count
+        stats['bytes'] = int(total_bytes)
+        return stats
+
+    def clear(self):
+        """すべての応答を削除"""
+        conn = self.get_connection()
+        conn.execute("DELETE FROM llm_responses")
+        conn.execute("DELETE FROM llm_cache_rotation")
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """プロセス内で共有するキャッシュを返す"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMCache()
+        return _shared_cache
+
+
+def self_test():
+    """一時DBでヒット・variants のローテーション・上限による削除を確認"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = LLMCache(os.path.join(directory, 'llm_cache.db'), max_entries=5)
+        calls = []
+
+        def create():
+            calls.append(1)
+            return f"応答{len(calls)}"
+
+        prompt = "\n        次の投稿をリライトしてください:\n        テスト投稿\n"
+        first, hit = cache.get_or_create('model', prompt, create, temperature=0.8)
+        again, hit_again = cache.get_or_create('model', "次の投稿をリライトしてください:\nテスト投稿", create, temperature=0.78)
+        assert (first, hit, again, hit_again) == ("応答1", False, "応答1", True), (first, hit, again, hit_again)
+        _, hit_other = cache.get_or_create('model', prompt, create, temperature=0.3)
+        assert not hit_other, "temperature の区分が違えば別のキーになるはずです"
+
+        calls.clear()
+        results = [cache.get_or_create('model', 'variants', create, variants=3)[0] for _ in range(7)]
+        assert results == ["応答1", "応答2", "応答3", "応答1", "応答2", "応答3", "応答1"], results
+        assert len(calls) == 3, calls
+        print(f"✅ ヒット・variants（3件を順番に返す）: {results}")
+
+        for i in range(10):
+            cache.get_or_create('model', f'投稿{i}', lambda: f'応答{i}')
+        stats = cache.stats()
+        assert stats['entries'] == 5 and stats['evictions'] >= 5, stats
+        print(f"✅ 上限5件で古い応答を削除: {stats}")
+    return True
+
+
+if __name__ == "__main__":
+    # python llm_cache.py           : 件数・サイズを表示
+    # python llm_cache.py --clear   : すべて削除
+    # python llm_cache.py --selftest: 動作確認
+    if len(sys.argv) > 1 and sys.argv[1] == "--selftest":
+        self_test()
+        sys.exit(0)
+    cache = get_llm_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "--clear":
+        cache.clear()
+        print("✅ LLM応答キャッシュを削除しました")
+    else:
+        stats = cache.stats()
+        print(f"LLM応答キャッシュ: {stats['entries']}件・{stats['bytes'] / 1024:.1f}KB（{cache.db_path}）")
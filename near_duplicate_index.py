@@ -0,0 +1,327 @@
+"""
+準重複投稿インデックス
+文字n-gram（シングル）のMinHash署名とLSHバンディングで、
+過去の投稿と類似度 θ 以上の投稿があるかをSQLite上で高速に判定する
+
+Flaskサーバーと各 *_ENGINE.py が同じデータベースファイルを共有する
+（パスは環境変数 NEAR_DUPLICATE_DB で変更可）。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import zlib
+from datetime import datetime
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    # numpy が無い環境でも generate_unique() はチェックなしで使えるようにする
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = os.getenv(
+    'NEAR_DUPLICATE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'near_duplicates.db')
+)
+
+# 既定の類似度の閾値（推定Jaccard係数）
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# 準重複と判定された投稿を生成し直す最大回数
+NEAR_DUPLICATE_MAX_ATTEMPTS = 5
+# シングルの文字数（日本語は分かち書きされないため単語ではなく文字単位）
+SHINGLE_SIZE = 3
+# MinHashの署名長とLSHのバンド数（16バンド×8行: 類似度0.7前後から候補に挙がる）
+NUM_PERM = 128
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+
+# ハッシュ関数族 h(x) = (a*x + b) mod p（p は 2^32 未満の最大の素数）
+# a, b, x < 2^32 なので a*x + b は uint64 に収まる
+if NUMPY_AVAILABLE:
+    _PRIME = np.uint64(4294967291)
+    _rng = np.random.RandomState(20240101)  # 署名はデータベースに保存するため乱数は固定
+    _PERM_A = _rng.randint(1, int(_PRIME), size=NUM_PERM, dtype=np.int64).astype(np.uint64)[:, None]
+    _PERM_B = _rng.randint(0, int(_PRIME), size=NUM_PERM, dtype=np.int64).astype(np.uint64)[:, None]
+
+
+def normalize_text(text):
+    """比較用に正規化（NFKC・小文字化し、文字と数字以外＝絵文字・記号・空白を除去）"""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ''.join(ch for ch in text if unicodedata.category(ch)[0] in ('L', 'N'))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """正規化したテキストの文字n-gramの集合"""
+    normalized = normalize_text(text)
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def shingle_similarity(text1, text2):
+    """2つのテキストのシングル集合のJaccard係数（MinHashを使わない厳密値）"""
+    shingles1 = shingles(text1)
+    shingles2 = shingles(text2)
+    union = shingles1 | shingles2
+    if not union:
+        return 0
+    return len(shingles1 & shingles2) / len(union)
+
+
+def minhash_signature(text):
+    """MinHash署名（uint32 × NUM_PERM）"""
+    values = shingles(text)
+    if not values:
+        return np.zeros(NUM_PERM, dtype=np.uint32)
+
+    hashed = np.fromiter(
+        (zlib.crc32(value.encode('utf-8')) for value in values),
+        dtype=np.uint64, count=len(values)
+    )
+    permuted = (_PERM_A * (hashed[None, :] % _PRIME) + _PERM_B) % _PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(signature):
+    """署名をバンドに分け、各バンドのバケットID（符号付き64bit）を返す"""
+    rows = signature.reshape(NUM_BANDS, ROWS_PER_BAND)
+    return [
+        (band, int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), 'big', signed=True))
+        for band, row in enumerate(rows)
+    ]
+
+
+def text_key(text):
+    """キー未指定時の投稿キー（PostDiversityManager の重複ハッシュと同じMD5）"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class NearDuplicateIndex:
+    """MinHash署名とLSHバケットをSQLiteに保存する準重複インデックス
+
+    バケット表は (band, bucket) の主キーで引くため、履歴の件数によらず
+    1回の問い合わせは候補の署名を数件読むだけで済む。
+    """
+
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        if not NUMPY_AVAILABLE:
+            raise ImportError("準重複インデックスには numpy が必要です")
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_database()
+
+    def get_connection(self):
+        """スレッドごとの接続を返す（WALモードで複数プロセスから共有）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_database(self):
+        conn = self.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS near_duplicate_signatures (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL,
+                created_at TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS near_duplicate_buckets (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                signature_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, signature_id)
+            ) WITHOUT ROWID
+        ''')
+        # 上書き・削除時に署名からバケットを引くため
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_near_duplicate_buckets_signature "
+            "ON near_duplicate_buckets (signature_id)"
+        )
+
+    def count(self):
+        """登録済みの投稿数"""
+        return self.get_connection().execute("SELECT COUNT(*) FROM near_duplicate_signatures").fetchone()[0]
+
+    def query(self, text, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """類似度が threshold 以上で最も近い投稿の (key, 推定類似度) を返す。なければ None"""
+        return self._find(self.get_connection(), minhash_signature(text), threshold)
+
+    def add(self, text, key=None):
+        """投稿を登録（同じキーは上書き）してキーを返す"""
+        key = key or text_key(text)
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, key, minhash_signature(text))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return key
+
+    def add_if_unique(self, text, threshold=NEAR_DUPLICATE_THRESHOLD, key=None):
+        """類似投稿がなければ登録して None を、あれば登録せずに (key, 類似度) を返す
+
+        判定と登録を1つの書き込みトランザクションで行うため、
+        並行して生成している別プロセスと同じ投稿を二重に通すことはない。
+        """
+        signature = minhash_signature(text)
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            match = self._find(conn, signature, threshold)
+            if match is None:
+                self._insert(conn, key or text_key(text), signature)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return match
+
+    def remove(self, key):
+        """投稿を登録から外す"""
+        conn = self.get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete(conn, key)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def backfill(self, rows, batch_size=1000):
+        """既存の投稿 [(key, text)] をまとめて登録し、件数を返す"""
+        conn = self.get_connection()
+        total = 0
+        batch = []
+
+        def flush():
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, signature in batch:
+                    self._insert(conn, key, signature)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            batch.clear()
+
+        for key, text in rows:
+            if not text:
+                continue
+            batch.append((key or text_key(text), minhash_signature(text)))
+            total += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return total
+
+    def _find(self, conn, signature, threshold):
+        buckets = band_buckets(signature)
+        values = ', '.join('(?, ?)' for _ in buckets)
+        params = [value for bucket in buckets for value in bucket]
+        rows = conn.execute(f'''
+            WITH query(band, bucket) AS (VALUES {values})
+            SELECT DISTINCT s.key, s.signature
+            FROM query
+            JOIN near_duplicate_buckets b ON b.band = query.band AND b.bucket = query.bucket
+            JOIN near_duplicate_signatures s ON s.id = b.signature_id
+        ''', params).fetchall()
+
+        best = None
+        for key, blob in rows:
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        return best
+
+    def _insert(self, conn, key, signature):
+        self._delete(conn, key)
+        signature_id = conn.execute(
+            "INSERT INTO near_duplicate_signatures (key, signature, created_at) VALUES (?, ?, ?)",
+            (key, signature.tobytes(), datetime.now().isoformat())
+        ).lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO near_duplicate_buckets (band, bucket, signature_id) VALUES (?, ?, ?)",
+            [(band, bucket, signature_id) for band, bucket in band_buckets(signature)]
+        )
+
+    def _delete(self, conn, key):
+        conn.execute('''
+            DELETE FROM near_duplicate_buckets
+            WHERE signature_id = (SELECT id FROM near_duplicate_signatures WHERE key = ?)
+        ''', (key,))
+        conn.execute("DELETE FROM near_duplicate_signatures WHERE key = ?", (key,))
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """プロセス内で共有する準重複インデックスを返す（初回呼び出し時に開く）"""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = NearDuplicateIndex()
+        return _shared_index
+
+
+async def generate_unique(make_post, attempts=NEAR_DUPLICATE_MAX_ATTEMPTS):
+    """make_post(attempt) で投稿を作り、過去の投稿と準重複なら attempt を変えて作り直す
+
+    make_post は試行番号（0始まり）を受け取るコルーチン関数で、投稿文（str）か
+    'content' を持つ dict を返す。準重複でなかった投稿はインデックスに登録される。
+    attempts 回とも準重複なら最後の投稿をそのまま返す。numpy が無い環境ではチェックせず1回だけ作る。
+    """
+    if not NUMPY_AVAILABLE:
+        return await make_post(0)
+
+    index = get_near_duplicate_index()
+    for attempt in range(attempts):
+        post = await make_post(attempt)
+        content = post if isinstance(post, str) else post['content']
+        if index.add_if_unique(content) is None:
+            break
+        logger.info(f"♻️ 過去の投稿と類似しているため作り直します（{attempt + 1}/{attempts}）")
+    return post
+
+
+if __name__ == "__main__":
+    # python near_duplicate_index.py --backfill threads_auto_post.db : postsテーブルの投稿を登録
+    # python near_duplicate_index.py --query "投稿文"                : 類似投稿を検索
+    index = get_near_duplicate_index()
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--backfill":
+        source = sqlite3.connect(sys.argv[2])
+        started = time.time()
+        count = index.backfill(source.execute("SELECT post_hash, text FROM posts"))
+        print(f"✅ {count}件を登録しました（{time.time() - started:.1f}秒）")
+    elif len(sys.argv) > 2 and sys.argv[1] == "--query":
+        started = time.perf_counter()
+        match = index.query(sys.argv[2])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if match:
+            print(f"⚠️ 類似投稿あり: {match[0]}（推定類似度 {match[1]:.2f}・{elapsed_ms:.2f}ms）")
+        else:
+            print(f"✅ 類似投稿なし（{elapsed_ms:.2f}ms）")
+    else:
+        print(f"登録済み: {index.count()}件（{index.db_path}）")
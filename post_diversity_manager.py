@@ -8,10 +8,21 @@ import hashlib
 from datetime import datetime
 import json
 
+from diversity_state import get_diversity_state
+from near_duplicate_index import (
+    NEAR_DUPLICATE_MAX_ATTEMPTS, NEAR_DUPLICATE_THRESHOLD, get_near_duplicate_index, shingle_similarity
+)
+
 class PostDiversityManager:
     """投稿の多様性を管理するクラス"""
     
-    def __init__(self):
+    # 最近使った要素の保持件数と、選び直しの対象にする直近の件数
+    RECENT_EMOJIS_KEEP = 30
+    RECENT_EMOJIS_AVOID = 10
+    RECENT_PATTERNS_KEEP = 10
+    RECENT_PATTERNS_AVOID = 5
+    
+    def __init__(self, near_duplicate_index=None, state=None):
         # 絵文字パターンを大幅に拡張
         self.emoji_patterns = {
             'excitement': ['🔥', '⚡', '💫', '✨', '🌟', '💥', '🎯', '🚀', '🌈', '☄️'],
@@ -82,14 +93,31 @@ class PostDiversityManager:
             ]
         }
         
-        # 投稿履歴を保存（重複チェック用）
-        self.post_history = set()
-        self.recent_emojis = []
-        self.recent_ctas = []
-        self.recent_openings = []
+        # 投稿履歴（重複チェック用）と最近使った要素はプロセス間で共有するため、
+        # 未指定なら初回の判定時に共有のストア・準重複インデックスを開く
+        self._near_duplicate_index = near_duplicate_index
+        self._state = state
+    
+    def generate_unique_post(self, base_text, genre, reference_posts=None, reserve=True):
+        """ユニークな投稿を生成
+
+        過去の投稿（他のプロセスの分を含む）と準重複になった場合は要素を選び直す。
+        reserve=True なら返した投稿を予約する（保存しなかった場合は release() で取り消す）。
+        保存せずに返すだけの場合は reserve=False とし、保存したときに remember() で登録する。
+        """
+        for _ in range(NEAR_DUPLICATE_MAX_ATTEMPTS):
+            final_post = self._compose_post(base_text, genre)
+            if self.reserve(final_post) if reserve else not self.is_duplicate(final_post):
+                return final_post
+        
+        # 選び直しても重複する場合は最後の候補を履歴に追加して返す
+        if reserve:
+            self.remember(final_post)
+        
+        return final_post
     
-    def generate_unique_post(self, base_text, genre, reference_posts=None):
-        """ユニークな投稿を生成"""
+    def _compose_post(self, base_text, genre):
+        """開始・本文・CTA・ハッシュタグを組み合わせて投稿を組み立てる"""
         # ジャンルに適した絵文字セットを選択
         emoji_categories = self._get_relevant_emoji_categories(genre)
         
@@ -125,10 +153,6 @@ class PostDiversityManager:
         if len(final_post) > 500:
             final_post = self._trim_post(final_post, 500)
         
-        # ハッシュを生成して履歴に追加
-        post_hash = self._generate_hash(final_post)
-        self.post_history.add(post_hash)
-        
         return final_post
     
     def _get_relevant_emoji_categories(self, genre):
@@ -155,51 +179,45 @@ class PostDiversityManager:
     def _get_diverse_emojis(self, categories, count=3):
         """多様な絵文字を選択"""
         selected_emojis = []
+        recent_emojis = self.state.recent('emoji', self.RECENT_EMOJIS_AVOID)
         
         for category in categories[:count]:
             available_emojis = [e for e in self.emoji_patterns.get(category, []) 
-                               if e not in self.recent_emojis[-10:]]
+                               if e not in recent_emojis]
             if available_emojis:
                 emoji = random.choice(available_emojis)
                 selected_emojis.append(emoji)
-                self.recent_emojis.append(emoji)
-        
-        # 履歴を管理
-        if len(self.recent_emojis) > 30:
-            self.recent_emojis = self.recent_emojis[-30:]
+                self.state.push('emoji', emoji, keep=self.RECENT_EMOJIS_KEEP)
+                recent_emojis = (recent_emojis + [emoji])[-self.RECENT_EMOJIS_AVOID:]
         
         return selected_emojis
     
     def _get_unique_opening(self, genre, emoji):
         """ユニークな開始パターンを取得"""
+        recent_openings = self.state.recent('opening', self.RECENT_PATTERNS_AVOID)
         available_openings = [op for op in self.opening_patterns 
-                            if op not in self.recent_openings[-5:]]
+                            if op not in recent_openings]
         
         if not available_openings:
             available_openings = self.opening_patterns
         
-        opening = random.choice(available_openings)
-        opening = opening.format(genre=genre, emoji=emoji)
-        
-        self.recent_openings.append(opening)
-        if len(self.recent_openings) > 10:
-            self.recent_openings = self.recent_openings[-10:]
+        pattern = random.choice(available_openings)
+        # 比較できるよう、ジャンル等を埋め込む前のパターンを履歴に残す
+        self.state.push('opening', pattern, keep=self.RECENT_PATTERNS_KEEP)
         
-        return opening
+        return pattern.format(genre=genre, emoji=emoji)
     
     def _get_unique_cta(self):
         """ユニークなCTAを取得"""
+        recent_ctas = self.state.recent('cta', self.RECENT_PATTERNS_AVOID)
         available_ctas = [cta for cta in self.cta_patterns 
-                         if cta not in self.recent_ctas[-5:]]
+                         if cta not in recent_ctas]
         
         if not available_ctas:
             available_ctas = self.cta_patterns
         
         cta = random.choice(available_ctas)
-        self.recent_ctas.append(cta)
-        
-        if len(self.recent_ctas) > 10:
-            self.recent_ctas = self.recent_ctas[-10:]
+        self.state.push('cta', cta, keep=self.RECENT_PATTERNS_KEEP)
         
         return cta
     
@@ -289,22 +307,56 @@ class PostDiversityManager:
         """投稿のハッシュを生成"""
         return hashlib.md5(text.encode()).hexdigest()
     
+    @property
+    def state(self):
+        """プロセス間で共有する重複チェック・要素履歴のストア"""
+        if self._state is None:
+            self._state = get_diversity_state()
+        return self._state
+    
+    @property
+    def near_duplicate_index(self):
+        """準重複インデックス（未指定なら共有のものを開く）"""
+        if self._near_duplicate_index is None:
+            self._near_duplicate_index = get_near_duplicate_index()
+        return self._near_duplicate_index
+    
     def check_similarity(self, post1, post2, threshold=0.7):
-        """2つの投稿の類似度をチェック"""
-        # 簡易的な類似度計算（実際にはより高度なアルゴリズムを使用可能）
-        words1 = set(post1.split())
-        words2 = set(post2.split())
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        if not union:
-            return 0
+        """2つの投稿の類似度をチェック
         
-        similarity = len(intersection) / len(union)
-        return similarity
+        日本語は空白で区切られないため、絵文字・記号を除いた文字3-gramのJaccard係数で比較する。
+        """
+        return shingle_similarity(post1, post2)
+    
+    def is_duplicate(self, post, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """投稿が過去の投稿と重複（完全一致または類似度 threshold 以上）しているかチェック"""
+        post_hash = self._generate_hash(post)
+        if self.state.has_hash(post_hash):
+            return True
+        return self.near_duplicate_index.query(post, threshold) is not None
+    
+    def reserve(self, post, threshold=NEAR_DUPLICATE_THRESHOLD):
+        """重複していなければ投稿を予約して True を返す（判定と登録はそれぞれ不可分）
+
+        他のプロセスが同時に同じ投稿・類似投稿を生成しても、予約に成功するのは一方だけ。
+        """
+        post_hash = self._generate_hash(post)
+        if not self.state.reserve_hash(post_hash):
+            return False
+        if self.near_duplicate_index.add_if_unique(post, threshold, key=post_hash) is not None:
+            # 類似投稿があって予約できなかったので、先に登録したハッシュも取り消す
+            self.state.release_hash(post_hash)
+            return False
+        return True
+    
+    def remember(self, post):
+        """投稿を重複チェック用の履歴と準重複インデックスに登録"""
+        post_hash = self._generate_hash(post)
+        self.state.reserve_hash(post_hash)
+        self.near_duplicate_index.add(post, key=post_hash)
     
-    def is_duplicate(self, post):
-        """投稿が重複していないかチェック"""
+    def release(self, post):
+        """予約・登録した投稿を取り消す（生成した投稿を保存しなかった場合）"""
         post_hash = self._generate_hash(post)
-        return post_hash in self.post_history
\ No newline at end of file
+        self.state.release_hash(post_hash)
+        self.near_duplicate_index.remove(post_hash)
\ No newline at end of file
@@ -0,0 +1,381 @@
+"""
+投稿データベースの横断ビュー
+各投稿データベースを1つの接続に読み取り専用で ATTACH し、カラム名をそろえた
+一時ビュー all_posts で参照する。絞り込み・集計は pandas に読み込まずに SQLite の中で行う。
+
+データベースごとのテーブル・カラムの違い（fix_all_databases.py 適用前の post_history に
+status がない等）は SCHEMA_REGISTRY の対応表と既定値で吸収する。実際のカラムの確認は
+データベースのスキーマが変わった時（PRAGMA schema_version が変わった時）だけ行う。
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import pandas as pd
+
+ALL_POSTS_VIEW = 'all_posts'
+
+# all_posts のカラムと、元のカラムが NULL またはない場合の値（SQL の式）。
+# このほかにデータベースの名前が source として入る
+ALL_POSTS_COLUMNS = {
+    'post_id': 'NULL',
+    'content': "''",
+    'scheduled_time': 'NULL',
+    'status': "'unknown'",
+    'pattern_type': "'general'",
+    'hashtags': "''",
+    'engagement_prediction': '0',
+    'actual_engagement': '0',
+    'clicks': '0',
+    'shares': '0',
+    'comments': '0',
+    'likes': '0'
+}
+
+# summary() で集計に使える区分（名前 -> SQL の式）
+GROUP_EXPRESSIONS = {
+    'source': 'source',
+    'status': 'status',
+    'pattern_type': 'pattern_type',
+    'day': 'substr(scheduled_time, 1, 10)',
+    'hour': 'CAST(substr(scheduled_time, 12, 2) AS INTEGER)'
+}
+
+
+class FederatedSource(NamedTuple):
+    """all_posts に含めるテーブル
+
+    columns は all_posts のカラム -> 元のカラム。対応のないカラムと、元のカラムが
+    NULL またはテーブルにない場合は defaults（なければ ALL_POSTS_COLUMNS）の値になる。
+    """
+    path: str
+    table: str
+    columns: Dict[str, str]
+    defaults: Optional[Dict[str, str]] = None
+
+
+def _post_history_source(path):
+    """生成履歴（post_history テーブル）を持つデータベース"""
+    return FederatedSource(path, 'post_history', {
+        'post_id': 'id',
+        'content': 'content',
+        'scheduled_time': 'generated_at',
+        'status': 'status',
+        'pattern_type': 'pattern_type',
+        'hashtags': 'hashtags',
+        'engagement_prediction': 'engagement_score',
+        'actual_engagement': 'actual_engagement',
+        'clicks': 'clicks',
+        'shares': 'shares',
+        'comments': 'comments',
+        'likes': 'likes'
+    }, {'status': "'posted'"})
+
+
+# データベースの名前（ATTACH する名前・all_posts の source） -> テーブルとカラムの対応
+SCHEMA_REGISTRY = {
+    'scheduled': FederatedSource('scheduled_posts.db', 'scheduled_posts', {
+        'post_id': 'id',
+        'content': 'content',
+        'scheduled_time': 'scheduled_time',
+        'status': 'status',
+        'pattern_type': 'pattern_type',
+        'hashtags': 'hashtags',
+        'engagement_prediction': 'engagement_prediction',
+        'actual_engagement': 'actual_engagement',
+        'clicks': 'clicks',
+        'shares': 'shares',
+        'comments': 'comments',
+        'likes': 'likes'
+    }, {'status': "'pending'"}),
+    'threads_optimized': _post_history_source('threads_optimized.db'),
+    'buzz_history': _post_history_source('buzz_history.db'),
+    'viral_history': _post_history_source('viral_history.db'),
+    'multiple_posts': FederatedSource('multiple_posts_2025.db', 'daily_posts', {
+        'post_id': 'id',
+        'content': 'content',
+        'scheduled_time': 'scheduled_time',
+        'status': 'status',
+        'pattern_type': 'content_type'
+    }, {'status': "'pending'"}),
+    'auto_post': FederatedSource('threads_auto_post.db', 'posts', {
+        'post_id': 'id',
+        'content': 'text',
+        'scheduled_time': 'scheduled_time',
+        'status': 'status',
+        'pattern_type': 'genre'
+    }, {'status': "'pending'"})
+}
+
+
+class PostFederation:
+    """SCHEMA_REGISTRY のデータベースを横断して参照する
+
+    接続はスレッドごとに作り、存在するデータベースだけを ATTACH する。
+    ファイルの作成・作り直しやスキーマの変更は次の get_connection() で反映する。
+    """
+
+    BUSY_TIMEOUT_MS = 5000
+
+    def __init__(self, sources: Dict[str, FederatedSource] = None, base_dir: str = None):
+        self.sources = dict(sources or SCHEMA_REGISTRY)
+        for name in self.sources:
+            if not name.isidentifier() or name.lower() in ('main', 'temp'):
+                raise ValueError(f"データベースの名前に使えない文字列です: {name}")
+        self.base_dir = base_dir
+        self._local = threading.local()
+        # (パス, schema_version) -> SELECT 文（テーブルがなければ None）
+        self._selects = {}
+        self._selects_lock = threading.Lock()
+
+    def path(self, name) -> str:
+        path = self.sources[name].path
+        return os.path.join(self.base_dir, path) if self.base_dir else path
+
+    def get_connection(self) -> sqlite3.Connection:
+        """all_posts ビューを持つスレッドごとの接続を返す"""
+        state = getattr(self._local, 'state', None)
+        if state is None:
+            conn = sqlite3.connect(':memory:', uri=True, isolation_level=None,
+                                   timeout=self.BUSY_TIMEOUT_MS / 1000)
+            state = self._local.state = {'conn': conn, 'attached': {}, 'included': None}
+        conn = state['conn']
+        attached = state['attached']
+
+        # ファイルの有無・作り直し（inode の変化）に合わせて ATTACH し直す
+        for name in self.sources:
+            path = self.path(name)
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                inode = None
+            if attached.get(name) == inode:
+                continue
+            if name in attached:
+                conn.execute(f"DETACH DATABASE {name}")
+                del attached[name]
+            if inode is not None:
+                conn.execute(f"ATTACH DATABASE ? AS {name}", (f"file:{os.path.abspath(path)}?mode=ro",))
+                attached[name] = inode
+
+        selects = {}
+        for name in self.sources:
+            if name in attached:
+                select = self._select(conn, name)
+                if select:
+                    selects[name] = select
+
+        if selects != state['included']:
+            conn.execute(f"DROP VIEW IF EXISTS temp.{ALL_POSTS_VIEW}")
+            if selects:
+                view = '\nUNION ALL\n'.join(selects.values())
+            else:
+                # データベースがひとつもなくても all_posts は参照できるようにする
+                view = 'SELECT ' + ', '.join(
+                    f"NULL AS {column}" for column in ['source', *ALL_POSTS_COLUMNS]
+                ) + ' WHERE 0'
+            conn.execute(f"CREATE TEMP VIEW {ALL_POSTS_VIEW} AS {view}")
+            state['included'] = selects
+        return conn
+
+    def _select(self, conn, name) -> Optional[str]:
+        """all_posts の1つのデータベース分の SELECT 文（スキーマが変わった時だけ作り直す）"""
+        version = conn.execute(f"PRAGMA {name}.schema_version").fetchone()[0]
+        key = (os.path.abspath(self.path(name)), version)
+        with self._selects_lock:
+            if key in self._selects:
+                return self._selects[key]
+
+        source = self.sources[name]
+        columns = {row[1] for row in conn.execute(f"PRAGMA {name}.table_info({source.table})")}
+        select = None
+        if columns:
+            defaults = {**ALL_POSTS_COLUMNS, **(source.defaults or {})}
+            expressions = [f"'{name}' AS source"]
+            for column, default in defaults.items():
+                original = source.columns.get(column)
+                if original not in columns:
+                    expressions.append(f"{default} AS {column}")
+                elif default == 'NULL':
+                    # 日時は元のインデックスで絞り込めるように元のカラムのまま出す
+                    expressions.append(f"{original} AS {column}")
+                else:
+                    expressions.append(f"COALESCE({original}, {default}) AS {column}")
+            select = f"SELECT {', '.join(expressions)} FROM {name}.{source.table}"
+
+        with self._selects_lock:
+            self._selects[key] = select
+        return select
+
+    def available_sources(self) -> List[str]:
+        """all_posts に含まれているデータベースの名前"""
+        self.get_connection()
+        return list(self._local.state['included'])
+
+    def query(self, sql: str, params: Sequence = ()) -> pd.DataFrame:
+        """all_posts を参照する任意の SQL を実行"""
+        return pd.read_sql_query(sql, self.get_connection(), params=list(params))
+
+    @staticmethod
+    def _where(start_date: Optional[date] = None, end_date: Optional[date] = None,
+               statuses: Optional[Sequence[str]] = None, sources: Optional[Sequence[str]] = None,
+               keyword: Optional[str] = None) -> Tuple[str, list]:
+        """絞り込み条件（期間は start_date〜end_date の両端を含む）"""
+        conditions, params = [], []
+        # 日時は ISO 形式の文字列。区切りが 'T' でも空白でも日付部分の比較は同じ
+        if start_date:
+            conditions.append("scheduled_time >= ?")
+            params.append(start_date.isoformat())
+        if end_date:
+            conditions.append("scheduled_time < ?")
+            params.append((end_date + timedelta(days=1)).isoformat())
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if sources:
+            conditions.append(f"source IN ({', '.join('?' * len(sources))})")
+            params.extend(sources)
+        if keyword:
+            conditions.append("content LIKE ?")
+            params.append(f"%{keyword}%")
+        return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+    def posts(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+              statuses: Optional[Sequence[str]] = None, sources: Optional[Sequence[str]] = None,
+              keyword: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[pd.DataFrame, int]:
+        """条件に合う投稿を新しい順に limit 件と、条件に合う総件数を返す"""
+        where, params = self._where(start_date, end_date, statuses, sources, keyword)
+        conn = self.get_connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM {ALL_POSTS_VIEW} {where}", params).fetchone()[0]
+        df = pd.read_sql_query(f"""
+            SELECT * FROM {ALL_POSTS_VIEW}
+            {where}
+            ORDER BY REPLACE(scheduled_time, 'T', ' ') DESC
+            LIMIT ? OFFSET ?
+        """, conn, params=[*params, limit, offset])
+        # threads_auto_post.db の日時は末尾に 'Z' が付くため、タイムゾーン付きの値は UTC に換算してから外す
+        # （タイムゾーン無しの値は UTC とみなすのでそのまま）
+        df['scheduled_time'] = pd.to_datetime(
+            df['scheduled_time'], format='ISO8601', errors='coerce', utc=True
+        ).dt.tz_localize(None)
+        return df, total
+
+    def summary(self, by: str = 'source', start_date: Optional[date] = None, end_date: Optional[date] = None,
+                statuses: Optional[Sequence[str]] = None, sources: Optional[Sequence[str]] = None,
+                keyword: Optional[str] = None) -> pd.DataFrame:
+        """by（GROUP_EXPRESSIONS の区分、カンマ区切りで複数可）ごとの投稿数・エンゲージメントの集計"""
+        keys = [key.strip() for key in by.split(',')]
+        for key in keys:
+            if key not in GROUP_EXPRESSIONS:
+                raise ValueError(f"集計できない区分です: {key}（{', '.join(GROUP_EXPRESSIONS)}）")
+        where, params = self._where(start_date, end_date, statuses, sources, keyword)
+        group = ', '.join(f"{GROUP_EXPRESSIONS[key]} AS {key}" for key in keys)
+        return self.query(f"""
+            SELECT {group},
+                   COUNT(*) AS posts,
+                   AVG(actual_engagement) AS actual_engagement,
+                   AVG(engagement_prediction) AS engagement_prediction,
+                   SUM(clicks) AS clicks,
+                   SUM(shares) AS shares,
+                   SUM(comments) AS comments,
+                   SUM(likes) AS likes
+            FROM {ALL_POSTS_VIEW}
+            {where}
+            GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}
+            ORDER BY {', '.join(str(i + 1) for i in range(len(keys)))}
+        """, params)
+
+
+_shared_federation = None
+_shared_lock = threading.Lock()
+
+
+def get_post_federation() -> PostFederation:
+    """プロセス内で共有する横断ビューを返す"""
+    global _shared_federation
+    with _shared_lock:
+        if _shared_federation is None:
+            _shared_federation = PostFederation()
+        return _shared_federation
+
+
+def self_test():
+    """一時ディレクトリのデータベースで、カラムの違い・スキーマ変更・絞り込み・集計を確認"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        def create(path, *statements):
+            conn = sqlite3.connect(os.path.join(directory, path))
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+
+        create('scheduled_posts.db',
+               "CREATE TABLE scheduled_posts (id INTEGER PRIMARY KEY, content TEXT, scheduled_time TEXT, "
+               "status TEXT, pattern_type TEXT, hashtags TEXT, engagement_prediction REAL, "
+               "actual_engagement REAL, clicks INTEGER, shares INTEGER, comments INTEGER, likes INTEGER)",
+               "INSERT INTO scheduled_posts (content, scheduled_time, status, clicks, likes) "
+               "VALUES ('予約1', '2025-07-01T09:00:00', 'pending', NULL, 3), "
+               "('予約2', '2025-07-02 12:00:00', 'posted', 5, 4)")
+        # fix_all_databases.py 適用前の post_history（status がない）
+        create('viral_history.db',
+               "CREATE TABLE post_history (id INTEGER PRIMARY KEY, content TEXT, pattern_type TEXT, "
+               "engagement_score REAL, generated_at TEXT, actual_engagement REAL, "
+               "clicks INTEGER, shares INTEGER, comments INTEGER, likes INTEGER)",
+               "INSERT INTO post_history (content, pattern_type, generated_at, clicks) "
+               "VALUES ('バズ1', NULL, '2025-07-01 20:00:00', 7)")
+        create('threads_auto_post.db',
+               "CREATE TABLE posts (id TEXT PRIMARY KEY, text TEXT NOT NULL, genre TEXT, "
+               "scheduled_time TEXT, status TEXT DEFAULT 'pending')",
+               "INSERT INTO posts VALUES ('a1', '自動1', '美容', '2025-07-03T08:00:00', 'completed')")
+
+        federation = PostFederation(base_dir=directory)
+        assert federation.available_sources() == ['scheduled', 'viral_history', 'auto_post'], \
+            federation.available_sources()
+
+        df, total = federation.posts()
+        assert total == 4 and list(df['content']) == ['自動1', '予約2', 'バズ1', '予約1'], (total, list(df['content']))
+        viral = df[df['source'] == 'viral_history'].iloc[0]
+        assert (viral['status'], viral['pattern_type'], viral['clicks']) == ('posted', 'general', 7), viral
+        print(f"✅ 3データベース・{total}件を新しい順に取得（status のない post_history は posted）")
+
+        _, total = federation.posts(start_date=date(2025, 7, 1), end_date=date(2025, 7, 1))
+        assert total == 2, total
+        summary = federation.summary('source')
+        assert dict(zip(summary['source'], summary['posts'])) == {'auto_post': 1, 'scheduled': 2, 'viral_history': 1}
+        assert dict(zip(summary['source'], summary['clicks']))['scheduled'] == 5, summary
+        print(f"✅ 期間の絞り込み・データベース別の集計:\n{summary[['source', 'posts', 'clicks', 'likes']]}")
+
+        # fix_all_databases.py と同じく status を追加すると、次の接続から元のカラムを使う
+        create('viral_history.db',
+               "ALTER TABLE post_history ADD COLUMN status TEXT DEFAULT 'posted'",
+               "UPDATE post_history SET status = 'failed'")
+        assert list(federation.summary('status', sources=['viral_history'])['status']) == ['failed']
+        # 後から作られたデータベースも ATTACH する
+        create('multiple_posts_2025.db',
+               "CREATE TABLE daily_posts (id INTEGER PRIMARY KEY, content TEXT, content_type TEXT, "
+               "scheduled_time TIMESTAMP, status TEXT)",
+               "INSERT INTO daily_posts (content, content_type, scheduled_time) VALUES ('複数1', 'tips', '2025-07-04 10:00')")
+        assert 'multiple_posts' in federation.available_sources()
+        print(f"✅ スキーマ変更・新しいデータベースを反映: {federation.summary('source,status')[['source', 'status', 'posts']].values.tolist()}")
+    return True
+
+
+if __name__ == "__main__":
+    # python post_federation.py                 : データベース別・ステータス別の件数
+    # python post_federation.py --selftest      : 動作確認
+    # python post_federation.py --sql "SELECT ..." : all_posts に対して SQL を実行
+    if len(sys.argv) > 1 and sys.argv[1] == "--selftest":
+        self_test()
+        sys.exit(0)
+    federation = get_post_federation()
+    if len(sys.argv) > 2 and sys.argv[1] == "--sql":
+        print(federation.query(sys.argv[2]).to_string(index=False))
+    else:
+        print(f"横断ビュー {ALL_POSTS_VIEW}: {', '.join(federation.available_sources()) or 'データベースなし'}")
+        print(federation.summary('source,status')[['source', 'status', 'posts']].to_string(index=False))
@@ -0,0 +1,101 @@
+"""
+投稿履歴の一覧表示（ダッシュボード共通）
+1ページ分だけをコンパクトな表で表示し、選択した投稿の詳細だけを展開する
+（全件分の expander・text_area を作らないので、件数が増えてもブラウザのセッションが膨らまない）。
+"""
+
+import math
+from typing import Optional, Tuple
+
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZES = [25, 50, 100]
+# 表に出すカラム（データにあるものだけ表示）
+TABLE_COLUMNS = {
+    'scheduled_time': '日時',
+    'source': 'ソース',
+    'status': 'ステータス',
+    'pattern_type': 'パターン',
+    'preview': '投稿内容',
+    'likes': 'いいね',
+    'shares': 'シェア',
+    'comments': 'コメント',
+    'clicks': 'クリック'
+}
+PREVIEW_LENGTH = 60
+
+
+def pagination_controls(total: int, key: str, default_size: int = 50) -> Tuple[int, int]:
+    """ページ番号と1ページの件数の入力欄を表示し、(ページ（0始まり）, 件数) を返す"""
+    col1, col2, col3 = st.columns([1, 1, 2])
+
+    with col1:
+        page_size = st.selectbox("表示件数", PAGE_SIZES, index=PAGE_SIZES.index(default_size), key=f"{key}_size")
+
+    pages = max(1, math.ceil(total / page_size))
+    page_key = f"{key}_page"
+    # 絞り込みで件数が減った場合は最後のページに合わせる（上限を超えた値のままだとエラーになる）
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+
+    with col2:
+        page = st.number_input("ページ", min_value=1, max_value=pages, value=1, step=1, key=page_key)
+
+    with col3:
+        first = (page - 1) * page_size
+        st.caption(f"{total:,}件中 {min(first + 1, total):,}〜{min(first + page_size, total):,}件（{page}/{pages}ページ）")
+
+    return page - 1, page_size
+
+
+def paginate_frame(df: pd.DataFrame, page: int, page_size: int) -> pd.DataFrame:
+    """読み込み済みの DataFrame から1ページ分を取り出す"""
+    return df.iloc[page * page_size:(page + 1) * page_size]
+
+
+def show_post_table(page_df: pd.DataFrame, key: str) -> Optional[pd.Series]:
+    """1ページ分の投稿を表で表示し、選択された投稿（なければ None）を返す"""
+    if page_df.empty:
+        st.info("条件に合う投稿がありません。")
+        return None
+
+    view = page_df.copy()
+    if 'content' in view.columns:
+        view['preview'] = view['content'].fillna('').astype(str).str.slice(0, PREVIEW_LENGTH).str.replace('\n', ' ')
+    columns = [column for column in TABLE_COLUMNS if column in view.columns]
+    view = view[columns].rename(columns=TABLE_COLUMNS)
+
+    event = st.dataframe(
+        view,
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=key,
+        column_config={'日時': st.column_config.DatetimeColumn(format="YYYY/MM/DD HH:mm")}
+    )
+    rows = event.selection.rows
+    return page_df.iloc[rows[0]] if rows else None
+
+
+def show_post_detail(post: pd.Series, key: str):
+    """選択された投稿の本文と統計を表示"""
+    scheduled_time = post.get('scheduled_time')
+    time_str = scheduled_time.strftime('%Y/%m/%d %H:%M') if pd.notna(scheduled_time) else 'N/A'
+    st.markdown(f"#### 📄 {time_str} - {post.get('pattern_type', post.get('status', 'N/A'))}（{post.get('source', 'N/A')}）")
+
+    col1, col2 = st.columns([3, 1])
+
+    with col1:
+        st.text_area("投稿内容", post.get('content', ''), height=200, key=f"{key}_content", disabled=True)
+
+    with col2:
+        st.write("**統計情報**")
+        st.write(f"いいね: {post.get('likes', 0)}")
+        st.write(f"シェア: {post.get('shares', 0)}")
+        st.write(f"コメント: {post.get('comments', 0)}")
+        st.write(f"クリック: {post.get('clicks', 0)}")
+        if 'hashtags' in post:
+            st.write(f"ハッシュタグ: {post.get('hashtags') or 'N/A'}")
+        st.write(f"ステータス: {post.get('status', 'N/A')}")
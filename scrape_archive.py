@@ -0,0 +1,221 @@
+"""
+スクレイピングデータのParquetアーカイブ
+取り込んだCSVの全行を date=/platform=/genre= で分割した列指向ストアに追記し、
+過去の期間のジャンル別上位投稿や日別の推移をCSVを読み直さずに集計する
+（保存先は環境変数 SCRAPE_ARCHIVE_DIR で変更可）。
+"""
+
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_DIR = os.getenv(
+    'SCRAPE_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scrape_archive')
+)
+
+# 1ファイルにまとめて書き込む行数
+ARCHIVE_BATCH_ROWS = 5000
+# スクレイパーのファイル名（auto_scraped_<プラットフォーム>_<ミリ秒>.csv）
+SCRAPED_FILE_PATTERN = re.compile(r'auto_scraped_([A-Za-z0-9]+)_(\d{13})')
+UNKNOWN_PLATFORM = 'unknown'
+# パーティションのフォルダ名でエンコードする文字（% はURIデコードされるため必ず含める）
+PARTITION_UNSAFE_CHARS = re.compile(r'[%/\\:=<>"|?*]')
+
+if PYARROW_AVAILABLE:
+    # ファイルに保存する列（date/platform/genre はフォルダ名に持つ）
+    ARCHIVE_SCHEMA = pa.schema([
+        ('text', pa.string()),
+        ('image_url', pa.string()),
+        ('likes', pa.int64()),
+        ('scraped_at', pa.timestamp('ms')),
+        ('source', pa.dictionary(pa.int32(), pa.string())),
+    ])
+    # 読み込み時は genre/platform を辞書型（カテゴリ）の列として復元する
+    PARTITION_SCHEMA = pa.schema([
+        ('date', pa.string()),
+        ('platform', pa.dictionary(pa.int32(), pa.string())),
+        ('genre', pa.dictionary(pa.int32(), pa.string())),
+    ])
+
+
+def parse_source_name(path):
+    """CSVのファイル名から (プラットフォーム, スクレイピング日時) を求める
+
+    スクレイパーの命名規則に合わないファイルは unknown とファイルの更新時刻を使う。
+    """
+    match = SCRAPED_FILE_PATTERN.search(Path(path).name)
+    if match:
+        return match.group(1).lower(), datetime.fromtimestamp(int(match.group(2)) / 1000)
+    return UNKNOWN_PLATFORM, datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def _partition_value(value):
+    """フォルダ名に使えない文字をパーセントエンコードする
+
+    読み込み時に pyarrow がフォルダ名をURIデコードするため、% 自体もエンコードして元の値に戻るようにする。
+    """
+    return PARTITION_UNSAFE_CHARS.sub(lambda match: f'%{ord(match.group()):02X}', str(value)) or 'その他'
+
+
+class ScrapeArchiveWriter:
+    """1つのCSVの行を受け取り、ARCHIVE_BATCH_ROWS 行ごとにParquetへ書き出す
+
+    ファイル名は元のCSV名と先頭の行番号から決めるため、同じ範囲を取り込み直しても
+    同じファイルが上書きされ、行が重複しない。書き込みに失敗した場合は記録して以降を書き込まない
+    （アーカイブの失敗で投稿の取り込みは止めない）。
+    """
+
+    def __init__(self, source_path, start_row=0, root=DEFAULT_ARCHIVE_DIR):
+        self.root = root
+        self.source = Path(source_path).name
+        self.platform, self.scraped_at = parse_source_name(source_path)
+        self.date = self.scraped_at.date().isoformat()
+        self.next_row = start_row
+        self.rows_written = 0
+        self.failed = False
+        self._batch = []
+
+    def add(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= ARCHIVE_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        """溜まった行をジャンルごとのファイルに書き出す"""
+        batch, self._batch = self._batch, []
+        if not batch or self.failed:
+            return
+        first_row, self.next_row = self.next_row, self.next_row + len(batch)
+
+        by_genre = {}
+        for row in batch:
+            by_genre.setdefault(row['genre'], []).append(row)
+
+        try:
+            for genre, rows in by_genre.items():
+                directory = Path(self.root) / f"date={self.date}" / f"platform={_partition_value(self.platform)}" / f"genre={_partition_value(genre)}"
+                directory.mkdir(parents=True, exist_ok=True)
+                table = pa.table({
+                    'text': [row['text'] for row in rows],
+                    'image_url': [row['image_url'] for row in rows],
+                    'likes': [int(row['likes']) for row in rows],
+                    'scraped_at': [self.scraped_at] * len(rows),
+                    'source': [self.source] * len(rows),
+                }, schema=ARCHIVE_SCHEMA)
+                # 書き込み途中のファイルを読ませないよう、一時ファイルに書いてから置き換える
+                path = directory / f"{Path(self.source).stem}-{first_row:08d}.parquet"
+                temp_path = path.with_suffix('.parquet.tmp')
+                pq.write_table(table, temp_path)
+                os.replace(temp_path, path)
+            self.rows_written += len(batch)
+        except Exception as e:
+            self.failed = True
+            logger.warning(f"Parquetアーカイブへの書き込みに失敗しました（{self.source}）: {str(e)}")
+
+    def close(self):
+        """残りの行を書き出す"""
+        self.flush()
+        return self.rows_written
+
+
+def open_archive(root=DEFAULT_ARCHIVE_DIR):
+    """アーカイブ全体のデータセット（パーティションの列も含む）"""
+    partitioning = ds.HivePartitioning.discover(schema=PARTITION_SCHEMA)
+    return ds.dataset(root, format='parquet', partitioning=partitioning, exclude_invalid_files=True)
+
+
+def _recent_filter(days, platform=None, now=None):
+    """直近 days 日のパーティションだけを読む条件（フォルダ名の日付で絞り込むのでファイルを開かない）"""
+    since = ((now or datetime.now()) - timedelta(days=days - 1)).date().isoformat()
+    condition = ds.field('date') >= since
+    if platform:
+        condition = condition & (ds.field('platform') == platform)
+    return condition
+
+
+def top_posts_by_genre(days=30, k=10, platform=None, root=DEFAULT_ARCHIVE_DIR):
+    """直近 days 日のジャンルごとのいいね数上位 k 件（pandas.DataFrame）"""
+    if not os.path.isdir(root):
+        return None
+    table = open_archive(root).to_table(
+        columns=['date', 'platform', 'genre', 'text', 'likes', 'scraped_at'],
+        filter=_recent_filter(days, platform)
+    )
+    df = table.to_pandas()
+    return (
+        df.sort_values(['genre', 'likes'], ascending=[True, False], kind='stable')
+        .groupby('genre', observed=True)
+        .head(k)
+        .reset_index(drop=True)
+    )
+
+
+def daily_genre_stats(days=90, platform=None, root=DEFAULT_ARCHIVE_DIR):
+    """直近 days 日の日別・ジャンル別の投稿数といいね数（合計・平均・最大）"""
+    if not os.path.isdir(root):
+        return None
+    table = open_archive(root).to_table(
+        columns=['date', 'genre', 'likes'],
+        filter=_recent_filter(days, platform)
+    )
+    # 辞書型のまま group_by できないため、集計前に文字列に戻す
+    table = table.set_column(1, 'genre', table['genre'].cast(pa.string()))
+    stats = table.group_by(['date', 'genre']).aggregate([
+        ('likes', 'count'), ('likes', 'sum'), ('likes', 'mean'), ('likes', 'max')
+    ])
+    return stats.to_pandas().sort_values(['date', 'genre']).reset_index(drop=True)
+
+
+def backfill(paths, root=DEFAULT_ARCHIVE_DIR):
+    """既存のCSVをまとめてアーカイブに登録し、行数を返す"""
+    from csv_ingestion import CSVColumnError, iter_csv_rows
+
+    total = 0
+    for path in paths:
+        writer = ScrapeArchiveWriter(path, root=root)
+        try:
+            for row in iter_csv_rows(path):
+                writer.add(row)
+        except CSVColumnError as e:
+            logger.warning(f"{Path(path).name} をスキップしました: {str(e)}")
+            continue
+        total += writer.close()
+    return total
+
+
+if __name__ == "__main__":
+    # python scrape_archive.py --backfill csv_processed : フォルダ内のCSVをアーカイブに登録
+    # python scrape_archive.py --top 30                 : 直近30日のジャンル別上位投稿
+    # python scrape_archive.py --daily 90               : 直近90日の日別・ジャンル別集計
+    if not PYARROW_AVAILABLE:
+        print("❌ pyarrow がインストールされていません（pip install pyarrow）")
+        sys.exit(1)
+
+    import time
+    if len(sys.argv) > 2 and sys.argv[1] == "--backfill":
+        started = time.time()
+        count = backfill(sorted(Path(sys.argv[2]).rglob('*.csv')))
+        print(f"✅ {count}行を登録しました（{time.time() - started:.1f}秒）")
+    elif len(sys.argv) > 1 and sys.argv[1] in ("--top", "--daily"):
+        days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+        started = time.perf_counter()
+        result = top_posts_by_genre(days) if sys.argv[1] == "--top" else daily_genre_stats(days)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(result.to_string() if result is not None else "アーカイブがありません")
+        print(f"（{elapsed_ms:.1f}ms）")
+    else:
+        print(f"アーカイブ: {DEFAULT_ARCHIVE_DIR}")
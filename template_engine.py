@@ -0,0 +1,75 @@
+"""
+投稿テンプレートエンジン
+"{変数名}" を含むテンプレートを一度だけ固定文字列と差し込み位置に分解し、
+以降は1回の join で描画する（変数ごとに文字列全体を走査し直さない）
+"""
+
+import logging
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# 差し込み位置（識別子だけを対象にし、それ以外の波括弧はそのまま残す）
+SLOT_PATTERN = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+# コンパイル済みテンプレートを保持する件数
+TEMPLATE_CACHE_SIZE = 1024
+
+
+class TemplateVariableError(KeyError):
+    """テンプレートに必要な変数が渡されていない"""
+
+    def __init__(self, missing):
+        super().__init__(f"テンプレート変数が不足しています: {', '.join(sorted(missing))}")
+        self.missing = missing
+
+
+class CompiledTemplate:
+    """固定文字列（literals）と差し込む変数名（slots）に分解したテンプレート
+
+    literals は slots より1つ多く、描画結果は literals[0] + slots[0] + literals[1] + ... になる。
+    """
+
+    __slots__ = ('source', 'literals', 'slots', 'required')
+
+    def __init__(self, source):
+        self.source = source
+        parts = SLOT_PATTERN.split(source)
+        self.literals = tuple(parts[0::2])
+        self.slots = tuple(parts[1::2])
+        self.required = frozenset(self.slots)
+
+    def missing(self, variables):
+        """渡された変数に含まれない必須変数の集合"""
+        return self.required.difference(variables)
+
+    def render(self, variables, strict=False):
+        """変数を差し込んだ文字列を返す
+
+        strict=False の場合、渡されていない変数は "{変数名}" のまま残し（従来の str.replace と同じ）、警告をログに出す。
+        strict=True の場合は描画前に TemplateVariableError を送出する。
+        """
+        missing = self.missing(variables)
+        if missing:
+            if strict:
+                raise TemplateVariableError(missing)
+            logger.warning(f"テンプレート変数が不足しているため {{変数名}} のまま出力します: {', '.join(sorted(missing))}")
+
+        parts = [None] * (len(self.literals) + len(self.slots))
+        parts[0::2] = self.literals
+        parts[1::2] = [
+            str(variables[name]) if name in variables else '{' + name + '}'
+            for name in self.slots
+        ]
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(source):
+    """テンプレートをコンパイル（同じ文字列は LRU キャッシュから返す）"""
+    return CompiledTemplate(source)
+
+
+def render_template(source, variables, strict=False):
+    """テンプレート文字列に変数を差し込む"""
+    return compile_template(source).render(variables, strict)
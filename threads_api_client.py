@@ -5,12 +5,13 @@ Threads API クライアント
 """
 
 import os
-import requests
 import json
 from datetime import datetime
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from http_client import get_http_client
+
 load_dotenv()
 
 class ThreadsAPIClient:
@@ -20,6 +21,7 @@ class ThreadsAPIClient:
         self.access_token = os.getenv('THREADS_ACCESS_TOKEN')
         self.user_id = os.getenv('THREADS_USER_ID')
         self.base_url = "https://graph.threads.net/v1.0"
+        self.http = get_http_client()
         
         if not self.access_token:
             raise ValueError("THREADS_ACCESS_TOKENが設定されていません。.envファイルを確認してください。")
@@ -27,7 +29,7 @@ class ThreadsAPIClient:
     def verify_credentials(self) -> Dict:
         """認証情報の確認"""
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/me",
                 params={
                     "fields": "id,username,threads_profile_picture_url,threads_biography",
@@ -64,7 +66,7 @@ class ThreadsAPIClient:
                 params["media_type"] = "IMAGE"
                 params["image_url"] = media_url
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.base_url}/{self.user_id}/threads",
                 params=params
             )
@@ -78,7 +80,7 @@ class ThreadsAPIClient:
             creation_id = response.json().get("id")
             
             # Step 2: 投稿を公開
-            publish_response = requests.post(
+            publish_response = self.http.post(
                 f"{self.base_url}/{self.user_id}/threads_publish",
                 params={
                     "creation_id": creation_id,
@@ -109,7 +111,7 @@ class ThreadsAPIClient:
     def get_posts(self, limit: int = 10) -> List[Dict]:
         """投稿履歴を取得"""
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/{self.user_id}/threads",
                 params={
                     "fields": "id,media_type,media_url,permalink,text,timestamp,username,is_quote_post",
@@ -131,7 +133,7 @@ class ThreadsAPIClient:
     def get_post_insights(self, post_id: str) -> Dict:
         """投稿のインサイトを取得"""
         try:
-            response = requests.get(
+            response = self.http.get(
                 f"{self.base_url}/{post_id}/insights",
                 params={
                     "metric": "engagement,impressions,reach,replies,reposts,quotes,likes",
@@ -158,7 +160,7 @@ class ThreadsAPIClient:
     def delete_post(self, post_id: str) -> bool:
         """投稿を削除"""
         try:
-            response = requests.delete(
+            response = self.http.delete(
                 f"{self.base_url}/{post_id}",
                 params={"access_token": self.access_token}
             )
@@ -18,6 +18,7 @@ import re
 import requests
 from collections import Counter
 import numpy as np
+from llm_cache import get_llm_cache
 
 load_dotenv()
 
@@ -182,16 +183,25 @@ class UltimateThreadsAIEngine:
         
         # OpenAI APIで生成
         if self.openai_api_key:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "あなたは高いエンゲージメントを獲得するSNS投稿の専門家です。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.8,
-                max_tokens=500
+            system_prompt = "あなたは高いエンゲージメントを獲得するSNS投稿の専門家です。"
+            
+            def create():
+                response = openai.ChatCompletion.create(
+                    model="gpt-4",
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.8,
+                    max_tokens=500
+                )
+                return response.choices[0].message.content
+            
+            # 同じテンプレート・分析結果の組み合わせはキャッシュした応答（最大3件）を順番に使う
+            content, _ = get_llm_cache().get_or_create(
+                "gpt-4", f"{system_prompt}\n{prompt}", create, temperature=0.8, variants=3
             )
-            return response.choices[0].message.content
+            return content
         
         # Claude APIで生成（OpenAIがない場合）
         elif self.claude_api_key: